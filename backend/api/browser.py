@@ -1,10 +1,28 @@
 import logging
 import sys
+from typing import Literal
 
-from fastapi import APIRouter, HTTPException, Request, WebSocket
+from fastapi import (
+    APIRouter,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 
-from schemas.browser_task import BrowserTask, BrowserTaskCreate
-from services.browser import BrowserService
+from core.serialization import dumps
+from schemas.browser_task import BrowserTask, BrowserTaskBatchCreate, BrowserTaskCreate
+from services.browser import (
+    BrowserService,
+    IdempotencyConflictError,
+    SchedulerFullError,
+    TaskNotResumableError,
+)
+from services.browser.protocol import negotiate_subprotocol
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -24,8 +42,17 @@ logger.info("BrowserService 初始化完成")
 
 
 @router.post("/tasks", response_model=BrowserTask)
-async def create_task(task: BrowserTaskCreate, request: Request) -> BrowserTask:
-    """创建新任务"""
+async def create_task(
+    task: BrowserTaskCreate,
+    request: Request,
+    response: Response,
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"),
+) -> BrowserTask:
+    """创建新任务
+
+    请求带 Idempotency-Key 头，或开启了按内容去重时，重复提交直接返回已有任务，
+    响应头 Idempotent-Replayed: true 表示没有创建新任务。
+    """
     logger.info("=" * 50)
     logger.info("收到创建任务请求")
     logger.info(f"请求方法: {request.method}")
@@ -33,12 +60,49 @@ async def create_task(task: BrowserTaskCreate, request: Request) -> BrowserTask:
     logger.info(f"客户端IP: {request.client.host}")
     logger.info(f"任务描述: {task.task_description}")
 
+    # 重复提交返回已有任务，不占用调度器容量
+    try:
+        existing = await browser_service.find_duplicate_task(
+            task.task_description, task.full_screenshots, idempotency_key
+        )
+    except IdempotencyConflictError as e:
+        logger.warning(str(e))
+        logger.info("=" * 50)
+        raise HTTPException(status_code=422, detail=str(e)) from e
+    if existing:
+        logger.info(f"重复提交，返回已有任务: {existing.task_id}")
+        logger.info("=" * 50)
+        response.headers["Idempotent-Replayed"] = "true"
+        return existing
+
+    # 准入控制：执行槽位和等待队列都已占满时快速拒绝
+    if not browser_service.has_capacity():
+        logger.warning("任务调度器已满，拒绝创建任务")
+        logger.info("=" * 50)
+        raise HTTPException(
+            status_code=429,
+            detail="任务队列已满，请稍后重试",
+            headers={"Retry-After": "5"},
+        )
+
     try:
         logger.info("开始创建任务...")
-        result = browser_service.create_task(task.task_description)
+        result = browser_service.create_task(
+            task.task_description,
+            full_screenshots=task.full_screenshots,
+            idempotency_key=idempotency_key
+        )
         logger.info(f"任务创建成功: {result.task_id}")
         logger.info("=" * 50)
         return result
+    except SchedulerFullError as e:
+        logger.warning(f"任务调度器已满，拒绝创建任务: {str(e)}")
+        logger.info("=" * 50)
+        raise HTTPException(
+            status_code=429,
+            detail="任务队列已满，请稍后重试",
+            headers={"Retry-After": "5"},
+        ) from e
     except Exception as e:
         logger.error("创建任务失败!")
         logger.error(f"错误类型: {type(e).__name__}")
@@ -48,6 +112,29 @@ async def create_task(task: BrowserTaskCreate, request: Request) -> BrowserTask:
         raise HTTPException(status_code=500, detail=f"创建任务时发生错误: {str(e)}")
 
 
+@router.post("/tasks/batch")
+async def create_task_batch(batch: BrowserTaskBatchCreate, request: Request) -> StreamingResponse:
+    """批量创建任务，以 NDJSON 流返回每个任务的状态变化和结果
+
+    每行一个 JSON 事件：submitted / running / completed / failed / cancelled / rejected，
+    index 为任务在请求列表中的位置，最后一行为 summary。
+    断开连接后尚未提交的任务不再提交，已提交的任务继续执行。
+    """
+    logger.info("=" * 50)
+    logger.info("收到批量创建任务请求")
+    logger.info(f"客户端IP: {request.client.host}")
+    logger.info(f"任务数: {len(batch.task_descriptions)}, 并发上限: {batch.max_concurrency}")
+    logger.info("=" * 50)
+
+    async def stream():
+        async for event in browser_service.run_batch(
+            batch.task_descriptions, batch.max_concurrency, full_screenshots=batch.full_screenshots
+        ):
+            yield dumps(event) + b"\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
 @router.get("/tasks/{task_id}", response_model=BrowserTask)
 async def get_task(task_id: str, request: Request) -> BrowserTask:
     """获取任务状态"""
@@ -60,7 +147,7 @@ async def get_task(task_id: str, request: Request) -> BrowserTask:
 
     try:
         logger.info("开始获取任务...")
-        task = browser_service.get_task(task_id)
+        task = await browser_service.get_task(task_id)
         if not task:
             logger.warning(f"任务未找到: {task_id}")
             logger.info("=" * 50)
@@ -79,27 +166,144 @@ async def get_task(task_id: str, request: Request) -> BrowserTask:
         raise HTTPException(status_code=500, detail=f"获取任务状态时发生错误: {str(e)}")
 
 
+@router.post("/tasks/{task_id}/resume", response_model=BrowserTask)
+async def resume_task(task_id: str, request: Request) -> BrowserTask:
+    """从最近的断点恢复执行中断的任务（服务重启、worker 退出或执行失败后）
+
+    已完成的任务或正由其他 worker 执行的任务返回 409。
+    """
+    logger.info("=" * 50)
+    logger.info("收到恢复任务请求")
+    logger.info(f"客户端IP: {request.client.host}")
+    logger.info(f"任务ID: {task_id}")
+
+    try:
+        task = await browser_service.resume_task(task_id)
+    except TaskNotResumableError as e:
+        logger.warning(str(e))
+        logger.info("=" * 50)
+        raise HTTPException(status_code=409, detail=str(e)) from e
+    except SchedulerFullError as e:
+        logger.warning(f"任务调度器已满，拒绝恢复任务: {str(e)}")
+        logger.info("=" * 50)
+        raise HTTPException(
+            status_code=429,
+            detail="任务队列已满，请稍后重试",
+            headers={"Retry-After": "5"},
+        ) from e
+    except Exception as e:
+        logger.exception("恢复任务失败!")
+        logger.error("=" * 50)
+        raise HTTPException(status_code=500, detail=f"恢复任务时发生错误: {str(e)}") from e
+    if not task:
+        logger.warning(f"任务未找到: {task_id}")
+        logger.info("=" * 50)
+        raise HTTPException(status_code=404, detail="Task not found")
+    logger.info(f"任务已恢复: {task_id} (状态: {task.status})")
+    logger.info("=" * 50)
+    return task
+
+
+@router.get("/tasks/{task_id}/events")
+async def task_events(
+    task_id: str,
+    last_event_id: str | None = Header(default=None, alias="Last-Event-ID"),
+    last_sequence: int | None = Query(default=None, ge=0, description="客户端最后收到的消息序号"),
+) -> StreamingResponse:
+    """以 Server-Sent Events 订阅任务消息，内容与 WebSocket 推送的消息相同
+
+    事件 ID 为消息序号，EventSource 断线重连时会自动通过 Last-Event-ID 续传；
+    不支持自定义请求头的客户端可以使用 last_sequence 参数。
+    """
+    task = await browser_service.get_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    if last_event_id and last_event_id.isdigit():
+        last_sequence = int(last_event_id)
+
+    return StreamingResponse(
+        browser_service.stream_task_events(task, last_sequence=last_sequence),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # 禁止 nginx 等反向代理缓冲事件流
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@router.get("/tasks/{task_id}/steps/{step}/screenshot")
+async def get_step_screenshot(
+    task_id: str,
+    step: int,
+    request: Request,
+    variant: Literal["full", "thumbnail"] = Query(default="full", description="截图版本"),
+) -> Response:
+    """获取步骤截图的原始图片数据
+
+    截图按内容寻址，同一地址的内容不会变化，客户端可以长期缓存。
+    任务未保存全分辨率截图时返回缩略图。
+    """
+    digest = await browser_service.get_step_screenshot(task_id, step, variant)
+    # 检查文件和读取文件头会访问磁盘，放到线程池中执行
+    located = await run_in_threadpool(browser_service.screenshot_store.locate, digest) if digest else None
+    if located is None:
+        raise HTTPException(status_code=404, detail="Screenshot not found")
+
+    etag = f'"{digest}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable",
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    # 已写盘的截图直接从文件发送，避免读入内存
+    path, data, media_type = located
+    if path is not None:
+        return FileResponse(path, media_type=media_type, headers=headers)
+    return Response(content=data, media_type=media_type, headers=headers)
+
+
+@router.get("/stats")
+async def get_stats() -> dict:
+    """获取调度器和任务缓存统计"""
+    return browser_service.get_stats()
+
+
 @router.websocket("/ws/tasks/{task_id}")
-async def task_websocket(websocket: WebSocket, task_id: str):
-    """WebSocket 连接处理任务执行过程"""
+async def task_websocket(
+    websocket: WebSocket,
+    task_id: str,
+    last_sequence: int | None = Query(default=None, ge=0, description="客户端最后收到的消息序号"),
+):
+    """WebSocket 连接订阅任务执行过程，断开连接不会影响任务执行
+
+    重连时通过 last_sequence 传入最后收到的消息序号，服务端只补发缺失的消息。
+    客户端可通过子协议 operatornext.msgpack.v1 使用 MessagePack 二进制帧，默认使用 JSON。
+    """
     logger.info("=" * 50)
-    logger.info(f"收到 WebSocket 连接请求: {task_id}")
+    logger.info(f"收到 WebSocket 连接请求: {task_id} (last_sequence: {last_sequence})")
 
     try:
         logger.info("接受 WebSocket 连接...")
-        await websocket.accept()
-        logger.info("WebSocket 连接已接受")
+        subprotocol, protocol = negotiate_subprotocol(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=subprotocol)
+        logger.info(f"WebSocket 连接已接受 (协议: {protocol})")
 
         logger.info("获取任务信息...")
-        task = browser_service.get_task(task_id)
+        task = await browser_service.get_task(task_id)
         if not task:
             logger.warning(f"WebSocket 连接的任务未找到: {task_id}")
             await websocket.close(code=4004, reason="Task not found")
             return
 
-        logger.info(f"开始执行任务: {task_id}")
-        await browser_service.run_task(task, websocket)
-        logger.info(f"任务执行完成: {task_id}")
+        logger.info(f"开始订阅任务消息: {task_id}")
+        await browser_service.stream_task(
+            task, websocket, last_sequence=last_sequence, protocol=protocol
+        )
+        logger.info(f"任务消息推送结束: {task_id}")
 
     except Exception as e:
         logger.error("任务执行失败!")
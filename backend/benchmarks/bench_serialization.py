@@ -0,0 +1,116 @@
+"""
+消息帧序列化基准测试
+
+对比步骤消息从构造到编码为 JSON 文本的吞吐量（帧/秒）：
+1. 旧路径: StepMessage.model_dump -> WSMessage(...).model_dump -> json.dumps
+2. 新路径: StepMessage.model_dump -> ws_message_dict -> dumps_str
+
+运行方式（在 backend 目录下）:
+    python -m benchmarks.bench_serialization [帧数]
+"""
+
+import json
+import logging
+import sys
+import time
+from datetime import datetime
+
+from core.serialization import dumps_str, orjson, ws_message_dict
+from schemas.browser_task import Action, StepMessage, WSMessage
+
+
+def build_step(step: int) -> StepMessage:
+    """构造接近真实任务的步骤消息"""
+    now = datetime.now().isoformat()
+    actions = [
+        Action(
+            type="click_element",
+            args={"index": 12 + step, "xpath": "//div[@id='search']/form/div[1]/input"},
+            status="pending",
+            timestamp=now
+        ).model_dump(),
+        Action(
+            type="input_text",
+            args={"index": 7, "text": "OperatorNext 浏览器自动化 " * 3},
+            status="pending",
+            timestamp=now
+        ).model_dump()
+    ]
+    return StepMessage(
+        step=step,
+        url=f"https://www.example.com/search?q=operator&page={step}",
+        status="completed",
+        evaluation="Success - 页面已加载搜索结果，找到了目标链接。" * 2,
+        memory=f"已访问首页并输入关键词，当前在第 {step} 页结果中查找目标条目。" * 4,
+        next_goal="点击第一个搜索结果并提取页面标题和摘要信息",
+        actions=actions,
+        started_at=now,
+        completed_at=now,
+        metadata={
+            "browser_state": {
+                "url": f"https://www.example.com/search?q=operator&page={step}",
+                "title": "Example Search - operator",
+                "content": None,
+                "elements": None
+            },
+            "performance": {
+                "cpu_percent": 37.5,
+                "memory_percent": 61.2,
+                "memory_info": {"rss": 412_000_000, "vms": 1_630_000_000},
+                "num_threads": 42,
+                "timestamp": now
+            }
+        },
+        thumbnail_ref="3f" * 32,
+        thumbnail_url=f"/api/tasks/bench/steps/{step}/screenshot?variant=thumbnail",
+        screenshot_unchanged=False
+    )
+
+
+def encode_before(step: int) -> str:
+    """旧路径：两次 model_dump，标准库 json 编码"""
+    message = WSMessage(
+        type="step",
+        data=build_step(step).model_dump(),
+        timestamp=datetime.now().isoformat(),
+        session_id="bench",
+        sequence=step
+    )
+    return json.dumps(message.model_dump(), ensure_ascii=False, separators=(",", ":"))
+
+
+def encode_after(step: int) -> str:
+    """新路径：直接构造消息字典，快速 JSON 编码"""
+    message = ws_message_dict(
+        "step",
+        build_step(step).model_dump(),
+        session_id="bench",
+        sequence=step
+    )
+    return dumps_str(message)
+
+
+def run(name: str, encode, frames: int) -> float:
+    """运行一组编码并返回帧/秒"""
+    encode(0)
+    start = time.perf_counter()
+    for step in range(1, frames + 1):
+        encode(step)
+    elapsed = time.perf_counter() - start
+    rate = frames / elapsed
+    print(f"{name:<8} {frames} 帧, {elapsed:.3f} 秒, {rate:,.0f} 帧/秒")
+    return rate
+
+
+def main() -> None:
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    # 模型构造时的调试日志不计入序列化开销
+    logging.disable(logging.CRITICAL)
+    print(f"JSON 编码器: {'orjson' if orjson is not None else 'json'}")
+    before = run("before", encode_before, frames)
+    after = run("after", encode_after, frames)
+    print(f"提升: {after / before:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+环境变量解析
+
+各层配置模块共用的环境变量读取函数，本模块不依赖任何业务模块：
+1. 启动时加载 .env 文件
+2. 整数、浮点数和布尔值的解析，非法值打印警告后回退到默认值
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+
+def get_int(name: str, default: int) -> int:
+    """读取整数类型的环境变量，非法值回退到默认值"""
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        print(f"Warning - 环境变量 {name}={value!r} 不是有效整数，使用默认值 {default}")
+        return default
+
+
+def get_float(name: str, default: float) -> float:
+    """读取浮点类型的环境变量，非法值回退到默认值"""
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        print(f"Warning - 环境变量 {name}={value!r} 不是有效数字，使用默认值 {default}")
+        return default
+
+
+def get_bool(name: str, default: bool) -> bool:
+    """读取布尔类型的环境变量，1/true/yes 为真"""
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() in ("1", "true", "yes")
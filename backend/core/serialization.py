@@ -0,0 +1,73 @@
+"""
+序列化工具
+
+API 响应和 WebSocket 消息帧共用的快速 JSON 编码：
+1. 安装了 orjson 时使用 orjson，否则回退到标准库 json
+2. 直接构造 WebSocket 消息信封字典，避免 WSMessage 模型的二次 model_dump
+"""
+
+import json
+from datetime import datetime
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson 为可选依赖
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """处理 JSON 无法直接编码的类型"""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, set | frozenset):
+        return list(value)
+    return str(value)
+
+
+def dumps(data: Any) -> bytes:
+    """编码为 UTF-8 JSON 字节"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_str(data: Any) -> str:
+    """编码为 JSON 文本（用于 WebSocket 文本帧）"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(data, default=_default, ensure_ascii=False, separators=(",", ":"))
+
+
+class FastJSONResponse(JSONResponse):
+    """使用快速 JSON 编码的响应类"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def ws_message_dict(
+    message_type: str,
+    data: dict,
+    session_id: str | None = None,
+    sequence: int | None = None,
+    timestamp: str | None = None,
+    metadata: dict | None = None,
+) -> dict:
+    """构造与 WSMessage.model_dump() 结构相同的消息字典
+
+    data 已经是 model_dump 过的字典，不再经过 WSMessage 模型校验和二次转换。
+    """
+    return {
+        "type": message_type,
+        "data": data,
+        "timestamp": timestamp or datetime.now().isoformat(),
+        "session_id": session_id,
+        "sequence": sequence,
+        "metadata": metadata if metadata is not None else {},
+    }
@@ -0,0 +1,289 @@
+"""
+运行时指标
+
+以 Prometheus 文本格式导出服务指标：
+1. Counter / Histogram 按线程分片计数，记录时不加锁，只在抓取时汇总各分片
+2. Gauge 在抓取时调用回调函数取值，执行路径上没有任何开销
+3. 模块级的 registry 和各业务指标供服务各处直接使用
+"""
+
+import math
+import threading
+from collections.abc import Callable, Iterable
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+# 默认的耗时分桶（秒），覆盖从 WebSocket 发送到整个任务的范围
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _format_value(value: float) -> str:
+    """格式化指标值"""
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    """转义标签值"""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    """格式化标签"""
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{_escape_label(str(value))}"' for name, value in labels.items())
+    return "{" + pairs + "}"
+
+
+class _Shards:
+    """按线程分片的计数单元
+
+    每个线程只写自己的分片，不需要加锁；只有线程第一次写入时登记分片需要加锁。
+    """
+    def __init__(self, size: int):
+        self._size = size
+        self._local = threading.local()
+        self._cells: list[list[float]] = []
+        self._lock = threading.Lock()
+
+    def cell(self) -> list[float]:
+        """当前线程的分片"""
+        cell = getattr(self._local, "cell", None)
+        if cell is None:
+            cell = [0.0] * self._size
+            with self._lock:
+                self._cells.append(cell)
+            self._local.cell = cell
+        return cell
+
+    def total(self) -> list[float]:
+        """汇总所有分片"""
+        with self._lock:
+            cells = list(self._cells)
+        totals = [0.0] * self._size
+        for cell in cells:
+            for i, value in enumerate(cell):
+                totals[i] += value
+        return totals
+
+
+class _Metric:
+    """指标基类，带标签的指标为每组标签值创建一个子指标"""
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], _Metric] = {}
+
+    def labels(self, *values: str):
+        """获取指定标签值的子指标"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+            child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self) -> "_Metric":
+        raise NotImplementedError
+
+    def _samples(self, labels: dict[str, str]) -> list[tuple[str, dict[str, str], float]]:
+        raise NotImplementedError
+
+    def collect(self) -> list[tuple[str, dict[str, str], float]]:
+        """收集 (样本名, 标签, 值)"""
+        if not self.labelnames:
+            return self._samples({})
+        samples = []
+        for key, child in list(self._children.items()):
+            samples.extend(child._samples(dict(zip(self.labelnames, key, strict=True))))
+        return samples
+
+
+class Counter(_Metric):
+    """只增计数器"""
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._shards = _Shards(1)
+
+    def _new_child(self) -> "Counter":
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount: float = 1.0) -> None:
+        """增加计数"""
+        self._shards.cell()[0] += amount
+
+    @property
+    def value(self) -> float:
+        return self._shards.total()[0]
+
+    def _samples(self, labels):
+        return [(f"{self.name}_total", labels, self.value)]
+
+
+class Gauge(_Metric):
+    """瞬时值，抓取时通过回调函数读取"""
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, function: Callable[[], float] | None = None):
+        super().__init__(name, documentation)
+        self._function = function
+        self._value = 0.0
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """设置取值回调"""
+        self._function = function
+
+    def set(self, value: float) -> None:
+        """直接设置值（未设置回调时使用）"""
+        self._value = value
+
+    @property
+    def value(self) -> float:
+        if self._function is None:
+            return self._value
+        try:
+            return float(self._function())
+        except Exception:
+            return math.nan
+
+    def _samples(self, labels):
+        return [(self.name, labels, self.value)]
+
+
+class Histogram(_Metric):
+    """累积分桶直方图"""
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 分片布局: [各分桶计数..., +Inf 计数, 总和]
+        self._shards = _Shards(len(self.buckets) + 2)
+
+    def _new_child(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float) -> None:
+        """记录一次观测值"""
+        cell = self._shards.cell()
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        cell[index] += 1
+        cell[-1] += value
+
+    def _samples(self, labels):
+        totals = self._shards.total()
+        samples = []
+        cumulative = 0.0
+        for bound, count in zip((*self.buckets, math.inf), totals[:-1], strict=True):
+            cumulative += count
+            samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+        samples.append((f"{self.name}_count", labels, cumulative))
+        samples.append((f"{self.name}_sum", labels, totals[-1]))
+        return samples
+
+
+class Registry:
+    """指标注册表"""
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        """注册指标，同名指标只注册一次"""
+        return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        """生成 Prometheus 文本格式"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.collect():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# 耗时
+TASK_DURATION = registry.register(Histogram(
+    "operatornext_task_duration_seconds", "任务从开始执行到结束的耗时", labelnames=("status",)
+))
+STEP_DURATION = registry.register(Histogram(
+    "operatornext_step_duration_seconds", "Agent 单个步骤的耗时"
+))
+WS_SEND_LATENCY = registry.register(Histogram(
+    "operatornext_ws_send_seconds", "WebSocket 单帧发送耗时",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+))
+STEP_PHASE_DURATION = registry.register(Histogram(
+    "operatornext_step_phase_seconds", "Agent 单个步骤各阶段的耗时", labelnames=("phase",)
+))
+LLM_LATENCY = registry.register(Histogram(
+    "operatornext_llm_call_seconds", "LLM 调用耗时", labelnames=("model",)
+))
+LLM_QUEUE_WAIT = registry.register(Histogram(
+    "operatornext_llm_queue_seconds", "LLM 请求在本地限流器中排队的耗时", labelnames=("provider",)
+))
+BROWSER_POOL_LEASE_WAIT = registry.register(Histogram(
+    "operatornext_browser_pool_lease_seconds", "从浏览器连接池租用连接的等待耗时"
+))
+WS_COMPRESSION_RATIO = registry.register(Histogram(
+    "operatornext_ws_compression_ratio", "压缩发送的 WebSocket 消息的压缩率（原始字节数 / 压缩后字节数）",
+    buckets=(1, 1.5, 2, 3, 4, 6, 8, 12, 16, 24, 32)
+))
+WS_COMPRESSION_CPU = registry.register(Histogram(
+    "operatornext_ws_compression_cpu_seconds", "压缩一条 WebSocket 消息耗费的 CPU 时间",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05)
+))
+
+# 瞬时值
+TASKS_RUNNING = registry.register(Gauge("operatornext_tasks_running", "正在执行的任务数"))
+TASKS_QUEUED = registry.register(Gauge("operatornext_tasks_queued", "排队等待执行的任务数"))
+SUBSCRIBERS = registry.register(Gauge("operatornext_subscribers", "任务消息订阅者数量"))
+CACHED_BYTES = registry.register(Gauge("operatornext_cached_bytes", "任务存储缓存的步骤字节数"))
+LLM_IN_FLIGHT = registry.register(Gauge("operatornext_llm_in_flight", "正在进行的 LLM 请求数"))
+LLM_WAITING = registry.register(Gauge("operatornext_llm_waiting", "在本地限流器中排队的 LLM 请求数"))
+LLM_CACHE_BYTES = registry.register(Gauge("operatornext_llm_cache_bytes", "LLM 响应缓存占用的磁盘字节数"))
+BROWSER_POOL_IDLE = registry.register(Gauge("operatornext_browser_pool_idle", "浏览器连接池中的空闲连接数"))
+BROWSER_POOL_LEASED = registry.register(Gauge("operatornext_browser_pool_leased", "浏览器连接池中已租出的连接数"))
+SUBSCRIBER_QUEUE_DEPTH = registry.register(Gauge(
+    "operatornext_subscriber_queue_depth", "所有订阅者发送队列中积压的消息帧数"
+))
+
+# 计数
+ERRORS = registry.register(Counter(
+    "operatornext_errors", "按错误类型统计的任务错误数", labelnames=("error_type",)
+))
+LLM_CACHE_REQUESTS = registry.register(Counter(
+    "operatornext_llm_cache_requests", "LLM 响应缓存查询次数", labelnames=("result",)
+))
+LLM_CACHE_EVICTIONS = registry.register(Counter(
+    "operatornext_llm_cache_evictions", "LLM 响应缓存按大小上限淘汰的条目数"
+))
+BROWSER_POOL_EVENTS = registry.register(Counter(
+    "operatornext_browser_pool_events", "浏览器连接池的连接创建、回收和失败次数", labelnames=("event",)
+))
+WS_FRAME_BYTES = registry.register(Counter(
+    "operatornext_ws_frame_bytes", "WebSocket 数据消息的原始字节数和实际发送字节数", labelnames=("stage",)
+))
+WS_COMPRESSION_FRAMES = registry.register(Counter(
+    "operatornext_ws_compression_frames", "按是否压缩统计的 WebSocket 消息数", labelnames=("result",)
+))
+SUBSCRIBER_DROPPED = registry.register(Counter(
+    "operatornext_subscriber_dropped", "订阅者发送队列满时丢弃或合并的消息帧数", labelnames=("reason",)
+))
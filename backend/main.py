@@ -1,13 +1,31 @@
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
+from api.browser import browser_service
 from api.browser import router as browser_router
+from core.serialization import FastJSONResponse
+from core.telemetry import CONTENT_TYPE_LATEST, registry
+from services.browser.ws_compression import CompressedWebSocketProtocol
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时预热浏览器连接池，关闭时停止任务调度并落盘任务存储"""
+    await browser_service.start()
+    yield
+    await browser_service.shutdown()
+
 
 app = FastAPI(
     title="Browser Use API",
     description="使用 AI 控制浏览器的 API",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # 配置 CORS
@@ -22,6 +40,13 @@ app.add_middleware(
 # 添加路由
 app.include_router(browser_router, prefix="/api", tags=["browser"])
 
-# 直接运行支持
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    """Prometheus 指标"""
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE_LATEST)
+
+
+# 直接运行支持（命令行启动时用 --ws services.browser.ws_compression:CompressedWebSocketProtocol 指定同一个协议类）
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True, ws=CompressedWebSocketProtocol)
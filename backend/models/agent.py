@@ -5,38 +5,32 @@ from core.prompts import ChineseSystemPrompt
 from models.llm import create_llm_model
 
 
+def create_browser(
+    cdp_url: str,
+    headless: bool = False,  # 默认改为有头模式
+    disable_security: bool = True,
+) -> Browser:
+    """创建连接到 browserless 的浏览器实例（由浏览器连接池调用，连接在首次使用时建立）"""
+    browser_config = BrowserConfig(
+        headless=headless,  # 有头模式
+        disable_security=disable_security,  # 禁用安全特性
+        # 连接到browserless Chrome实例
+        cdp_url=cdp_url,  # 使用WebSocket连接
+    )
+    return Browser(config=browser_config)
+
+
 def create_agent(
     task: str,
+    browser: Browser,
     step_callback=None,
     done_callback=None,
-    headless: bool = False,  # 默认改为有头模式
-    disable_security: bool = True,
 ) -> Agent:
-    """创建并配置 Agent 实例"""
+    """使用从连接池租用的浏览器创建并配置 Agent 实例"""
     try:
         print("\n=== 创建 Agent ===")
         print(f"任务描述: {task}")
-        print(f"浏览器模式: {'无头模式' if headless else '有头模式'}")
-        
-        # 创建浏览器配置
-        browser_config = BrowserConfig(
-            headless=headless,  # 有头模式
-            disable_security=disable_security,  # 禁用安全特性
-            # 连接到browserless Chrome实例
-            cdp_url="ws://localhost:13000/playwright/chromium?token=browser-token-2024",  # 使用WebSocket连接
-        )
-        
-        print("\n=== 浏览器配置 ===")
-        print(f"CDP URL: {browser_config.cdp_url}")
-        print("Chrome 参数:")
-        for arg in browser_config.extra_chromium_args:
-            print(f"  {arg}")
-        print("==================\n")
-        
-        # 创建浏览器实例
-        print("正在创建浏览器实例...")
-        browser = Browser(config=browser_config)
-        print("✓ 浏览器实例创建成功")
+        print(f"CDP URL: {browser.config.cdp_url}")
         
         # 创建 LLM 模型
         print("正在创建 LLM 模型...")
@@ -48,7 +42,7 @@ def create_agent(
         agent = Agent(
             task=task,
             llm=llm,
-            browser=browser,  # 注入配置好的浏览器实例
+            browser=browser,  # 注入租用的浏览器实例，Agent 结束时不会关闭它
             system_prompt_class=ChineseSystemPrompt,
             register_new_step_callback=step_callback,
             register_done_callback=done_callback
@@ -64,4 +58,4 @@ def create_agent(
         print("详细错误信息:")
         import traceback
         print(f"{traceback.format_exc()}")
-        raise 
\ No newline at end of file
+        raise
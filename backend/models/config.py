@@ -0,0 +1,59 @@
+"""
+LLM 配置模块
+
+从环境变量读取 LLM 客户端的运行参数，只依赖 core.config，供 models 层直接使用：
+1. 每个 provider/model 的并发、RPM 和 TPM 上限
+2. 共享 HTTP 连接池
+3. 响应磁盘缓存
+"""
+
+import os
+
+from core.config import get_bool, get_float, get_int
+
+
+# LLM 客户端
+def get_llm_max_concurrency() -> int:
+    """获取每个 provider/model 同时进行的 LLM 请求数上限，0 表示不限"""
+    return max(0, get_int("LLM_MAX_CONCURRENCY", 8))
+
+
+def get_llm_rpm() -> float:
+    """获取每个 provider/model 每分钟的请求数上限，0 表示不限"""
+    return max(0.0, get_float("LLM_RPM", 0.0))
+
+
+def get_llm_tpm() -> float:
+    """获取每个 provider/model 每分钟的 Token 数上限，0 表示不限"""
+    return max(0.0, get_float("LLM_TPM", 0.0))
+
+
+def get_llm_max_connections() -> int:
+    """获取共享 HTTP 连接池的连接数上限"""
+    return max(1, get_int("LLM_MAX_CONNECTIONS", 20))
+
+
+def get_llm_keepalive_expiry() -> float:
+    """获取空闲 keep-alive 连接的保留时间（秒）"""
+    return max(0.0, get_float("LLM_KEEPALIVE_EXPIRY", 60.0))
+
+
+# LLM 响应缓存
+def get_llm_cache_enabled() -> bool:
+    """是否开启 LLM 响应磁盘缓存"""
+    return get_bool("LLM_CACHE_ENABLED", False)
+
+
+def get_llm_cache_dir() -> str:
+    """获取 LLM 响应缓存目录"""
+    return os.getenv("LLM_CACHE_DIR", "data/llm_cache")
+
+
+def get_llm_cache_max_bytes() -> int:
+    """获取 LLM 响应缓存总大小上限（字节），超出后按 LRU 淘汰"""
+    return max(0, get_int("LLM_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+
+def get_llm_cache_include_images() -> bool:
+    """截图是否参与 LLM 响应缓存键"""
+    return get_bool("LLM_CACHE_INCLUDE_IMAGES", False)
@@ -1,29 +1,228 @@
+import asyncio
 import os
+import threading
+import time
+from typing import Any
+from urllib.parse import urlparse
+from uuid import UUID
 
+import httpx
 from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_openai import ChatOpenAI
+from pydantic import Field
+
+from core import telemetry
+from models.config import (
+    get_llm_cache_dir,
+    get_llm_cache_enabled,
+    get_llm_cache_include_images,
+    get_llm_cache_max_bytes,
+    get_llm_keepalive_expiry,
+    get_llm_max_concurrency,
+    get_llm_max_connections,
+    get_llm_rpm,
+    get_llm_tpm,
+)
+from models.llm_cache import LLMResponseCache
+from models.llm_limiter import ProviderLimiter
 
 # 加载环境变量
 load_dotenv()
 
-def create_llm_model() -> ChatOpenAI:
-    """创建 LLM 模型实例"""
-    try:
-        print("\n=== 初始化 LLM 模型 ===")
-        print(f"Base URL: {os.getenv('OPENAI_API_BASE')}")
-        print(f"Model: {os.getenv('OPENAI_MODEL')}")
-        
-        model = ChatOpenAI(
-            api_key=os.getenv('OPENAI_API_KEY'),
-            base_url=os.getenv('OPENAI_API_BASE'),
-            model=os.getenv('OPENAI_MODEL')
+class LLMLatencyCallback(BaseCallbackHandler):
+    """记录 LLM 调用耗时"""
+
+    def __init__(self, model: str | None):
+        self.model = model or "unknown"
+        self._started: dict[UUID, float] = {}
+
+    def on_chat_model_start(self, serialized: dict, messages: list, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized: dict, prompts: list[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._observe(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._observe(run_id)
+
+    def _observe(self, run_id: UUID) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            telemetry.LLM_LATENCY.labels(self.model).observe(time.perf_counter() - started)
+
+
+def _estimate_tokens(messages: list, max_tokens: int | None) -> int:
+    """粗略估算一次请求的 Token 数：文本按 4 字符 1 Token，每张图片按 1000 Token，加上输出上限"""
+    tokens = 0
+    for message in messages:
+        content = message.content
+        if isinstance(content, str):
+            tokens += len(content) // 4
+            continue
+        for part in content:
+            if isinstance(part, dict) and part.get("type") == "image_url":
+                tokens += 1000
+            else:
+                tokens += len(str(part.get("text", "") if isinstance(part, dict) else part)) // 4
+    return tokens + (max_tokens or 1000)
+
+
+class PooledChatOpenAI(ChatOpenAI):
+    """共享 HTTP 连接池并经过 provider 限流器的 ChatOpenAI，可选响应缓存"""
+
+    limiter: Any = Field(default=None, exclude=True)
+    response_cache: Any = Field(default=None, exclude=True)
+
+    def _cache_params(self, stop, kwargs: dict) -> dict:
+        """参与缓存键的模型参数（包括结构化输出绑定的工具定义）"""
+        return {
+            "model": self.model_name,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "top_p": self.top_p,
+            "stop": stop,
+            "kwargs": kwargs
+        }
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        key = None
+        if self.response_cache is not None:
+            key = self.response_cache.key(messages, self._cache_params(stop, kwargs))
+            cached = await asyncio.to_thread(self.response_cache.get, key)
+            if cached is not None:
+                return cached
+
+        if self.limiter is None:
+            result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        else:
+            estimated = _estimate_tokens(messages, self.max_tokens)
+            async with self.limiter.slot(estimated):
+                result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            usage = (result.llm_output or {}).get("token_usage") or {}
+            self.limiter.record_usage(estimated, usage.get("total_tokens"))
+
+        if key is not None and result.generations:
+            await asyncio.to_thread(self.response_cache.put, key, result)
+        return result
+
+
+# 进程级共享的模型实例、HTTP 客户端和限流器，按 (base_url, model, api_key) 复用
+_models: dict[tuple, PooledChatOpenAI] = {}
+_limiters: dict[str, ProviderLimiter] = {}
+_http_clients: list[httpx.Client | httpx.AsyncClient] = []
+_response_cache: LLMResponseCache | None = None
+_registry_lock = threading.Lock()
+
+telemetry.LLM_IN_FLIGHT.set_function(lambda: sum(limiter.in_flight for limiter in list(_limiters.values())))
+telemetry.LLM_WAITING.set_function(lambda: sum(limiter.waiting for limiter in list(_limiters.values())))
+
+
+def _get_limiter(base_url: str | None, model: str | None) -> ProviderLimiter:
+    """获取 provider/model 对应的限流器"""
+    key = f"{urlparse(base_url).netloc if base_url else 'openai'}/{model or 'unknown'}"
+    limiter = _limiters.get(key)
+    if limiter is None:
+        limiter = ProviderLimiter(
+            key,
+            max_concurrency=get_llm_max_concurrency(),
+            rpm=get_llm_rpm(),
+            tpm=get_llm_tpm()
         )
-        print("✓ LLM 模型初始化成功")
-        print("=== LLM 模型初始化完成 ===\n")
-        return model
-    except Exception as e:
-        print("❌ LLM 模型初始化失败!")
-        print(f"错误信息: {str(e)}")
-        import traceback
-        print(f"错误详情:\n{traceback.format_exc()}")
-        raise 
\ No newline at end of file
+        _limiters[key] = limiter
+    return limiter
+
+
+def _get_response_cache() -> LLMResponseCache | None:
+    """获取进程级的 LLM 响应缓存，未通过 LLM_CACHE_ENABLED 开启时返回 None"""
+    global _response_cache
+    if not get_llm_cache_enabled():
+        return None
+    if _response_cache is None:
+        _response_cache = LLMResponseCache(
+            get_llm_cache_dir(),
+            max_bytes=get_llm_cache_max_bytes(),
+            include_images=get_llm_cache_include_images()
+        )
+        telemetry.LLM_CACHE_BYTES.set_function(lambda: _response_cache.size_bytes)
+        print(f"✓ LLM 响应缓存已开启 ({_response_cache.root}, {_response_cache.get_stats()['entries']} 条)")
+    return _response_cache
+
+
+def _http_limits() -> httpx.Limits:
+    """HTTP 连接池配置"""
+    max_connections = get_llm_max_connections()
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=get_llm_keepalive_expiry()
+    )
+
+
+def create_llm_model() -> ChatOpenAI:
+    """获取 LLM 模型实例
+
+    同一 provider/model 的所有任务共享一个实例：HTTP 连接保持复用，
+    并发请求数和 RPM/TPM 由进程级限流器统一控制，超出额度时排队等待。
+    """
+    api_key = os.getenv('OPENAI_API_KEY')
+    base_url = os.getenv('OPENAI_API_BASE')
+    model_name = os.getenv('OPENAI_MODEL')
+    key = (base_url, model_name, api_key)
+    with _registry_lock:
+        model = _models.get(key)
+        if model is not None:
+            return model
+        try:
+            print("\n=== 初始化 LLM 模型 ===")
+            print(f"Base URL: {base_url}")
+            print(f"Model: {model_name}")
+            
+            limits = _http_limits()
+            http_client = httpx.Client(limits=limits)
+            http_async_client = httpx.AsyncClient(limits=limits)
+            model = PooledChatOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                model=model_name,
+                callbacks=[LLMLatencyCallback(model_name)],
+                http_client=http_client,
+                http_async_client=http_async_client,
+                limiter=_get_limiter(base_url, model_name),
+                response_cache=_get_response_cache()
+            )
+            _http_clients.extend((http_client, http_async_client))
+            _models[key] = model
+            print(f"✓ LLM 模型初始化成功 (并发上限: {model.limiter.max_concurrency or '不限'})")
+            print("=== LLM 模型初始化完成 ===\n")
+            return model
+        except Exception as e:
+            print("❌ LLM 模型初始化失败!")
+            print(f"错误信息: {str(e)}")
+            import traceback
+            print(f"错误详情:\n{traceback.format_exc()}")
+            raise
+
+
+def get_llm_stats() -> dict:
+    """各 provider/model 限流器和响应缓存的状态"""
+    return {
+        "limiters": {key: limiter.get_stats() for key, limiter in list(_limiters.items())},
+        "cache": _response_cache.get_stats() if _response_cache is not None else None
+    }
+
+
+async def close_llm_clients() -> None:
+    """关闭共享的 HTTP 客户端"""
+    with _registry_lock:
+        clients = list(_http_clients)
+        _http_clients.clear()
+        _models.clear()
+    for client in clients:
+        if isinstance(client, httpx.AsyncClient):
+            await client.aclose()
+        else:
+            client.close()
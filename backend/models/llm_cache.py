@@ -0,0 +1,187 @@
+import contextlib
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from langchain_core.load import dumpd, load
+from langchain_core.outputs import ChatResult
+
+from core import telemetry
+
+# 每次请求都会变化、但不影响模型决策的内容
+_VOLATILE_PATTERNS = (
+    re.compile(r"Current date and time:[^\n]*"),
+)
+_WHITESPACE = re.compile(r"[ \t]+")
+
+
+def _normalize_text(text: str) -> str:
+    """去掉易变内容并规整空白"""
+    for pattern in _VOLATILE_PATTERNS:
+        text = pattern.sub("", text)
+    lines = (_WHITESPACE.sub(" ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _normalize_content(content: Any, include_images: bool) -> Any:
+    """规整消息内容，图片按内容摘要参与或不参与缓存键"""
+    if isinstance(content, str):
+        return _normalize_text(content)
+    parts = []
+    for part in content:
+        if isinstance(part, dict) and part.get("type") == "image_url":
+            if include_images:
+                url = part["image_url"]["url"] if isinstance(part.get("image_url"), dict) else part.get("image_url")
+                parts.append({"image": hashlib.sha256(str(url).encode()).hexdigest()})
+        elif isinstance(part, dict):
+            parts.append(_normalize_text(str(part.get("text", ""))))
+        else:
+            parts.append(_normalize_text(str(part)))
+    return parts
+
+
+def cache_key(messages: list, params: dict, include_images: bool = False) -> str:
+    """根据规整后的消息列表和模型参数计算缓存键
+
+    工具调用只保留名称和参数，不包括每次运行都会变化的调用 ID。
+    """
+    normalized = []
+    for message in messages:
+        entry = {"role": message.type, "content": _normalize_content(message.content, include_images)}
+        tool_calls = getattr(message, "tool_calls", None)
+        if tool_calls:
+            entry["tool_calls"] = [(call["name"], call["args"]) for call in tool_calls]
+        normalized.append(entry)
+    payload = json.dumps({"messages": normalized, "params": params},
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """磁盘上的 LLM 响应缓存
+
+    每个响应保存为一个 JSON 文件，按缓存键分目录存放。内存中维护按最近访问排序的索引，
+    总大小超过 max_bytes 时淘汰最久未访问的响应；启动时按文件修改时间重建索引。
+    """
+    def __init__(self, root: str | Path, max_bytes: int = 512 * 1024 * 1024, include_images: bool = False):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.include_images = include_images
+        self._index: OrderedDict[str, int] = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+        self._load_index()
+
+    def path(self, key: str) -> Path:
+        """获取缓存键对应的文件路径"""
+        return self.root / key[:2] / f"{key}.json"
+
+    def _load_index(self) -> None:
+        """扫描缓存目录重建 LRU 索引"""
+        entries = []
+        for path in self.root.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._bytes += size
+        self._evict()
+
+    def key(self, messages: list, params: dict) -> str:
+        """计算缓存键"""
+        return cache_key(messages, params, self.include_images)
+
+    def get(self, key: str) -> ChatResult | None:
+        """读取缓存的响应，未命中时返回 None"""
+        with self._lock:
+            hit = key in self._index
+            if hit:
+                self._index.move_to_end(key)
+        result = None
+        if hit:
+            path = self.path(key)
+            try:
+                data = json.loads(path.read_bytes())
+                result = ChatResult(
+                    generations=[load(generation) for generation in data["generations"]],
+                    llm_output=data.get("llm_output")
+                )
+                os.utime(path)
+            except Exception as e:
+                print(f"Warning - 读取 LLM 缓存失败 ({key}): {str(e)}")
+                self._remove(key)
+        with self._lock:
+            if result is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        telemetry.LLM_CACHE_REQUESTS.labels("hit" if result is not None else "miss").inc()
+        return result
+
+    def put(self, key: str, result: ChatResult) -> None:
+        """保存响应并按大小上限淘汰"""
+        data = json.dumps({
+            "generations": [dumpd(generation) for generation in result.generations],
+            "llm_output": result.llm_output
+        }, ensure_ascii=False, default=str).encode("utf-8")
+        path = self.path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Warning - 写入 LLM 缓存失败 ({key}): {str(e)}")
+            return
+        with self._lock:
+            self._bytes += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+        self._evict()
+
+    def _remove(self, key: str) -> None:
+        """删除一个缓存项"""
+        with self._lock:
+            self._bytes -= self._index.pop(key, 0)
+        with contextlib.suppress(OSError):
+            self.path(key).unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        """淘汰最久未访问的响应直到总大小不超过上限"""
+        while True:
+            with self._lock:
+                if self._bytes <= self.max_bytes or not self._index:
+                    return
+                key, size = self._index.popitem(last=False)
+                self._bytes -= size
+            with contextlib.suppress(OSError):
+                self.path(key).unlink(missing_ok=True)
+            telemetry.LLM_CACHE_EVICTIONS.inc()
+
+    @property
+    def size_bytes(self) -> int:
+        """缓存占用的字节数"""
+        return self._bytes
+
+    def get_stats(self) -> dict:
+        """缓存统计"""
+        with self._lock:
+            requests = self._hits + self._misses
+            return {
+                "entries": len(self._index),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / requests if requests else 0.0
+            }
@@ -0,0 +1,119 @@
+import asyncio
+import contextlib
+import time
+from collections.abc import AsyncIterator
+
+from core import telemetry
+
+
+class TokenBucket:
+    """令牌桶：容量为每分钟额度，按额度/60 每秒匀速补充"""
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """距离可以取出 amount 个令牌还需等待的秒数"""
+        self._refill()
+        # 单次请求超过桶容量时按满桶放行，避免永远等待
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        """取出令牌（允许为负，表示透支的额度需要等待补回）"""
+        self._refill()
+        self.tokens -= amount
+
+
+class ProviderLimiter:
+    """单个 provider/model 的请求限流器
+
+    同时限制并发请求数和每分钟请求数/Token 数（RPM/TPM），超出额度的请求在本地
+    按先到先得排队等待，而不是同时打到 provider 后收到一批 429。
+    Token 数在请求前按估算值扣除，响应返回后按实际用量修正。
+    """
+    def __init__(self, key: str, max_concurrency: int = 0, rpm: float = 0, tpm: float = 0):
+        self.key = key
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore: asyncio.Semaphore | None = None
+        self._queue_lock: asyncio.Lock | None = None
+
+    def _primitives(self) -> tuple[asyncio.Semaphore | None, asyncio.Lock]:
+        """在事件循环中延迟创建同步原语"""
+        if self._queue_lock is None:
+            self._queue_lock = asyncio.Lock()
+            if self.max_concurrency > 0:
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore, self._queue_lock
+
+    async def _wait_for_budget(self, estimated_tokens: int) -> None:
+        """等待 RPM/TPM 额度"""
+        while True:
+            delay = max(
+                self.requests.wait_time(1) if self.requests else 0.0,
+                self.tokens.wait_time(estimated_tokens) if self.tokens else 0.0
+            )
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens:
+            self.tokens.take(estimated_tokens)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, estimated_tokens: int) -> AsyncIterator[None]:
+        """占用一个请求名额，退出时释放"""
+        semaphore, queue_lock = self._primitives()
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            if semaphore is not None:
+                await semaphore.acquire()
+            try:
+                # 串行检查额度，保证排队顺序
+                async with queue_lock:
+                    await self._wait_for_budget(estimated_tokens)
+            except BaseException:
+                if semaphore is not None:
+                    semaphore.release()
+                raise
+        finally:
+            self.waiting -= 1
+        telemetry.LLM_QUEUE_WAIT.labels(self.key).observe(time.monotonic() - started)
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if semaphore is not None:
+                semaphore.release()
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int | None) -> None:
+        """按实际 Token 用量修正 TPM 额度"""
+        if self.tokens and actual_tokens is not None:
+            self.tokens.take(actual_tokens - estimated_tokens)
+
+    def get_stats(self) -> dict:
+        """限流器状态"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rpm": self.requests.capacity if self.requests else None,
+            "tpm": self.tokens.capacity if self.tokens else None
+        }
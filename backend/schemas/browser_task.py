@@ -1,5 +1,7 @@
 import json
 import logging
+import os
+import random
 from datetime import datetime
 from typing import Any, Literal
 
@@ -20,33 +22,107 @@ def pretty_print_json(data: Any) -> str:
             else:
                 processed_data[key] = value
         data = processed_data
-    return json.dumps(data, indent=2, ensure_ascii=False)
+    return json.dumps(data, indent=2, ensure_ascii=False, default=str)
+
+
+def _truncate_screenshots(data: dict) -> dict:
+    """截断消息中的 base64 截图，避免打印完整数据"""
+    inner = data.get("data")
+    if isinstance(inner, dict) and inner.get("screenshot"):
+        inner = {
+            **inner,
+            "screenshot": f"{inner['screenshot'][:50]}... (base64数据已截断)",
+        }
+        data = {**data, "data": inner}
+    return data
+
+
+class _LazyJSON:
+    """日志参数包装：只有日志记录真正被处理器输出时才格式化"""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: Any):
+        self.data = data
+
+    def __str__(self) -> str:
+        return pretty_print_json(_truncate_screenshots(self.data))
+
+
+def log_ws_message(message: dict) -> None:
+    """WebSocket 消息调试钩子
+
+    模型构造不再记录日志，需要排查消息内容时将本模块的日志级别设为 DEBUG 开启，
+    并按 SCHEMA_DEBUG_SAMPLE_RATE（默认 0.1）采样，避免在每一步都格式化完整消息。
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    try:
+        sample_rate = float(os.getenv("SCHEMA_DEBUG_SAMPLE_RATE", "0.1"))
+    except ValueError:
+        sample_rate = 0.1
+    if sample_rate < 1.0 and random.random() >= sample_rate:
+        return
+    logger.debug(
+        "WebSocket 消息: 类型=%s 序号=%s 会话ID=%s\n%s",
+        message.get("type"),
+        message.get("sequence"),
+        message.get("session_id"),
+        _LazyJSON(message),
+    )
 
 
 class BrowserTaskCreate(BaseModel):
     """创建任务的请求模型"""
 
     task_description: str = Field(..., description="任务描述")
+    full_screenshots: bool | None = Field(
+        default=None,
+        description="是否保存全分辨率截图，默认由 SCREENSHOT_KEEP_FULL 决定",
+    )
 
     @validator("task_description")
-    def validate_task_description(self, v):
+    @classmethod
+    def validate_task_description(cls, v):
         if not v.strip():
             raise ValueError("任务描述不能为空")
         logger.info("验证任务描述: %s...", v[:100])
         return v.strip()
 
 
+class BrowserTaskBatchCreate(BaseModel):
+    """批量创建任务的请求模型"""
+
+    task_descriptions: list[str] = Field(..., min_length=1, max_length=1000, description="任务描述列表")
+    max_concurrency: int = Field(default=5, ge=1, le=100, description="本批次同时执行的任务数上限")
+    full_screenshots: bool | None = Field(
+        default=None,
+        description="是否保存全分辨率截图，默认由 SCREENSHOT_KEEP_FULL 决定",
+    )
+
+    @validator("task_descriptions")
+    @classmethod
+    def validate_task_descriptions(cls, v):
+        if any(not description.strip() for description in v):
+            raise ValueError("任务描述不能为空")
+        return [description.strip() for description in v]
+
+
 class BrowserTask(BaseModel):
     """任务模型"""
 
     task_id: str = Field(..., description="任务ID")
     task_description: str = Field(..., description="任务描述")
-    status: Literal["pending", "running", "completed", "failed"] = Field(
+    status: Literal["pending", "queued", "running", "completed", "failed"] = Field(
         default="pending", description="任务状态"
     )
     created_at: datetime = Field(default_factory=datetime.now, description="创建时间")
     updated_at: datetime = Field(default_factory=datetime.now, description="更新时间")
     result: dict | None = Field(default=None, description="任务结果")
+    queue_position: int | None = Field(
+        default=None, description="排队位置: 0 表示执行中, None 表示不在调度队列中"
+    )
+    full_screenshots: bool = Field(default=False, description="是否保存全分辨率截图")
 
     def __init__(self, **data):
         super().__init__(**data)
@@ -65,7 +141,7 @@ class BrowserTask(BaseModel):
 
 
 # 将 WSMessageType 改为类型别名
-WSMessageType = Literal["step", "result", "error"]
+WSMessageType = Literal["step", "result", "error", "status"]
 
 
 class Action(BaseModel):
@@ -95,6 +171,17 @@ class StepMessage(BaseModel):
     next_goal: str = Field(..., description="下一步目标")
     actions: list[dict] = Field(default_factory=list, description="动作列表")
     screenshot: str | None = Field(default=None, description="步骤截图的Base64编码")
+    screenshot_ref: str | None = Field(
+        default=None, description="全分辨率截图的内容摘要(SHA-256)，仅在任务需要时保存"
+    )
+    screenshot_url: str | None = Field(default=None, description="步骤截图的下载地址")
+    thumbnail_ref: str | None = Field(
+        default=None, description="缩略图的内容摘要(SHA-256)"
+    )
+    thumbnail_url: str | None = Field(default=None, description="缩略图的下载地址")
+    screenshot_unchanged: bool = Field(
+        default=False, description="截图是否与上一步相同（相同时复用上一步的截图引用）"
+    )
     started_at: str = Field(..., description="步骤开始时间")
     completed_at: str = Field(..., description="步骤完成时间")
     duration: float = Field(default=0.0, description="步骤执行时长(秒)")
@@ -147,24 +234,6 @@ class StepMessage(BaseModel):
 
         super().__init__(**data)
 
-        # 记录日志
-        logger.info("\n==================================================")
-        logger.info("收到步骤回调:")
-        logger.info("步骤编号: %d", self.step)
-        logger.info("当前URL: %s", self.url)
-        logger.info("状态: %s", self.status)
-        logger.info("评估结果: %s", self.evaluation)
-        logger.info("记忆状态: %s", self.memory)
-        logger.info("下一步目标: %s", self.next_goal)
-        logger.info("执行时长: %.2f秒", self.duration)
-
-        if self.actions:
-            logger.info("动作列表:")
-            for i, action in enumerate(self.actions, 1):
-                logger.info("  动作 %d:\n%s", i, pretty_print_json(action))
-
-        logger.info("==================================================")
-
     class Config:
         json_encoders = {datetime: lambda v: v.isoformat()}
 
@@ -207,22 +276,6 @@ class ResultMessage(BaseModel):
                 data["duration"] = 0.0
 
         super().__init__(**data)
-        logger.info("\n" + "=" * 50)
-        logger.info("任务完成:")
-        logger.info("最终结果: %s", self.final_result)
-        logger.info("总步数: %d", self.total_steps)
-        logger.info("状态: %s", self.status)
-        logger.info("执行时长: %.2f秒", self.duration)
-        logger.info("是否成功: %s", "✓" if self.success else "✗")
-        if self.error_count:
-            logger.info("错误次数: %d", self.error_count)
-        if self.retry_count:
-            logger.info("重试次数: %d", self.retry_count)
-        if self.summary:
-            logger.info("执行摘要: %s", self.summary)
-        if self.notes:
-            logger.info("备注: %s", self.notes)
-        logger.info("=" * 50)
 
 
 class ErrorMessage(BaseModel):
@@ -248,22 +301,6 @@ class ErrorMessage(BaseModel):
         if isinstance(data.get("timestamp"), datetime):
             data["timestamp"] = data["timestamp"].isoformat()
         super().__init__(**data)
-        logger.info("\n" + "=" * 50)
-        logger.info("发生错误:")
-        logger.info("错误类型: %s", self.error_type)
-        logger.info("严重程度: %s", self.severity)
-        logger.info("错误信息: %s", self.error)
-        if self.step is not None:
-            logger.info("步骤: %d", self.step)
-        if self.action:
-            logger.info("动作: %s", self.action)
-        if self.details:
-            logger.info("错误详情:\n%s", pretty_print_json(self.details))
-        if self.traceback:
-            logger.info("错误堆栈:\n%s", self.traceback)
-        if self.notes:
-            logger.info("备注: %s", self.notes)
-        logger.info("=" * 50)
 
 
 class WSMessage(BaseModel):
@@ -282,36 +319,9 @@ class WSMessage(BaseModel):
         if isinstance(data.get("timestamp"), datetime):
             data["timestamp"] = data["timestamp"].isoformat()
         super().__init__(**data)
-        logger.info("\n" + "-" * 50)
-        logger.info("WebSocket 消息:")
-        logger.info("类型: %s", self.type)
-        logger.info("时间: %s", self.timestamp)
-        if self.session_id:
-            logger.info("会话ID: %s", self.session_id)
-        if self.sequence:
-            logger.info("序号: %d", self.sequence)
-
-        # 处理数据打印，避免打印完整的 base64
-        log_data = self.data.copy()
-        if isinstance(log_data, dict):
-            if "screenshot" in log_data:
-                log_data["screenshot"] = (
-                    f"{log_data['screenshot'][:50]}... (base64数据已截断)"
-                )
-            elif (
-                isinstance(log_data.get("data"), dict)
-                and "screenshot" in log_data["data"]
-            ):
-                log_data["data"]["screenshot"] = (
-                    f"{log_data['data']['screenshot'][:50]}... (base64数据已截断)"
-                )
-
-        logger.info("数据:\n%s", pretty_print_json(log_data))
-        if self.metadata:
-            logger.info("元数据:\n%s", pretty_print_json(self.metadata))
-        logger.info("-" * 50)
 
     @validator("type")
-    def validate_message_type(self, v):
+    @classmethod
+    def validate_message_type(cls, v):
         logger.debug("验证消息类型: %s", v)
         return v
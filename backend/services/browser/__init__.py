@@ -1,3 +1,6 @@
+from .checkpoint import TaskNotResumableError
+from .dedup import IdempotencyConflictError
+from .scheduler import SchedulerFullError
 from .service import BrowserService
 
-__all__ = ['BrowserService'] 
\ No newline at end of file
+__all__ = ['BrowserService', 'IdempotencyConflictError', 'SchedulerFullError', 'TaskNotResumableError']
@@ -0,0 +1,230 @@
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import queue
+import time
+from math import ceil
+
+import psutil
+
+from models.agent import create_browser
+from models.llm import close_llm_clients
+from schemas.browser_task import BrowserTask
+
+from .blob_store import ScreenshotStore
+from .broadcaster import Frame, encode_frame
+from .browser_pool import BrowserPool
+from .config import (
+    get_browser_cdp_url,
+    get_browser_pool_health_check_interval,
+    get_browser_pool_max_age,
+    get_browser_pool_max_idle,
+    get_browser_pool_min_size,
+    get_metrics_sample_interval,
+    get_metrics_window_size,
+    get_screenshot_dedup_distance,
+    get_screenshot_executor,
+    get_screenshot_store_dir,
+    get_screenshot_workers,
+    get_thumbnail_format,
+    get_thumbnail_quality,
+    get_thumbnail_width,
+)
+from .executor import execute_agent_task
+from .metrics import SystemMetricsCollector
+from .screenshot_pipeline import ScreenshotPipeline
+from .store.memory import MemoryTaskStore
+
+# API 进程 -> worker 的命令
+COMMAND_RUN = "run"
+COMMAND_CANCEL = "cancel"
+
+# worker -> API 进程的事件
+EVENT_READY = "ready"
+EVENT_APPEND_STEP = "append_step"
+EVENT_SET_RESULT = "set_result"
+EVENT_APPEND_ERROR = "append_error"
+EVENT_UPDATE_STATS = "update_stats"
+EVENT_SAVE_TASK = "save_task"
+EVENT_SAVE_CHECKPOINT = "save_checkpoint"
+EVENT_PUBLISH = "publish"
+EVENT_DONE = "done"
+EVENT_POOL_STATS = "pool_stats"
+
+# 上报浏览器连接池统计的间隔（秒）
+POOL_STATS_INTERVAL = 2.0
+
+# 等待命令超时
+_IDLE = object()
+
+
+class ForwardingTaskStore(MemoryTaskStore):
+    """worker 进程内的任务存储
+
+    执行期间的数据保存在内存中供回调读取，所有写操作同时作为事件发回 API 进程，
+    由 API 进程写入真正的任务存储。
+    """
+    def __init__(self, outbox):
+        super().__init__()
+        self.outbox = outbox
+
+    def _send(self, event: str, task_id: str, payload) -> None:
+        self.outbox.put((event, task_id, payload))
+
+    def save_task(self, task: BrowserTask) -> None:
+        super().save_task(task)
+        self._send(EVENT_SAVE_TASK, task.task_id,
+                   {"status": task.status, "result": task.result, "updated_at": task.updated_at})
+
+    def append_step(self, task_id: str, message: dict) -> None:
+        super().append_step(task_id, message)
+        self._send(EVENT_APPEND_STEP, task_id, message)
+
+    def set_result(self, task_id: str, message: dict) -> None:
+        super().set_result(task_id, message)
+        self._send(EVENT_SET_RESULT, task_id, message)
+
+    def append_error(self, task_id: str, error: dict) -> None:
+        super().append_error(task_id, error)
+        self._send(EVENT_APPEND_ERROR, task_id, error)
+
+    def update_stats(self, task_id: str, **fields) -> None:
+        super().update_stats(task_id, **fields)
+        self._send(EVENT_UPDATE_STATS, task_id, fields)
+
+    def save_checkpoint(self, task_id: str, checkpoint: dict) -> None:
+        self._send(EVENT_SAVE_CHECKPOINT, task_id, checkpoint)
+
+    def forget(self, task_id: str) -> None:
+        """任务结束后释放本进程中的数据"""
+        with self._lock:
+            for data in (self._tasks, self._steps, self._results, self._errors, self._metadata, self._stats):
+                data.pop(task_id, None)
+
+
+class ForwardingBroadcaster:
+    """worker 进程内的广播器，消息发回 API 进程后由其广播器推送给订阅者"""
+    def __init__(self, outbox):
+        self.outbox = outbox
+
+    def publish(self, task_id: str, message: dict,
+                attachments: dict[str, bytes] | None = None) -> Frame:
+        self.outbox.put((EVENT_PUBLISH, task_id, (message, attachments)))
+        return encode_frame(message, attachments)
+
+    async def wait_writable(self, task_id: str, timeout: float | None = None) -> None:
+        """订阅者队列在 API 进程中，由其广播器按队列上限处理积压"""
+
+    def close(self, task_id: str) -> None:
+        """消息流由 API 进程在任务结束后关闭"""
+
+
+class AgentWorker:
+    """Agent worker 进程
+
+    拥有独立的浏览器连接池、截图流水线和系统指标采样，从 inbox 接收任务，
+    执行过程中产生的存储写入和广播消息通过 outbox 发回 API 进程。
+    """
+    def __init__(self, index: int, processes: int, max_workers: int, inbox, outbox):
+        self.index = index
+        self.inbox = inbox
+        self.outbox = outbox
+        self.store = ForwardingTaskStore(outbox)
+        self.broadcaster = ForwardingBroadcaster(outbox)
+        self.screenshot_store = ScreenshotStore(get_screenshot_store_dir())
+        self.screenshot_pipeline = ScreenshotPipeline(
+            self.screenshot_store,
+            executor=get_screenshot_executor(),
+            max_workers=get_screenshot_workers(),
+            thumbnail_width=get_thumbnail_width(),
+            thumbnail_format=get_thumbnail_format(),
+            quality=get_thumbnail_quality(),
+            dedup_distance=get_screenshot_dedup_distance()
+        )
+        self.metrics_collector = SystemMetricsCollector(
+            psutil.Process(os.getpid()),
+            interval=get_metrics_sample_interval(),
+            window_size=get_metrics_window_size()
+        )
+        # 任务按负载分配，每个 worker 同时执行的任务不超过总并发数的均分值
+        cdp_url = get_browser_cdp_url()
+        self.browser_pool = BrowserPool(
+            lambda: create_browser(cdp_url),
+            min_size=ceil(get_browser_pool_min_size() / processes),
+            max_size=ceil(max_workers / processes),
+            max_idle=get_browser_pool_max_idle(),
+            max_age=get_browser_pool_max_age(),
+            health_check_interval=get_browser_pool_health_check_interval()
+        )
+        self._running: dict[str, asyncio.Task] = {}
+
+    async def run(self) -> None:
+        """接收并执行任务，收到 None 时退出"""
+        self.metrics_collector.start()
+        await self.browser_pool.start()
+        self.outbox.put((EVENT_READY, None, self.index))
+        print(f"✓ Agent worker {self.index} 已启动 (PID: {os.getpid()})")
+        reported_at = 0.0
+        try:
+            while True:
+                command = await asyncio.to_thread(self._next_command)
+                if command is None:
+                    break
+                # API 进程不再创建浏览器连接池，由各 worker 定期上报统计
+                if time.monotonic() - reported_at >= POOL_STATS_INTERVAL:
+                    self.outbox.put((EVENT_POOL_STATS, None, (self.index, self.browser_pool.get_stats())))
+                    reported_at = time.monotonic()
+                if command is _IDLE:
+                    continue
+                if command[0] == COMMAND_RUN:
+                    _, task, metadata, stats, resume = command
+                    runner = asyncio.create_task(self._run_task(task, metadata, stats, resume))
+                    self._running[task.task_id] = runner
+                elif command[0] == COMMAND_CANCEL:
+                    runner = self._running.get(command[1])
+                    if runner is not None:
+                        runner.cancel()
+        finally:
+            await self.close()
+
+    def _next_command(self):
+        """等待下一个命令，API 进程已退出时返回 None"""
+        try:
+            return self.inbox.get(timeout=1.0)
+        except queue.Empty:
+            parent = multiprocessing.parent_process()
+            return _IDLE if parent is None or parent.is_alive() else None
+
+    async def _run_task(self, task: BrowserTask, metadata: dict, stats: dict, resume: dict | None) -> None:
+        """执行一个任务，结束后发回最终统计数据"""
+        self.store.add_task(task, metadata, stats)
+        try:
+            await execute_agent_task(
+                task, self.store, self.broadcaster, self.browser_pool,
+                self.screenshot_pipeline, self.metrics_collector, resume
+            )
+        finally:
+            # 系统指标等就地修改的统计数据随结束事件一次发回
+            self.outbox.put((EVENT_DONE, task.task_id, self.store.get_stats(task.task_id)))
+            self.store.forget(task.task_id)
+            self._running.pop(task.task_id, None)
+
+    async def close(self) -> None:
+        """取消执行中的任务并释放资源"""
+        for runner in list(self._running.values()):
+            runner.cancel()
+        for runner in list(self._running.values()):
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await runner
+        await self.browser_pool.close()
+        await close_llm_clients()
+        self.metrics_collector.stop()
+        self.screenshot_pipeline.close()
+        self.screenshot_store.close()
+
+
+def run_worker(index: int, processes: int, max_workers: int, inbox, outbox) -> None:
+    """worker 进程入口"""
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(AgentWorker(index, processes, max_workers, inbox, outbox).run())
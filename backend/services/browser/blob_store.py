@@ -0,0 +1,100 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# 常见图片格式的文件头
+_IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"RIFF", "image/webp"),
+)
+
+
+def detect_media_type(data: bytes) -> str:
+    """根据文件头识别图片类型"""
+    for signature, media_type in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return media_type
+    return "application/octet-stream"
+
+
+class ScreenshotStore:
+    """基于内容寻址的截图存储
+
+    截图按 SHA-256 摘要保存在本地磁盘，相同内容只写一次。
+    写盘在后台线程中完成，写入完成前的读取直接返回内存中的数据。
+    """
+    def __init__(self, root: str | Path, max_workers: int = 2):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._pending: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="screenshot-writer")
+
+    def put(self, data: bytes) -> str:
+        """保存截图，返回内容摘要"""
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if digest in self._pending:
+                return digest
+            if self.path(digest).exists():
+                return digest
+            self._pending[digest] = data
+        self._executor.submit(self._write, digest, data)
+        return digest
+
+    def path(self, digest: str) -> Path:
+        """获取摘要对应的文件路径"""
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def exists(self, digest: str) -> bool:
+        """截图是否存在（包括尚未写盘的截图）"""
+        return digest in self._pending or self.path(digest).exists()
+
+    def get(self, digest: str) -> bytes | None:
+        """读取截图内容"""
+        data = self._pending.get(digest)
+        if data is not None:
+            return data
+        path = self.path(digest)
+        if not path.exists():
+            return None
+        return path.read_bytes()
+
+    def locate(self, digest: str) -> tuple[Path | None, bytes | None, str] | None:
+        """定位截图并识别图片类型，返回 (文件路径, 尚未写盘的数据, 媒体类型)，不存在时返回 None
+
+        已写盘的截图只读取文件头，内容由调用方直接从文件发送。会访问磁盘，异步代码中应在线程池调用。
+        """
+        data = self._pending.get(digest)
+        if data is not None:
+            return None, data, detect_media_type(data)
+        path = self.path(digest)
+        try:
+            with path.open("rb") as f:
+                header = f.read(16)
+        except FileNotFoundError:
+            # 可能刚好在读取之间写盘完成
+            data = self._pending.get(digest)
+            return (None, data, detect_media_type(data)) if data is not None else None
+        return path, None, detect_media_type(header)
+
+    def close(self) -> None:
+        """等待写盘完成并关闭线程池"""
+        self._executor.shutdown(wait=True)
+
+    def _write(self, digest: str, data: bytes) -> None:
+        """原子地写入截图文件"""
+        path = self.path(digest)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Warning - 保存截图失败 ({digest}): {str(e)}")
+        finally:
+            with self._lock:
+                self._pending.pop(digest, None)
@@ -0,0 +1,287 @@
+import asyncio
+from collections import deque
+
+from core import telemetry
+from schemas.browser_task import log_ws_message
+
+from .protocol import (
+    PROTOCOL_JSON,
+    PROTOCOL_MSGPACK,
+    PROTOCOL_SSE,
+    encode_json,
+    encode_msgpack,
+    encode_sse,
+)
+
+
+class Frame:
+    """消息帧
+
+    每种编码只在第一个需要它的订阅者发送时序列化一次，之后所有订阅者共享结果。
+    附件（如缩略图字节）只在二进制协议中内联发送。
+    """
+    __slots__ = ("type", "sequence", "message", "attachments", "_encoded")
+
+    def __init__(self, message: dict, attachments: dict[str, bytes] | None = None):
+        self.type = message.get("type", "")
+        self.sequence = message.get("sequence")
+        self.message = message
+        self.attachments = attachments
+        self._encoded: dict[str, str | bytes] = {}
+
+    @property
+    def text(self) -> str:
+        """JSON 文本编码"""
+        return self.encode(PROTOCOL_JSON)
+
+    def encode(self, protocol: str = PROTOCOL_JSON) -> str | bytes:
+        """按协议编码，结果缓存"""
+        encoded = self._encoded.get(protocol)
+        if encoded is None:
+            if protocol == PROTOCOL_MSGPACK:
+                encoded = encode_msgpack(self.message, self.attachments)
+            elif protocol == PROTOCOL_SSE:
+                encoded = encode_sse(self.message)
+            else:
+                encoded = encode_json(self.message)
+            self._encoded[protocol] = encoded
+        return encoded
+
+    def without_attachments(self) -> "Frame":
+        """去掉附件的副本，复用已缓存的文本编码（二进制编码内联了附件，需要重新编码）"""
+        frame = Frame(self.message)
+        for protocol in (PROTOCOL_JSON, PROTOCOL_SSE):
+            if protocol in self._encoded:
+                frame._encoded[protocol] = self._encoded[protocol]
+        return frame
+
+
+def encode_frame(message: dict, attachments: dict[str, bytes] | None = None) -> Frame:
+    """将 WSMessage 字典包装为消息帧"""
+    return Frame(message, attachments)
+
+
+# 队列满时的处理策略
+POLICY_BLOCK = "block"
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_COALESCE = "coalesce"
+POLICIES = (POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_COALESCE)
+
+
+class SubscriberQueue:
+    """有界的订阅者发送队列
+
+    接口与 asyncio.Queue 的 put_nowait/get/qsize 相同，队列达到 maxsize 时按策略处理：
+    - block: 生产者在广播前通过 wait_writable 等待队列有空间（超时的订阅者被断开）
+    - drop_oldest: 丢弃最早的消息帧
+    - coalesce: 只保留最新一帧的截图附件，较早的帧去掉附件，文本消息全部保留
+
+    任何策略下积压达到 overflow_limit 时订阅者被断开（队列只剩结束标记），
+    客户端可以用最后收到的序号重连补发，单个慢速客户端不会无限占用内存。
+    """
+    def __init__(self, maxsize: int = 256, policy: str = POLICY_COALESCE, overflow_limit: int | None = None):
+        self.maxsize = max(1, maxsize)
+        self.policy = policy if policy in POLICIES else POLICY_COALESCE
+        self.overflow_limit = max(self.maxsize, overflow_limit or self.maxsize * 4)
+        self.dropped = 0
+        self.coalesced = 0
+        self.evicted = False
+        self._frames: deque[Frame | None] = deque()
+        self._closed = False
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+
+    def qsize(self) -> int:
+        """队列中的消息帧数"""
+        return len(self._frames)
+
+    def empty(self) -> bool:
+        return not self._frames
+
+    def full(self) -> bool:
+        return len(self._frames) >= self.maxsize
+
+    def put_nowait(self, frame: Frame | None) -> None:
+        """放入消息帧，None 表示消息流结束（不受容量限制）"""
+        if self._closed:
+            return
+        if frame is None:
+            self._closed = True
+        elif len(self._frames) >= self.maxsize:
+            if self.policy == POLICY_DROP_OLDEST:
+                self._frames.popleft()
+                self._drop("drop_oldest")
+            elif self.policy == POLICY_COALESCE:
+                self._coalesce(frame)
+            if len(self._frames) >= self.overflow_limit:
+                self.evict()
+                return
+        self._frames.append(frame)
+        self._readable.set()
+        if len(self._frames) >= self.maxsize:
+            self._writable.clear()
+
+    async def get(self) -> Frame | None:
+        """取出下一帧，队列为空时等待"""
+        while not self._frames:
+            self._readable.clear()
+            await self._readable.wait()
+        frame = self._frames.popleft()
+        if len(self._frames) < self.maxsize:
+            self._writable.set()
+        return frame
+
+    async def wait_writable(self) -> None:
+        """block 策略下等待队列低于 maxsize，其他策略立即返回"""
+        if self.policy != POLICY_BLOCK:
+            return
+        while len(self._frames) >= self.maxsize and not self._closed:
+            await self._writable.wait()
+
+    def evict(self) -> None:
+        """断开订阅者：丢弃积压的消息帧，只保留结束标记"""
+        if self._closed and self.evicted:
+            return
+        self._drop("evicted", sum(1 for frame in self._frames if frame is not None))
+        self._frames.clear()
+        self._frames.append(None)
+        self._closed = True
+        self.evicted = True
+        self._readable.set()
+        self._writable.set()
+        print(f"Warning - 订阅者消息积压过多，已断开 (policy: {self.policy}, dropped: {self.dropped})")
+
+    def _coalesce(self, incoming: Frame) -> None:
+        """合并积压的消息帧：被新状态取代的无序号消息丢弃，较早帧的截图附件去掉"""
+        if incoming.sequence is None:
+            superseded = [frame for frame in self._frames
+                          if frame is not None and frame.sequence is None and frame.type == incoming.type]
+            for frame in superseded:
+                self._frames.remove(frame)
+            if superseded:
+                self._drop("coalesced", len(superseded))
+        # 只保留最新一帧的附件（新帧带附件时队列中的全部去掉）
+        keep_latest = not incoming.attachments
+        for index in range(len(self._frames) - 1, -1, -1):
+            frame = self._frames[index]
+            if frame is None or not frame.attachments:
+                continue
+            if keep_latest:
+                keep_latest = False
+                continue
+            self._frames[index] = frame.without_attachments()
+            self.coalesced += 1
+            telemetry.SUBSCRIBER_DROPPED.labels("attachment_coalesced").inc()
+
+    def _drop(self, reason: str, count: int = 1) -> None:
+        if count <= 0:
+            return
+        self.dropped += count
+        telemetry.SUBSCRIBER_DROPPED.labels(reason).inc(count)
+
+    def get_stats(self) -> dict:
+        return {
+            "depth": len(self._frames),
+            "maxsize": self.maxsize,
+            "policy": self.policy,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "evicted": self.evicted
+        }
+
+
+class TaskBroadcaster:
+    """进程内任务消息广播器
+
+    Agent 每产生一条消息只按每种协议序列化一次，然后非阻塞地放入每个订阅者的有界队列，
+    慢速的订阅者按队列策略丢弃或合并消息，积压过多时被断开，不会拖慢 Agent 的执行；
+    block 策略下由异步的生产者在广播前调用 wait_writable 等待。
+    每个执行中的任务保留最近若干条带序号的消息帧，供断线重连的客户端补发。
+    """
+    def __init__(self, replay_buffer_size: int = 100):
+        self.replay_buffer_size = replay_buffer_size
+        self._subscribers: dict[str, set[SubscriberQueue]] = {}
+        self._buffers: dict[str, deque[Frame]] = {}
+
+    def subscribe(self, task_id: str, queue: SubscriberQueue) -> None:
+        """订阅任务消息"""
+        self._subscribers.setdefault(task_id, set()).add(queue)
+
+    def unsubscribe(self, task_id: str, queue: SubscriberQueue) -> None:
+        """取消订阅"""
+        subscribers = self._subscribers.get(task_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[task_id]
+
+    def subscriber_count(self, task_id: str | None = None) -> int:
+        """获取订阅者数量，不指定任务时返回全部订阅者数量"""
+        if task_id is not None:
+            return len(self._subscribers.get(task_id, ()))
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, task_id: str, message: dict,
+                attachments: dict[str, bytes] | None = None) -> Frame:
+        """广播消息给任务的所有订阅者"""
+        log_ws_message(message)
+        frame = encode_frame(message, attachments)
+        if frame.sequence is not None and self.replay_buffer_size > 0:
+            buffer = self._buffers.get(task_id)
+            if buffer is None:
+                buffer = self._buffers[task_id] = deque(maxlen=self.replay_buffer_size)
+            buffer.append(frame)
+        for queue in list(self._subscribers.get(task_id, ())):
+            queue.put_nowait(frame)
+        return frame
+
+    async def wait_writable(self, task_id: str, timeout: float | None = None) -> None:
+        """等待任务的所有订阅者队列有空间（只有 block 策略的队列会等待）
+
+        超时仍未腾出空间的订阅者被断开，避免一个卡住的客户端让任务无限期暂停。
+        """
+        queues = list(self._subscribers.get(task_id, ()))
+        if not queues:
+            return
+        waiters = {asyncio.ensure_future(queue.wait_writable()): queue for queue in queues}
+        done, pending = await asyncio.wait(waiters, timeout=timeout)
+        for waiter in pending:
+            waiter.cancel()
+            waiters[waiter].evict()
+
+    def get_queue_stats(self) -> dict:
+        """订阅者发送队列统计（当前积压与累计丢弃）"""
+        queues = [queue for subscribers in self._subscribers.values() for queue in subscribers]
+        return {
+            "subscribers": len(queues),
+            "queued_frames": self.queued_frames(),
+            "max_depth": max((queue.qsize() for queue in queues), default=0),
+            "dropped": {
+                reason: telemetry.SUBSCRIBER_DROPPED.labels(reason).value
+                for reason in ("drop_oldest", "coalesced", "attachment_coalesced", "evicted")
+            }
+        }
+
+    def queued_frames(self) -> int:
+        """所有订阅者队列中积压的消息帧数"""
+        return sum(queue.qsize() for subscribers in self._subscribers.values() for queue in subscribers)
+
+    def replay(self, task_id: str, after_sequence: int) -> list[Frame] | None:
+        """从环形缓冲区取出序号大于 after_sequence 的消息帧
+
+        缓冲区无法覆盖请求的范围时返回 None，由调用方回退到任务存储。
+        """
+        buffer = self._buffers.get(task_id)
+        if not buffer:
+            return None
+        if buffer[0].sequence > after_sequence + 1:
+            return None
+        return [frame for frame in buffer if frame.sequence > after_sequence]
+
+    def close(self, task_id: str) -> None:
+        """任务结束，通知所有订阅者消息流已结束（结束后的补发由任务存储提供）"""
+        self._buffers.pop(task_id, None)
+        for queue in self._subscribers.pop(task_id, set()):
+            queue.put_nowait(None)
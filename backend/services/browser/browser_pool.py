@@ -0,0 +1,261 @@
+import asyncio
+import contextlib
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from core import telemetry
+
+
+@dataclass(eq=False)
+class PooledBrowser:
+    """连接池中的一个浏览器连接"""
+    browser: Any
+    playwright_browser: Any
+    created_at: float = field(default_factory=time.monotonic)
+    last_used_at: float = field(default_factory=time.monotonic)
+    lease_count: int = 0
+
+
+class BrowserPool:
+    """预连接的浏览器连接池
+
+    提前通过 CDP 连接 browserless 并创建好浏览器上下文，任务租用已连接的浏览器，
+    不再在每个任务开始时重新建立连接。归还时重置上下文（清理 Cookie、多余页面），
+    空闲超过 max_idle 或存活超过 max_age 的连接会被关闭并按 min_size 补充。
+    """
+    def __init__(self, factory: Callable[[], Any], min_size: int = 1, max_size: int = 10,
+                 max_idle: float = 300.0, max_age: float = 1800.0, health_check_interval: float = 30.0):
+        self.factory = factory
+        self.max_size = max(1, max_size)
+        self.min_size = min(max(0, min_size), self.max_size)
+        self.max_idle = max_idle
+        self.max_age = max_age
+        self.health_check_interval = health_check_interval
+        self._idle: deque[PooledBrowser] = deque()
+        self._leased: set[PooledBrowser] = set()
+        self._connecting = 0
+        self._condition: asyncio.Condition | None = None
+        self._maintainer: asyncio.Task | None = None
+        self._closed = False
+        self._stats = {"created": 0, "leases": 0, "recycled": 0, "failed": 0}
+
+    @property
+    def size(self) -> int:
+        """池中连接总数（含连接中的）"""
+        return len(self._idle) + len(self._leased) + self._connecting
+
+    @property
+    def idle_count(self) -> int:
+        """空闲连接数"""
+        return len(self._idle)
+
+    @property
+    def leased_count(self) -> int:
+        """已租出的连接数"""
+        return len(self._leased)
+
+    def _get_condition(self) -> asyncio.Condition:
+        """在事件循环中延迟创建条件变量"""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def start(self) -> None:
+        """预热 min_size 个连接并启动后台回收任务"""
+        if self._maintainer is not None:
+            return
+        self._closed = False
+        await self._fill()
+        self._maintainer = asyncio.create_task(self._maintain())
+
+    async def close(self) -> None:
+        """关闭所有空闲连接，已租出的连接在归还时关闭"""
+        self._closed = True
+        if self._maintainer is not None:
+            self._maintainer.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._maintainer
+            self._maintainer = None
+        while self._idle:
+            await self._discard(self._idle.popleft(), "shutdown")
+
+    @contextlib.asynccontextmanager
+    async def lease(self) -> AsyncIterator[Any]:
+        """租用一个已连接的浏览器，退出时归还"""
+        pooled = await self.acquire()
+        try:
+            yield pooled.browser
+        finally:
+            await self.release(pooled)
+
+    async def acquire(self) -> PooledBrowser:
+        """取出一个健康的空闲连接，没有空闲连接时新建，达到上限时等待归还"""
+        if self._closed:
+            raise RuntimeError("浏览器连接池已关闭")
+        started = time.monotonic()
+        condition = self._get_condition()
+        while True:
+            async with condition:
+                while not self._idle and self.size >= self.max_size:
+                    await condition.wait()
+                pooled = self._idle.pop() if self._idle else None
+                if pooled is None:
+                    self._connecting += 1
+                else:
+                    self._leased.add(pooled)
+
+            if pooled is None:
+                try:
+                    pooled = await self._connect()
+                except Exception:
+                    # 连接失败后释放名额，唤醒等待者
+                    self._connecting -= 1
+                    async with condition:
+                        condition.notify()
+                    raise
+                self._connecting -= 1
+                self._leased.add(pooled)
+            elif self._expired(pooled, time.monotonic()) or not await self._healthy(pooled):
+                self._leased.discard(pooled)
+                await self._discard(pooled, "unhealthy")
+                continue
+
+            pooled.lease_count += 1
+            self._stats["leases"] += 1
+            telemetry.BROWSER_POOL_LEASE_WAIT.observe(time.monotonic() - started)
+            return pooled
+
+    async def release(self, pooled: PooledBrowser) -> None:
+        """归还连接：重置上下文后放回空闲队列，重置失败或已过期时关闭"""
+        self._leased.discard(pooled)
+        try:
+            if self._closed or self._expired(pooled, time.monotonic()):
+                await self._discard(pooled, "expired")
+                return
+            try:
+                await self._reset(pooled)
+            except Exception as e:
+                print(f"Warning - 重置浏览器上下文失败，关闭连接: {str(e)}")
+                await self._discard(pooled, "reset_failed")
+                return
+            pooled.last_used_at = time.monotonic()
+            self._idle.append(pooled)
+        finally:
+            condition = self._get_condition()
+            async with condition:
+                condition.notify()
+
+    async def _connect(self) -> PooledBrowser:
+        """建立新连接并预先创建浏览器上下文"""
+        browser = self.factory()
+        try:
+            playwright_browser = await browser.get_playwright_browser()
+            if not playwright_browser.contexts:
+                await playwright_browser.new_context()
+        except Exception:
+            self._stats["failed"] += 1
+            telemetry.BROWSER_POOL_EVENTS.labels("connect_failed").inc()
+            with contextlib.suppress(Exception):
+                await browser.close()
+            raise
+        self._stats["created"] += 1
+        telemetry.BROWSER_POOL_EVENTS.labels("created").inc()
+        return PooledBrowser(browser=browser, playwright_browser=playwright_browser)
+
+    async def _reset(self, pooled: PooledBrowser) -> None:
+        """重置上下文：只保留一个上下文和一个空白页，清除 Cookie"""
+        playwright_browser = pooled.playwright_browser
+        contexts = list(playwright_browser.contexts)
+        for extra in contexts[1:]:
+            await extra.close()
+        context = contexts[0] if contexts else await playwright_browser.new_context()
+        await context.clear_cookies()
+        pages = list(context.pages)
+        for page in pages[1:]:
+            await page.close()
+        if pages:
+            await pages[0].goto("about:blank")
+        else:
+            await context.new_page()
+
+    async def _healthy(self, pooled: PooledBrowser) -> bool:
+        """检查连接是否可用（一次协议往返）"""
+        try:
+            if not pooled.playwright_browser.is_connected():
+                return False
+            contexts = pooled.playwright_browser.contexts
+            if not contexts:
+                return False
+            await contexts[0].cookies()
+            return True
+        except Exception:
+            return False
+
+    def _expired(self, pooled: PooledBrowser, now: float) -> bool:
+        """是否超过最大存活时间"""
+        return self.max_age > 0 and now - pooled.created_at > self.max_age
+
+    async def _discard(self, pooled: PooledBrowser, reason: str) -> None:
+        """关闭连接"""
+        self._stats["recycled"] += 1
+        telemetry.BROWSER_POOL_EVENTS.labels(f"recycled_{reason}").inc()
+        with contextlib.suppress(Exception):
+            await pooled.browser.close()
+
+    async def _fill(self) -> None:
+        """补充空闲连接到 min_size"""
+        while not self._closed and self.size < self.min_size:
+            self._connecting += 1
+            try:
+                pooled = await self._connect()
+            except Exception as e:
+                print(f"Warning - 预热浏览器连接失败: {str(e)}")
+                return
+            finally:
+                self._connecting -= 1
+            pooled.last_used_at = time.monotonic()
+            self._idle.append(pooled)
+            condition = self._get_condition()
+            async with condition:
+                condition.notify()
+
+    async def _maintain(self) -> None:
+        """后台回收空闲过久、超龄或不健康的连接，并补充到 min_size"""
+        while not self._closed:
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                await self._sweep()
+                await self._fill()
+            except Exception as e:
+                print(f"Warning - 浏览器连接池维护出错: {str(e)}")
+
+    async def _sweep(self) -> None:
+        """检查空闲连接"""
+        now = time.monotonic()
+        for pooled in list(self._idle):
+            if pooled not in self._idle:
+                continue
+            reason = None
+            if self._expired(pooled, now):
+                reason = "expired"
+            elif self.max_idle > 0 and now - pooled.last_used_at > self.max_idle and self.size > self.min_size:
+                reason = "idle"
+            elif not await self._healthy(pooled):
+                reason = "unhealthy"
+            if reason and pooled in self._idle:
+                self._idle.remove(pooled)
+                await self._discard(pooled, reason)
+
+    def get_stats(self) -> dict:
+        """连接池统计"""
+        return {
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "size": self.size,
+            "idle": self.idle_count,
+            "leased": self.leased_count,
+            **self._stats
+        }
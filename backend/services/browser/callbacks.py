@@ -1,194 +1,399 @@
 import asyncio
+import functools
+import time
 import traceback
+from collections import deque
 from collections.abc import Callable
-from datetime import datetime
+from concurrent.futures import Future
+from dataclasses import dataclass
+from datetime import datetime, timedelta
 from typing import Any
 
-from schemas.browser_task import Action, ResultMessage, StepMessage, WSMessage
+from core import telemetry
+from core.serialization import ws_message_dict
+from schemas.browser_task import Action, ResultMessage, StepMessage
+
+from .broadcaster import TaskBroadcaster
+from .screenshot_pipeline import ProcessedScreenshot, ScreenshotPipeline
+from .step_timing import PHASE_BACKPRESSURE, StepTimer
+from .store import TaskStore
+
+
+@dataclass(slots=True)
+class StepSnapshot:
+    """步骤回调采集的原始数据，消息在处理阶段构造"""
+    sequence: int
+    step: int
+    state: Any
+    output: Any
+    started_at: datetime
+    completed_at: datetime
+    timings: dict
+
+
+@dataclass(slots=True)
+class DoneSnapshot:
+    """完成回调采集的原始数据"""
+    sequence: int
+    history: Any
+    completed_at: datetime
 
 
 class CallbackManager:
-    """回调管理器"""
-    def __init__(self, task_id: str, task_stats: dict, task_steps: dict, task_result: dict,
-                 metrics_collector: Any, error_handler: Any, message_queue: asyncio.Queue):
+    """回调管理器
+
+    Agent 的回调只分配序号、结束步骤计时并把原始快照放入队列，立即返回；
+    独立的处理协程按顺序构造步骤和结果消息、处理截图、保存并广播。
+    队列中待处理的快照达到 max_pending 时，下一个步骤开始前等待处理协程追上。
+    订阅者队列使用 block 策略时，步骤消息广播前等待订阅者（最多 subscriber_timeout 秒），
+    慢速客户端的压力经由快照队列传递到 Agent 的步骤边界。
+    """
+    def __init__(self, task_id: str, store: TaskStore, metrics_collector: Any,
+                 error_handler: Any, broadcaster: TaskBroadcaster,
+                 screenshot_pipeline: ScreenshotPipeline, keep_full_screenshots: bool = False,
+                 start_sequence: int = 0, start_step: int | None = None, max_pending: int = 4,
+                 subscriber_timeout: float | None = None, metrics_samples: int = 20):
         self.task_id = task_id
-        self.task_stats = task_stats
-        self.task_steps = task_steps
-        self.task_result = task_result
+        self.store = store
+        self.screenshot_pipeline = screenshot_pipeline
+        self.keep_full_screenshots = keep_full_screenshots
         self.metrics_collector = metrics_collector
         self.error_handler = error_handler
-        self.message_queue = message_queue
-        self.sequence_number = 0
+        self.broadcaster = broadcaster
+        # 恢复执行的任务接着已发布的消息序号和步骤编号继续
+        self.sequence_number = start_sequence
+        self.step_count = store.get_step_count(task_id) if start_step is None else start_step
         self.loop = asyncio.get_event_loop()
+        # 步骤阶段计时，第一步从任务开始计时
+        self.step_timer = StepTimer()
+
+        # 最近若干步骤的系统指标，整体通过 update_stats 写入，统计数据大小不随步骤数增长
+        self._metrics_samples: deque[dict] = deque(
+            store.get_stats(task_id).get("system_metrics") or (), maxlen=max(0, metrics_samples)
+        )
+
+        # 截图去重状态
+        self._last_screenshot: str | None = None
+        self._last_processed: ProcessedScreenshot | None = None
+        self._last_refs: dict = {}
+
+        # 快照处理队列
+        self.max_pending = max(1, max_pending)
+        self._queue: asyncio.Queue[StepSnapshot | DoneSnapshot] = asyncio.Queue()
+        self._space = asyncio.Event()
+        self._consumer: asyncio.Task | None = None
+        self.subscriber_timeout = subscriber_timeout
+
+    def next_sequence(self) -> int:
+        """获取下一个消息序号"""
+        self.sequence_number += 1
+        return self.sequence_number
+
+    def instrument(self, agent: Any) -> None:
+        """包装 agent.step：待处理的快照过多时，在步骤开始前等待处理协程追上"""
+        original = agent.step
+
+        @functools.wraps(original)
+        async def step(*args, **kwargs):
+            if self._queue.qsize() >= self.max_pending:
+                started = time.perf_counter()
+                while self._queue.qsize() >= self.max_pending:
+                    self._space.clear()
+                    await self._space.wait()
+                self.step_timer.add(PHASE_BACKPRESSURE, time.perf_counter() - started)
+            return await original(*args, **kwargs)
+
+        agent.step = step
+
+    async def drain(self) -> None:
+        """等待所有已排队的快照处理完成"""
+        # 其他线程通过 call_soon_threadsafe 提交的快照先入队
+        await asyncio.sleep(0)
+        await self._queue.join()
+
+    def close(self) -> None:
+        """停止处理协程"""
+        if self._consumer is not None:
+            self._consumer.cancel()
+            self._consumer = None
+
+    def _put(self, snapshot: StepSnapshot | DoneSnapshot) -> None:
+        """放入处理队列（可在任意线程调用）"""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not self.loop:
+            self.loop.call_soon_threadsafe(self._put, snapshot)
+            return
+        if self._consumer is None:
+            self._consumer = self.loop.create_task(self._consume())
+        self._queue.put_nowait(snapshot)
+
+    async def _consume(self) -> None:
+        """按提交顺序处理快照"""
+        while True:
+            snapshot = await self._queue.get()
+            self._space.set()
+            try:
+                if isinstance(snapshot, StepSnapshot):
+                    await self._process_step(snapshot)
+                else:
+                    self._process_done(snapshot)
+            except Exception as e:
+                print(f"Error in callback processing: {e}")
+                print(traceback.format_exc())
+                step = snapshot.step if isinstance(snapshot, StepSnapshot) else None
+                self.error_handler.handle_error(self.task_id, e, step=step)
+            finally:
+                self._queue.task_done()
+
+    def _screenshot_urls(self, step: int, refs: dict) -> dict:
+        """生成截图引用和下载地址"""
+        base_url = f"/api/tasks/{self.task_id}/steps/{step}/screenshot"
+        return {
+            "screenshot_ref": refs.get("screenshot_ref"),
+            "thumbnail_ref": refs.get("thumbnail_ref"),
+            "screenshot_url": base_url if refs.get("screenshot_ref") else None,
+            "thumbnail_url": f"{base_url}?variant=thumbnail" if refs.get("thumbnail_ref") else None
+        }
+
+    async def _process_step(self, snapshot: StepSnapshot) -> None:
+        """构造步骤消息，等待截图处理完成后保存并广播"""
+        started = time.perf_counter()
+        state, output = snapshot.state, snapshot.output
+        current_step = snapshot.step
+
+        # 获取系统资源使用情况（后台采样的最新值）
+        system_metrics = self.metrics_collector.get_metrics()
+        self._metrics_samples.append({
+            "timestamp": snapshot.completed_at.isoformat(),
+            "step": current_step,
+            "metrics": system_metrics
+        })
+
+        # 截图交给流水线处理，与上一步字节相同的截图直接复用
+        screenshot = getattr(state, 'screenshot', None)
+        screenshot_future = None
+        unchanged = False
+        if screenshot and screenshot == self._last_screenshot:
+            unchanged = True
+        elif screenshot:
+            screenshot_future = self.screenshot_pipeline.submit(screenshot)
+            self._last_screenshot = screenshot
+
+        message_dict = self._build_step_message(snapshot, system_metrics)
+
+        # 更新统计数据
+        self.store.update_stats(
+            self.task_id,
+            step_count=current_step,
+            last_activity=snapshot.completed_at.isoformat(),
+            system_metrics=list(self._metrics_samples)
+        )
+
+        await self._finalize_step(message_dict, screenshot_future, unchanged)
+        self.step_timer.record_finalize(time.perf_counter() - started)
+
+        # 记录简要日志
+        print(f"\n步骤 {current_step}: {state.url}")
+        print(f"评估: {output.current_state.evaluation_previous_goal}")
+        print(f"下一步: {output.current_state.next_goal}")
+
+    def _build_step_message(self, snapshot: StepSnapshot, system_metrics: dict) -> dict:
+        """根据快照构造步骤消息"""
+        state, output = snapshot.state, snapshot.output
+
+        # 处理浏览器状态
+        browser_state = {
+            "url": state.url,
+            "title": getattr(state, 'title', None),
+            "content": getattr(state, 'content', None),
+            "elements": getattr(state, 'elements', None)
+        }
+
+        # 处理动作列表
+        actions = []
+        for action in output.action:
+            try:
+                action_type = action.__class__.__name__.replace('Action', '').lower()
+                action_args = {k: v for k, v in vars(action).items() if not k.startswith('_')}
+
+                action_obj = Action(
+                    type=action_type,
+                    args=action_args,
+                    status="pending",
+                    timestamp=snapshot.completed_at.isoformat()
+                )
+                actions.append(action_obj.model_dump())
+            except Exception as e:
+                print(f"Warning - 处理动作时出错: {str(e)}")
+                continue
+
+        # 创建步骤消息
+        step_start_time_str = snapshot.started_at.isoformat()
+        current_time_str = snapshot.completed_at.isoformat()
+
+        message_dict = ws_message_dict(
+            "step",
+            StepMessage(
+                step=snapshot.step,
+                url=state.url,
+                status="completed",
+                evaluation=output.current_state.evaluation_previous_goal,
+                memory=output.current_state.memory,
+                next_goal=output.current_state.next_goal,
+                actions=actions,
+                started_at=step_start_time_str,
+                completed_at=current_time_str,
+                metadata={
+                    "browser_state": browser_state,
+                    "performance": system_metrics
+                }
+            ).model_dump(),
+            timestamp=current_time_str,
+            session_id=self.task_id,
+            sequence=snapshot.sequence
+        )
+
+        # 记录各阶段耗时
+        message_dict["data"]["duration"] = snapshot.timings["total"]
+        message_dict["data"]["metadata"]["timings"] = snapshot.timings
+        telemetry.STEP_DURATION.observe(snapshot.timings["total"])
+        return message_dict
+
+    async def _finalize_step(self, message_dict: dict, screenshot_future: Future | None,
+                             unchanged: bool) -> None:
+        """等待截图处理完成，补全截图引用后保存并广播步骤消息"""
+        data = message_dict["data"]
+        attachments = None
+        try:
+            if screenshot_future is not None:
+                processed = await asyncio.wrap_future(screenshot_future)
+                if self.screenshot_pipeline.is_duplicate(self._last_processed, processed):
+                    unchanged = True
+                else:
+                    self._last_refs = self.screenshot_pipeline.save(processed, self.keep_full_screenshots)
+                    self._last_processed = processed
+                    # 二进制协议的订阅者直接收到缩略图字节
+                    attachments = {"thumbnail": processed.thumbnail}
+            if screenshot_future is not None or unchanged:
+                data.update(self._screenshot_urls(data["step"], self._last_refs))
+                data["screenshot_unchanged"] = unchanged
+                if self._last_refs:
+                    self.store.record_screenshot_refs(
+                        self.task_id, data["step"],
+                        self._last_refs.get("screenshot_ref"), self._last_refs.get("thumbnail_ref")
+                    )
+        except Exception as e:
+            print(f"Warning - 处理截图时出错: {str(e)}")
+
+        self.store.append_step(self.task_id, message_dict)
+        await self.broadcaster.wait_writable(self.task_id, self.subscriber_timeout)
+        self.broadcaster.publish(self.task_id, message_dict, attachments)
+
+    def _process_done(self, snapshot: DoneSnapshot) -> None:
+        """在所有步骤消息之后构造、保存并广播结果消息"""
+        history = snapshot.history
+
+        # 计算任务统计数据
+        total_steps = self.step_count
+        error_count = len(self.store.get_errors(self.task_id))
+        stats = self.store.get_stats(self.task_id)
+        end_time_str = snapshot.completed_at.isoformat()
+        start_time = datetime.fromisoformat(stats["started_at"])
+        duration = (snapshot.completed_at - start_time).total_seconds()
+
+        # 更新任务统计
+        self.store.update_stats(
+            self.task_id,
+            completed_at=end_time_str,
+            duration=duration,
+            last_activity=end_time_str
+        )
+
+        # 获取最终结果
+        final_result = None
+        if history.history and history.history[-1].result:
+            final_result = history.history[-1].result[-1].extracted_content
+
+        # 创建结果消息
+        result = ResultMessage(
+            final_result=final_result,
+            total_steps=total_steps,
+            success=history.is_done(),
+            status="completed",
+            started_at=stats["started_at"],
+            completed_at=end_time_str,
+            duration=duration,
+            error_count=error_count,
+            retry_count=stats["retry_count"],
+            summary=f"任务执行完成，共执行 {total_steps} 个步骤，用时 {duration:.2f} 秒",
+            metadata={
+                "performance_metrics": {
+                    "average_step_duration": duration / total_steps if total_steps > 0 else 0,
+                    "error_rate": error_count / total_steps if total_steps > 0 else 0,
+                    "step_timings": self.step_timer.summary()
+                }
+            }
+        )
+
+        message_dict = ws_message_dict(
+            "result",
+            result.model_dump(),
+            timestamp=end_time_str,
+            session_id=self.task_id,
+            sequence=snapshot.sequence
+        )
+        self.store.set_result(self.task_id, message_dict)
+        self.broadcaster.publish(self.task_id, message_dict)
+
+        # 记录简要日志
+        print("\n任务完成:")
+        print(f"总步数: {total_steps}")
+        print(f"执行时长: {duration:.2f}秒")
+        print(f"最终结果: {final_result}")
 
     def create_step_callback(self) -> Callable:
-        """创建步骤回调函数"""
+        """创建步骤回调函数：只采集快照并放入处理队列"""
         def step_callback(state, output, step):
+            callback_started = time.perf_counter()
             try:
-                self.sequence_number += 1
-                current_step = len(self.task_steps[self.task_id]) + 1
-                step_start_time = datetime.now()
-                
-                # 获取系统资源使用情况
-                system_metrics = self.metrics_collector.get_metrics()
-                self.task_stats[self.task_id]["system_metrics"].append({
-                    "timestamp": datetime.now().isoformat(),
-                    "step": current_step,
-                    "metrics": system_metrics
-                })
-                
-                # 处理浏览器状态
-                browser_state = {
-                    "url": state.url,
-                    "title": getattr(state, 'title', None),
-                    "content": getattr(state, 'content', None),
-                    "elements": getattr(state, 'elements', None),
-                    "screenshot": state.screenshot[:100] + "..." if hasattr(state, 'screenshot') and state.screenshot else None
-                }
-                
-                # 处理动作列表
-                actions = []
-                for action in output.action:
-                    try:
-                        action_type = action.__class__.__name__.replace('Action', '').lower()
-                        action_args = {k: v for k, v in vars(action).items() if not k.startswith('_')}
-                        
-                        action_obj = Action(
-                            type=action_type,
-                            args=action_args,
-                            status="pending",
-                            timestamp=datetime.now().isoformat()
-                        )
-                        actions.append(action_obj.model_dump())
-                    except Exception as e:
-                        print(f"Warning - 处理动作时出错: {str(e)}")
-                        continue
-                
-                # 创建步骤消息
-                step_start_time_str = step_start_time.isoformat()
-                current_time_str = datetime.now().isoformat()
-                
-                message = WSMessage(
-                    type="step",
-                    data=StepMessage(
-                        step=current_step,
-                        url=state.url,
-                        status="completed",
-                        evaluation=output.current_state.evaluation_previous_goal,
-                        memory=output.current_state.memory,
-                        next_goal=output.current_state.next_goal,
-                        actions=actions,
-                        screenshot=state.screenshot,
-                        started_at=step_start_time_str,
-                        completed_at=current_time_str,
-                        metadata={
-                            "browser_state": browser_state,
-                            "performance": system_metrics
-                        }
-                    ).model_dump(),
-                    timestamp=current_time_str,
-                    session_id=self.task_id,
-                    sequence=self.sequence_number
-                )
-                
-                # 更新统计数据
-                self.task_stats[self.task_id].update({
-                    "step_count": current_step,
-                    "last_activity": current_time_str
-                })
-                
-                # 将消息转换为 JSON 格式并缓存
-                message_dict = message.model_dump()
-                self.task_steps[self.task_id].append(message_dict)
-                
-                # 发送消息
-                self.loop.call_soon_threadsafe(
-                    lambda: asyncio.create_task(self.message_queue.put(message_dict))
+                sequence = self.next_sequence()
+                self.step_count += 1
+                # 步骤从上一次回调结束开始，包括上一步动作执行、状态获取和 LLM 调用
+                step_start_time = datetime.now() - timedelta(
+                    seconds=time.monotonic() - self.step_timer.window_started
                 )
-                
-                # 记录简要日志
-                print(f"\n步骤 {current_step}: {state.url}")
-                print(f"评估: {output.current_state.evaluation_previous_goal}")
-                print(f"下一步: {output.current_state.next_goal}")
-                
+                timings = self.step_timer.finish_step(callback_started)
+                self._put(StepSnapshot(
+                    sequence=sequence,
+                    step=self.step_count,
+                    state=state,
+                    output=output,
+                    started_at=step_start_time,
+                    completed_at=datetime.now(),
+                    timings=timings
+                ))
             except Exception as e:
                 print(f"Error in step_callback: {e}")
                 print(traceback.format_exc())
-                self.error_handler.handle_error(self.task_id, e, step=current_step)
-        
+                self.error_handler.handle_error(self.task_id, e, step=self.step_count)
+
         return step_callback
 
     def create_done_callback(self) -> Callable:
-        """创建完成回调函数"""
+        """创建完成回调函数：只采集快照并放入处理队列"""
         def done_callback(history):
             try:
-                self.sequence_number += 1
-                
-                # 计算任务统计数据
-                total_steps = len(self.task_steps[self.task_id])
-                end_time = datetime.now()
-                end_time_str = end_time.isoformat()
-                start_time = datetime.fromisoformat(self.task_stats[self.task_id]["started_at"])
-                duration = (end_time - start_time).total_seconds()
-                
-                # 更新任务统计
-                self.task_stats[self.task_id].update({
-                    "completed_at": end_time_str,
-                    "duration": duration,
-                    "last_activity": end_time_str
-                })
-                
-                # 获取最终结果
-                final_result = None
-                if history.history and history.history[-1].result:
-                    final_result = history.history[-1].result[-1].extracted_content
-                
-                # 创建结果消息
-                result = ResultMessage(
-                    final_result=final_result,
-                    total_steps=total_steps,
-                    success=history.is_done(),
-                    status="completed",
-                    started_at=self.task_stats[self.task_id]["started_at"],
-                    completed_at=end_time_str,
-                    duration=duration,
-                    error_count=len(self.task_errors[self.task_id]),
-                    retry_count=self.task_stats[self.task_id]["retry_count"],
-                    summary=f"任务执行完成，共执行 {total_steps} 个步骤，用时 {duration:.2f} 秒",
-                    metadata={
-                        "performance_metrics": {
-                            "average_step_duration": duration / total_steps if total_steps > 0 else 0,
-                            "error_rate": len(self.task_errors[self.task_id]) / total_steps if total_steps > 0 else 0
-                        }
-                    }
-                )
-                
-                message = WSMessage(
-                    type="result",
-                    data=result.model_dump(),
-                    timestamp=end_time_str,
-                    session_id=self.task_id,
-                    sequence=self.sequence_number
-                )
-                
-                # 将消息转换为 JSON 格式并缓存
-                message_dict = message.model_dump()
-                self.task_result[self.task_id] = message_dict
-                
-                # 发送消息
-                self.loop.call_soon_threadsafe(
-                    lambda: asyncio.create_task(self.message_queue.put(message_dict))
-                )
-                
-                # 记录简要日志
-                print("\n任务完成:")
-                print(f"总步数: {total_steps}")
-                print(f"执行时长: {duration:.2f}秒")
-                print(f"最终结果: {final_result}")
-                
+                self._put(DoneSnapshot(
+                    sequence=self.next_sequence(),
+                    history=history,
+                    completed_at=datetime.now()
+                ))
             except Exception as e:
                 print(f"Error in done_callback: {e}")
                 print(traceback.format_exc())
                 self.error_handler.handle_error(self.task_id, e)
-        
-        return done_callback 
\ No newline at end of file
+
+        return done_callback
@@ -0,0 +1,186 @@
+import functools
+import time
+from datetime import datetime
+from typing import Any
+
+from langchain_core.load import dumpd, load
+
+from .store import TaskStore
+
+CHECKPOINT_VERSION = 1
+
+# 恢复断点时直接设置的 Agent 属性
+_AGENT_ATTRIBUTES = ("history", "n_steps", "consecutive_failures", "_last_result", "AgentOutput", "message_manager")
+
+
+class TaskNotResumableError(Exception):
+    """任务已完成或正在其他 worker 上执行，不能恢复"""
+    def __init__(self, task_id: str, reason: str):
+        self.task_id = task_id
+        self.reason = reason
+        super().__init__(f"任务 {task_id} 无法恢复执行: {reason}")
+
+
+class CheckpointIncompatibleError(Exception):
+    """断点与当前 Agent 不兼容，任务只能从第一步重新执行"""
+
+
+class AgentCheckpointer:
+    """Agent 执行断点
+
+    每完成 interval 个步骤（动作执行完毕后）保存一次断点：Agent 历史（不含截图）、
+    LLM 对话上下文、当前页面 URL，include_storage 时还包含浏览器存储状态（cookies、localStorage）。
+    恢复时用断点重建 Agent，已完成的步骤不再调用 LLM。
+    """
+    def __init__(self, task_id: str, store: TaskStore, interval: int = 1, include_storage: bool = False):
+        self.task_id = task_id
+        self.store = store
+        self.interval = interval
+        self.include_storage = include_storage
+        self.saved = 0
+        self._steps = 0
+
+    def instrument(self, agent: Any) -> None:
+        """包装 agent.step，每个步骤结束后保存断点"""
+        if self.interval <= 0:
+            return
+        original = agent.step
+
+        @functools.wraps(original)
+        async def step(*args, **kwargs):
+            result = await original(*args, **kwargs)
+            self._steps += 1
+            if self._steps % self.interval == 0:
+                await self.save(agent)
+            return result
+
+        agent.step = step
+
+    async def save(self, agent: Any) -> None:
+        """保存断点，失败时只打印警告，不影响任务执行"""
+        started = time.perf_counter()
+        try:
+            checkpoint = await capture_checkpoint(agent, self.include_storage)
+            self.store.save_checkpoint(self.task_id, checkpoint)
+            self.saved += 1
+        except Exception as e:
+            print(f"Warning - 保存任务断点失败 ({self.task_id}): {str(e)}")
+            return
+        print(f"✓ 已保存断点 (步骤: {checkpoint['n_steps'] - 1}, 耗时: {time.perf_counter() - started:.3f}秒)")
+
+
+async def capture_checkpoint(agent: Any, include_storage: bool = False) -> dict:
+    """采集 Agent 的可恢复状态"""
+    # AgentHistoryList 自定义了 model_dump（按实际动作模型导出动作参数）
+    history = agent.history.model_dump()
+    # 截图占断点的绝大部分体积，恢复时也用不到
+    for item in history.get("history", []):
+        if isinstance(item.get("state"), dict):
+            item["state"]["screenshot"] = None
+    messages = None
+    managed = _managed_messages(agent)
+    if managed is not None:
+        messages = [dumpd(getattr(item, "message", item)) for item in managed]
+
+    url = None
+    storage_state = None
+    browser_context = getattr(agent, "browser_context", None)
+    if browser_context is not None:
+        page = await browser_context.get_current_page()
+        url = page.url
+        if include_storage:
+            storage_state = await page.context.storage_state()
+
+    return {
+        "version": CHECKPOINT_VERSION,
+        "n_steps": agent.n_steps,
+        "consecutive_failures": getattr(agent, "consecutive_failures", 0),
+        "history": history,
+        "messages": messages,
+        "url": url,
+        "storage_state": storage_state,
+        "created_at": datetime.now().isoformat()
+    }
+
+
+async def restore_checkpoint(agent: Any, checkpoint: dict) -> None:
+    """用断点恢复新建的 Agent 和租用的浏览器
+
+    browser-use 没有公开的状态恢复接口，恢复依赖 Agent 的内部属性。先检查属性并解析断点，
+    全部通过后才修改 Agent，不兼容时抛出 CheckpointIncompatibleError，Agent 保持初始状态。
+    """
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        raise CheckpointIncompatibleError(f"不支持的断点版本: {checkpoint.get('version')}")
+    _check_restorable(agent)
+    if checkpoint.get("messages") is None:
+        raise CheckpointIncompatibleError("断点不包含 LLM 对话上下文")
+
+    try:
+        # 历史中的动作按本 Agent 的动作模型解析
+        history = checkpoint["history"]
+        history = {
+            **history,
+            "history": [
+                {**item, "model_output": agent.AgentOutput.model_validate(item["model_output"])}
+                if item.get("model_output") else item
+                for item in history.get("history", [])
+            ]
+        }
+        history = type(agent.history).model_validate(history)
+        messages = [load(message) for message in checkpoint["messages"]]
+    except Exception as e:
+        raise CheckpointIncompatibleError(f"断点数据无法解析: {str(e)}") from e
+
+    agent.history = history
+    agent.n_steps = checkpoint["n_steps"]
+    agent.consecutive_failures = checkpoint.get("consecutive_failures", 0)
+    # 上一步的动作结果会出现在下一步的状态消息中
+    if history.history:
+        agent._last_result = history.history[-1].result
+
+    # LLM 对话上下文：替换新 Agent 中只有系统提示和任务的初始消息
+    message_manager = agent.message_manager
+    message_manager.history.messages.clear()
+    if hasattr(message_manager.history, "total_tokens"):
+        message_manager.history.total_tokens = 0
+    for message in messages:
+        message_manager._add_message_with_tokens(message)
+
+    browser_context = getattr(agent, "browser_context", None)
+    if browser_context is None:
+        return
+    page = await browser_context.get_current_page()
+    storage_state = checkpoint.get("storage_state")
+    if storage_state:
+        if storage_state.get("cookies"):
+            await page.context.add_cookies(storage_state["cookies"])
+        for origin in storage_state.get("origins", []):
+            if not origin.get("localStorage"):
+                continue
+            await page.goto(origin["origin"])
+            await page.evaluate(
+                "items => items.forEach(item => localStorage.setItem(item.name, item.value))",
+                origin["localStorage"]
+            )
+    if checkpoint.get("url"):
+        await page.goto(checkpoint["url"])
+        await page.wait_for_load_state()
+
+
+def _check_restorable(agent: Any) -> None:
+    """检查恢复依赖的 Agent 内部属性是否存在（不同 browser-use 版本结构不同）"""
+    missing = [name for name in _AGENT_ATTRIBUTES if not hasattr(agent, name)]
+    if _managed_messages(agent) is None:
+        missing.append("message_manager.history.messages")
+    if not callable(getattr(getattr(agent, "message_manager", None), "_add_message_with_tokens", None)):
+        missing.append("message_manager._add_message_with_tokens")
+    if missing:
+        raise CheckpointIncompatibleError(f"当前 browser-use 版本的 Agent 缺少属性: {', '.join(missing)}")
+
+
+def _managed_messages(agent: Any) -> list | None:
+    """获取 MessageManager 中的消息列表（不同 browser-use 版本结构不同，取不到时返回 None）"""
+    message_manager = getattr(agent, "message_manager", None)
+    history = getattr(message_manager, "history", None)
+    messages = getattr(history, "messages", None)
+    return messages if isinstance(messages, list) else None
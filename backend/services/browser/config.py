@@ -0,0 +1,291 @@
+"""
+浏览器服务配置模块
+
+从环境变量读取浏览器服务的运行参数，包括：
+1. Agent 并发执行上限
+2. 等待队列长度
+3. 任务存储后端
+4. 任务缓存保留策略
+5. 消息补发缓冲区
+6. 截图存储
+7. 系统指标采样
+8. 浏览器连接池
+9. 重复提交检测
+10. Agent 执行模式
+11. 任务断点和恢复
+12. 步骤消息处理队列
+13. 订阅者发送队列
+14. WebSocket 压缩
+"""
+
+import os
+
+from core.config import get_float as _get_float
+from core.config import get_int as _get_int
+
+
+# 调度器配置
+def get_max_workers() -> int:
+    """获取同时执行的 Agent 数量上限（默认与 browserless 的 MAX_CONCURRENT_SESSIONS 一致）"""
+    return max(1, _get_int("BROWSER_MAX_WORKERS", 10))
+
+
+def get_max_queue_length() -> int:
+    """获取等待队列长度上限（默认与 browserless 的 MAX_QUEUE_LENGTH 一致）"""
+    return max(0, _get_int("BROWSER_MAX_QUEUE_LENGTH", 10))
+
+
+def get_queue_status_interval() -> float:
+    """获取排队状态推送间隔（秒）"""
+    return max(0.1, _get_float("BROWSER_QUEUE_STATUS_INTERVAL", 2.0))
+
+
+def get_sse_heartbeat_interval() -> float:
+    """获取 SSE 心跳注释的发送间隔（秒），用于保持代理和负载均衡器上的空闲连接"""
+    return max(1.0, _get_float("SSE_HEARTBEAT_INTERVAL", 15.0))
+
+
+# 任务存储配置
+def get_task_store_url() -> str:
+    """获取任务存储地址：memory、sqlite:///... 或 postgresql://..."""
+    return os.getenv("TASK_STORE_URL", "memory").strip() or "memory"
+
+
+def get_task_store_shared() -> bool:
+    """是否在多个 worker 进程之间共享任务状态（需要 SQL 存储）"""
+    return os.getenv("TASK_STORE_SHARED", "false").strip().lower() in ("1", "true", "yes")
+
+
+def get_remote_poll_interval() -> float:
+    """获取共享模式下轮询其他 worker 任务消息的间隔（秒）"""
+    return max(0.05, _get_float("TASK_REMOTE_POLL_INTERVAL", 0.5))
+
+
+def get_remote_cache_ttl() -> float:
+    """获取共享模式下其他 worker 的任务状态和结果在本进程中的缓存时间（秒），0 表示不缓存"""
+    return max(0.0, _get_float("TASK_REMOTE_CACHE_TTL", 1.0))
+
+
+def get_store_flush_interval() -> float:
+    """获取任务存储批量落盘间隔（秒）"""
+    return max(0.05, _get_float("TASK_STORE_FLUSH_INTERVAL", 0.5))
+
+
+def get_store_flush_batch_size() -> int:
+    """获取触发立即落盘的步骤缓冲数量"""
+    return max(1, _get_int("TASK_STORE_FLUSH_BATCH_SIZE", 100))
+
+
+# 任务缓存保留策略
+def get_cache_max_bytes() -> int:
+    """获取缓存步骤的总字节预算（默认 256MB）"""
+    return max(0, _get_int("TASK_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+
+def get_retention_ttl() -> float:
+    """获取已结束任务在缓存中的保留时间（秒）"""
+    return max(0.0, _get_float("TASK_RETENTION_TTL", 3600.0))
+
+
+def get_retention_sweep_interval() -> float:
+    """获取 TTL 检查间隔（秒）"""
+    return max(1.0, _get_float("TASK_RETENTION_SWEEP_INTERVAL", 30.0))
+
+
+# 消息补发缓冲区
+def get_replay_buffer_size() -> int:
+    """获取每个执行中任务保留的最近消息帧数量"""
+    return max(0, _get_int("TASK_REPLAY_BUFFER_SIZE", 100))
+
+
+# 截图存储
+def get_screenshot_store_dir() -> str:
+    """获取截图存储目录"""
+    return os.getenv("SCREENSHOT_STORE_DIR", "data/screenshots")
+
+
+def get_screenshot_keep_full() -> bool:
+    """是否默认保存全分辨率截图"""
+    return os.getenv("SCREENSHOT_KEEP_FULL", "false").strip().lower() in ("1", "true", "yes")
+
+
+def get_screenshot_executor() -> str:
+    """获取截图处理执行器类型: thread 或 process"""
+    executor = os.getenv("SCREENSHOT_PIPELINE_EXECUTOR", "thread").strip().lower()
+    return executor if executor in ("thread", "process") else "thread"
+
+
+def get_screenshot_workers() -> int:
+    """获取截图处理的并发数"""
+    return max(1, _get_int("SCREENSHOT_PIPELINE_WORKERS", 2))
+
+
+def get_thumbnail_width() -> int:
+    """获取缩略图宽度（像素）"""
+    return max(16, _get_int("SCREENSHOT_THUMBNAIL_WIDTH", 480))
+
+
+def get_thumbnail_format() -> str:
+    """获取缩略图格式: webp 或 jpeg"""
+    fmt = os.getenv("SCREENSHOT_THUMBNAIL_FORMAT", "webp").strip().lower()
+    return fmt if fmt in ("webp", "jpeg") else "webp"
+
+
+def get_thumbnail_quality() -> int:
+    """获取缩略图压缩质量（1-100）"""
+    return min(100, max(1, _get_int("SCREENSHOT_THUMBNAIL_QUALITY", 60)))
+
+
+def get_screenshot_dedup_distance() -> int:
+    """获取视为相同截图的感知哈希最大汉明距离，负数表示只跳过字节相同的截图"""
+    return max(-1, _get_int("SCREENSHOT_DEDUP_DISTANCE", 0))
+
+
+def get_metrics_sample_interval() -> float:
+    """获取系统指标后台采样间隔（秒）"""
+    return max(0.1, _get_float("METRICS_SAMPLE_INTERVAL", 1.0))
+
+
+def get_metrics_window_size() -> int:
+    """获取系统指标环形缓冲区保留的采样数量"""
+    return max(1, _get_int("METRICS_WINDOW_SIZE", 60))
+
+
+def get_task_metrics_samples() -> int:
+    """获取每个任务统计数据中保留的最近步骤系统指标数量"""
+    return max(0, _get_int("TASK_METRICS_SAMPLES", 20))
+
+
+# 浏览器连接池
+def get_browser_cdp_url() -> str:
+    """获取 browserless 的 CDP 连接地址"""
+    return os.getenv(
+        "BROWSER_CDP_URL",
+        "ws://localhost:13000/playwright/chromium?token=browser-token-2024"
+    )
+
+
+def get_browser_pool_min_size() -> int:
+    """获取连接池预热并保持的最少连接数"""
+    return max(0, _get_int("BROWSER_POOL_MIN_SIZE", 2))
+
+
+def get_browser_pool_max_idle() -> float:
+    """获取超出最少连接数的空闲连接的最长空闲时间（秒），0 表示不回收"""
+    return max(0.0, _get_float("BROWSER_POOL_MAX_IDLE", 300.0))
+
+
+def get_browser_pool_max_age() -> float:
+    """获取连接的最长存活时间（秒），0 表示不限制"""
+    return max(0.0, _get_float("BROWSER_POOL_MAX_AGE", 1800.0))
+
+
+def get_browser_pool_health_check_interval() -> float:
+    """获取空闲连接健康检查间隔（秒）"""
+    return max(1.0, _get_float("BROWSER_POOL_HEALTH_CHECK_INTERVAL", 30.0))
+
+
+# 重复提交检测
+def get_idempotency_key_ttl() -> float:
+    """获取 Idempotency-Key 的有效期（秒）"""
+    return max(0.0, _get_float("TASK_IDEMPOTENCY_KEY_TTL", 86400.0))
+
+
+def get_task_dedup_window() -> float:
+    """获取按内容去重的时间窗口（秒），0 表示只按 Idempotency-Key 去重"""
+    return max(0.0, _get_float("TASK_DEDUP_WINDOW", 0.0))
+
+
+# Agent 执行模式
+def get_agent_execution_mode() -> str:
+    """获取 Agent 执行模式: inprocess（API 进程内执行）| process（分派到 Agent worker 进程）"""
+    mode = os.getenv("AGENT_EXECUTION_MODE", "inprocess").strip().lower()
+    if mode not in ("inprocess", "process"):
+        print(f"Warning - 未知的 AGENT_EXECUTION_MODE={mode!r}，使用 inprocess")
+        return "inprocess"
+    return mode
+
+
+def get_agent_worker_processes() -> int:
+    """获取 Agent worker 进程数（默认为 CPU 核数，且不超过 Agent 并发上限）"""
+    default = min(os.cpu_count() or 1, get_max_workers())
+    return max(1, _get_int("AGENT_WORKER_PROCESSES", default))
+
+
+# 任务断点和恢复
+def get_checkpoint_interval() -> int:
+    """获取保存断点的步骤间隔，0 表示不保存断点"""
+    return max(0, _get_int("TASK_CHECKPOINT_INTERVAL", 1))
+
+
+def get_checkpoint_storage_state() -> bool:
+    """断点是否包含浏览器存储状态（cookies、localStorage，明文写入任务存储，默认不包含）"""
+    return os.getenv("TASK_CHECKPOINT_STORAGE_STATE", "false").strip().lower() in ("1", "true", "yes")
+
+
+def get_resume_on_startup() -> bool:
+    """启动时是否自动恢复上次未执行完的任务"""
+    return os.getenv("TASK_RESUME_ON_STARTUP", "true").strip().lower() in ("1", "true", "yes")
+
+
+def get_worker_heartbeat_timeout() -> float:
+    """共享模式下 worker 心跳超过该时间（秒）未更新即视为已退出，其任务可由其他 worker 接管"""
+    return max(1.0, _get_float("TASK_WORKER_HEARTBEAT_TIMEOUT", 60.0))
+
+
+# 步骤消息处理队列
+def get_step_queue_max_pending() -> int:
+    """获取等待构造和广播的步骤快照上限，达到后下一个步骤开始前等待"""
+    return max(1, _get_int("STEP_QUEUE_MAX_PENDING", 4))
+
+
+# 订阅者发送队列
+def get_subscriber_queue_size() -> int:
+    """获取每个订阅者（WebSocket/SSE 连接）发送队列的消息帧上限"""
+    return max(1, _get_int("SUBSCRIBER_QUEUE_SIZE", 256))
+
+
+def get_subscriber_queue_policy() -> str:
+    """获取订阅者队列满时的策略: block（暂停 Agent 等待）| drop_oldest（丢弃最早的消息）| coalesce（只保留最新截图）"""
+    policy = os.getenv("SUBSCRIBER_QUEUE_POLICY", "coalesce").strip().lower()
+    if policy not in ("block", "drop_oldest", "coalesce"):
+        print(f"Warning - 未知的 SUBSCRIBER_QUEUE_POLICY={policy!r}，使用 coalesce")
+        return "coalesce"
+    return policy
+
+
+def get_subscriber_overflow_limit() -> int:
+    """获取订阅者队列的积压上限，超过后断开该订阅者（默认为队列上限的 4 倍）"""
+    size = get_subscriber_queue_size()
+    return max(size, _get_int("SUBSCRIBER_QUEUE_OVERFLOW_LIMIT", size * 4))
+
+
+def get_subscriber_block_timeout() -> float:
+    """block 策略下等待订阅者队列腾出空间的超时（秒），超时的订阅者被断开"""
+    return max(0.1, _get_float("SUBSCRIBER_BLOCK_TIMEOUT", 10.0))
+
+
+# WebSocket 压缩
+def get_ws_compression() -> bool:
+    """是否为 WebSocket 启用 permessage-deflate（需要客户端支持）"""
+    return os.getenv("WS_COMPRESSION", "true").strip().lower() in ("1", "true", "yes")
+
+
+def get_ws_compression_min_size() -> int:
+    """获取压缩的消息大小阈值（字节），更小的消息直接发送"""
+    return max(0, _get_int("WS_COMPRESSION_MIN_SIZE", 512))
+
+
+def get_ws_compression_level() -> int:
+    """获取 zlib 压缩级别（1 最快，9 压缩率最高）"""
+    return min(9, max(1, _get_int("WS_COMPRESSION_LEVEL", 6)))
+
+
+def get_ws_compression_mem_level() -> int:
+    """获取 zlib 内存级别（1-9），越大压缩越快、每个连接占用内存越多"""
+    return min(9, max(1, _get_int("WS_COMPRESSION_MEM_LEVEL", 8)))
+
+
+def get_ws_compression_window_bits() -> int:
+    """获取压缩窗口大小（9-15，窗口为 2^n 字节），窗口覆盖上一条步骤消息时压缩率最好"""
+    return min(15, max(9, _get_int("WS_COMPRESSION_WINDOW_BITS", 15)))
@@ -0,0 +1,87 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class IdempotencyConflictError(Exception):
+    """同一个 Idempotency-Key 被用于内容不同的请求"""
+    def __init__(self, key: str):
+        self.key = key
+        super().__init__(f"Idempotency-Key {key!r} 已用于另一个不同的任务请求")
+
+
+def task_fingerprint(task_description: str, full_screenshots: bool) -> str:
+    """任务请求的内容摘要（描述按空白规整）"""
+    normalized = " ".join(task_description.split())
+    return hashlib.sha256(f"{normalized}\n{int(full_screenshots)}".encode()).hexdigest()
+
+
+class SubmissionDeduplicator:
+    """重复任务提交检测
+
+    记录 Idempotency-Key 和请求内容摘要到任务 ID 的映射：
+    带相同 Idempotency-Key 的请求在 key_ttl 秒内返回同一个任务；
+    dedup_window 大于 0 时，内容相同的请求在窗口内也返回同一个任务。
+    两类映射分表保存，同一张表的有效期相同，插入顺序即过期顺序，过期记录从表头弹出；
+    每张表的映射数量超过 max_entries 时淘汰最早的记录。
+    """
+    def __init__(self, key_ttl: float = 86400.0, dedup_window: float = 0.0, max_entries: int = 10000):
+        self.key_ttl = key_ttl
+        self.dedup_window = dedup_window
+        self.max_entries = max(1, max_entries)
+        # Idempotency-Key / 内容摘要 -> (任务ID, 内容摘要, 过期时间)
+        self._keys: OrderedDict[str, tuple[str, str, float]] = OrderedDict()
+        self._contents: OrderedDict[str, tuple[str, str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, fingerprint: str, idempotency_key: str | None = None) -> str | None:
+        """查找重复提交对应的任务 ID，Idempotency-Key 与内容不匹配时抛出 IdempotencyConflictError"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(self._keys, now)
+            self._expire(self._contents, now)
+            if idempotency_key:
+                entry = self._keys.get(idempotency_key)
+                if entry is None:
+                    return None
+                task_id, entry_fingerprint, _ = entry
+                if entry_fingerprint != fingerprint:
+                    raise IdempotencyConflictError(idempotency_key)
+                return task_id
+            if self.dedup_window > 0:
+                entry = self._contents.get(fingerprint)
+                if entry is not None:
+                    return entry[0]
+        return None
+
+    def remember(self, task_id: str, fingerprint: str, idempotency_key: str | None = None) -> None:
+        """记录新创建的任务"""
+        now = time.monotonic()
+        with self._lock:
+            if idempotency_key:
+                self._put(self._keys, idempotency_key, (task_id, fingerprint, now + self.key_ttl))
+            if self.dedup_window > 0:
+                self._put(self._contents, fingerprint, (task_id, fingerprint, now + self.dedup_window))
+
+    def forget(self, task_id: str) -> None:
+        """移除指向某个任务的所有记录（例如任务失败后允许重新提交）"""
+        with self._lock:
+            for table in (self._keys, self._contents):
+                for key in [key for key, entry in table.items() if entry[0] == task_id]:
+                    del table[key]
+
+    def _put(self, table: OrderedDict, key: str, entry: tuple[str, str, float]) -> None:
+        table.pop(key, None)
+        table[key] = entry
+        while len(table) > self.max_entries:
+            table.popitem(last=False)
+
+    @staticmethod
+    def _expire(table: OrderedDict, now: float) -> None:
+        """从表头移除过期记录"""
+        while table:
+            key, entry = next(iter(table.items()))
+            if entry[2] > now:
+                break
+            del table[key]
@@ -1,14 +1,16 @@
 import traceback
 from datetime import datetime
 
+from core import telemetry
 from schemas.browser_task import ErrorMessage
 
+from .store import TaskStore
+
 
 class ErrorHandler:
     """错误处理器"""
-    def __init__(self, task_stats, task_errors):
-        self.task_stats = task_stats
-        self.task_errors = task_errors
+    def __init__(self, store: TaskStore):
+        self.store = store
 
     def handle_error(self, task_id: str, error: Exception, step: int | None = None) -> ErrorMessage:
         """处理错误并记录"""
@@ -23,6 +25,7 @@ class ErrorHandler:
             error_type = "RemoteBrowserConnectionError"
             error_msg = "无法连接到远程浏览器，请确保Docker容器正在运行且9222端口已正确暴露"
             recoverable = False
+        telemetry.ERRORS.labels(error_type).inc()
         
         error_message = ErrorMessage(
             error=error_msg,
@@ -36,11 +39,12 @@ class ErrorHandler:
             step=step,
             timestamp=current_time,
             recoverable=recoverable,
-            retry_count=self.task_stats[task_id]["retry_count"]
+            retry_count=self.store.get_stats(task_id).get("retry_count", 0)
         )
         
         # 更新统计数据
-        self.task_stats[task_id]["error_count"] += 1
-        self.task_errors[task_id].append(error_message.model_dump())
+        stats = self.store.get_stats(task_id)
+        self.store.update_stats(task_id, error_count=stats.get("error_count", 0) + 1)
+        self.store.append_error(task_id, error_message.model_dump())
         
         return error_message 
\ No newline at end of file
@@ -0,0 +1,127 @@
+import contextlib
+from datetime import datetime
+from typing import Any
+
+from core.serialization import ws_message_dict
+from models.agent import create_agent
+from schemas.browser_task import BrowserTask
+
+from .browser_pool import BrowserPool
+from .callbacks import CallbackManager
+from .checkpoint import (
+    AgentCheckpointer,
+    CheckpointIncompatibleError,
+    restore_checkpoint,
+)
+from .config import (
+    get_checkpoint_interval,
+    get_checkpoint_storage_state,
+    get_step_queue_max_pending,
+    get_subscriber_block_timeout,
+    get_task_metrics_samples,
+)
+from .error_handler import ErrorHandler
+from .screenshot_pipeline import ScreenshotPipeline
+from .store import TaskStore
+
+
+async def execute_agent_task(task: BrowserTask, store: TaskStore, broadcaster: Any,
+                             browser_pool: BrowserPool, screenshot_pipeline: ScreenshotPipeline,
+                             metrics_collector: Any, resume: dict | None = None) -> None:
+    """租用浏览器执行 Agent，步骤、结果和错误消息写入 store 并通过 broadcaster 发布
+
+    API 进程内执行和 Agent worker 进程执行共用这段逻辑，结束时 task.status 为 completed 或 failed。
+    resume 为恢复执行的信息：断点（可能为空）、已发布的最后一个消息序号和已记录的步骤数。
+    """
+    resume = resume or {}
+    # 初始化错误处理器
+    error_handler = ErrorHandler(store)
+
+    # 初始化回调管理器
+    callback_manager = CallbackManager(
+        task_id=task.task_id,
+        store=store,
+        metrics_collector=metrics_collector,
+        error_handler=error_handler,
+        broadcaster=broadcaster,
+        screenshot_pipeline=screenshot_pipeline,
+        keep_full_screenshots=task.full_screenshots,
+        start_sequence=resume.get("last_sequence", 0),
+        start_step=resume.get("step_count"),
+        max_pending=get_step_queue_max_pending(),
+        subscriber_timeout=get_subscriber_block_timeout(),
+        metrics_samples=get_task_metrics_samples()
+    )
+    checkpointer = AgentCheckpointer(
+        task.task_id,
+        store,
+        interval=get_checkpoint_interval(),
+        include_storage=get_checkpoint_storage_state()
+    )
+
+    try:
+        # 从连接池租用已连接的浏览器，任务结束后重置上下文并归还
+        async with browser_pool.lease() as browser:
+            print("\n=== 开始创建 Agent ===")
+            print("1. 初始化 Agent...")
+            agent = create_agent(
+                task=task.task_description,
+                browser=browser,
+                step_callback=callback_manager.create_step_callback(),
+                done_callback=callback_manager.create_done_callback()
+            )
+            callback_manager.step_timer.instrument(agent)
+            callback_manager.instrument(agent)
+            checkpointer.instrument(agent)
+            print("2. Agent 初始化完成")
+
+            checkpoint = resume.get("checkpoint")
+            if checkpoint:
+                print(f"从断点恢复 (已完成步骤: {checkpoint['n_steps'] - 1})...")
+                try:
+                    await restore_checkpoint(agent, checkpoint)
+                    print("✓ 断点恢复完成")
+                except CheckpointIncompatibleError as e:
+                    # 恢复前已检查，Agent 仍是初始状态，从第一步重新执行
+                    print(f"Warning - 断点无法恢复，任务从第一步重新执行 ({task.task_id}): {str(e)}")
+                    store.update_stats(task.task_id, checkpoint_discarded=str(e))
+
+            print("\n=== 开始执行任务 ===")
+            print("Starting agent.run()...")
+            await agent.run()
+            print("✓ agent.run() completed")
+        # 结果消息由处理协程保存，保存后才能标记完成，否则订阅者可能读到已完成但没有结果的任务
+        await callback_manager.drain()
+        task.status = "completed"
+        task.updated_at = datetime.now()
+        store.save_task(task)
+        print("=== 任务执行完成 ===\n")
+
+    except Exception as e:
+        print(f"Error in _execute_task: {e}")
+        await callback_manager.drain()
+        error = error_handler.handle_error(task.task_id, e)
+
+        # 广播错误消息
+        current_time = datetime.now().isoformat()
+        error_dict = ws_message_dict(
+            "error",
+            error.model_dump(),
+            session_id=task.task_id,
+            sequence=callback_manager.next_sequence(),
+            timestamp=current_time
+        )
+        store.set_result(task.task_id, error_dict)
+        broadcaster.publish(task.task_id, error_dict)
+
+        # 更新任务状态
+        task.status = "failed"
+        task.result = {"error": str(e)}
+        task.updated_at = current_time
+        store.save_task(task)
+
+    finally:
+        # 等待所有步骤消息处理完成后再结束消息流
+        with contextlib.suppress(Exception):
+            await callback_manager.drain()
+        callback_manager.close()
@@ -1,31 +1,63 @@
 import asyncio
-from typing import Any
+import time
 
 from fastapi import WebSocket
 
+from core import telemetry
+
+from .broadcaster import Frame, SubscriberQueue, encode_frame
+from .protocol import PROTOCOL_JSON, PROTOCOL_MSGPACK
+
 
 class MessageProcessor:
-    """消息处理器"""
-    def __init__(self, websocket: WebSocket, task_id: str, error_handler: Any):
+    """消息处理器
+
+    作为任务广播的一个订阅者，将消息帧按序、按协商的协议发送给对应的 WebSocket 连接。
+    消息在有界的订阅者队列中排队，客户端过慢时按队列策略丢弃或合并。
+    """
+    def __init__(self, websocket: WebSocket, task_id: str, protocol: str = PROTOCOL_JSON,
+                 queue: SubscriberQueue | None = None):
         self.websocket = websocket
         self.task_id = task_id
-        self.error_handler = error_handler
-        self.message_queue = asyncio.Queue()
+        self.protocol = protocol
+        self.message_queue = queue if queue is not None else SubscriberQueue()
+        self.last_sequence = 0
+
+    async def send_message(self, message: dict) -> None:
+        """直接发送一条消息（用于补发缓存消息和排队状态）"""
+        await self.send_frame(encode_frame(message))
 
-    async def process_messages(self):
-        """处理消息队列"""
+    async def send_frame(self, frame: Frame) -> None:
+        """发送消息帧，跳过已发送过的序号"""
+        if frame.sequence is not None:
+            if frame.sequence <= self.last_sequence:
+                return
+            self.last_sequence = frame.sequence
+        started = time.perf_counter()
+        if self.protocol == PROTOCOL_MSGPACK:
+            await self.websocket.send_bytes(frame.encode(PROTOCOL_MSGPACK))
+        else:
+            await self.websocket.send_text(frame.text)
+        telemetry.WS_SEND_LATENCY.observe(time.perf_counter() - started)
+
+    async def process_messages(self, idle_timeout: float | None = None, on_idle=None) -> None:
+        """处理消息队列，直到收到结束标记
+
+        idle_timeout 时间内没有新消息时调用 on_idle（例如推送排队状态）。
+        """
         while True:
             try:
-                message = await self.message_queue.get()
-                print(f"Sending message: {message['type']}, Step: {message['data'].get('step', 'N/A')}")
-                await self.websocket.send_json(message)
-                self.message_queue.task_done()
-            except Exception as e:
-                print(f"Error processing message: {e}")
-                print(f"Message content: {message}")
-                self.error_handler.handle_error(self.task_id, e)
+                frame = await asyncio.wait_for(self.message_queue.get(), timeout=idle_timeout)
+            except TimeoutError:
+                if on_idle:
+                    await on_idle()
+                continue
+
+            if frame is None:
                 break
+            print(f"Sending message: {frame.type}, Sequence: {frame.sequence or 'N/A'}")
+            await self.send_frame(frame)
 
-    def get_queue(self) -> asyncio.Queue:
+    def get_queue(self) -> SubscriberQueue:
         """获取消息队列"""
-        return self.message_queue 
\ No newline at end of file
+        return self.message_queue
@@ -1,27 +1,72 @@
+import threading
+import time
+from collections import deque
 
 import psutil
 
 
 class SystemMetricsCollector:
-    """系统指标收集器"""
-    def __init__(self, process):
+    """系统指标收集器
+
+    后台线程按固定间隔采样进程和系统的 CPU、内存、线程数，保存在定长环形缓冲区中。
+    读取最新值和窗口聚合值都不阻塞，步骤回调和创建任务的请求不再等待 CPU 采样。
+    """
+    def __init__(self, process, interval: float = 1.0, window_size: int = 60):
         self.process = process
+        self.interval = interval
+        self._samples: deque[tuple[float, dict]] = deque(maxlen=max(1, window_size))
+        self._latest: dict | None = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
 
-    def get_metrics(self) -> dict:
-        """获取系统资源使用指标"""
+    def start(self) -> None:
+        """启动后台采样线程"""
+        if self._thread is not None:
+            return
+        # cpu_percent(interval=None) 返回距上次调用的使用率，先调用一次建立基准
+        try:
+            self.process.cpu_percent(interval=None)
+            psutil.cpu_percent(interval=None)
+        except Exception as e:
+            print(f"Warning - 初始化 CPU 采样时出错: {str(e)}")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止后台采样线程"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def _run(self) -> None:
+        """采样循环"""
+        while not self._stop.wait(self.interval):
+            self._record(self.sample())
+
+    def _record(self, metrics: dict) -> None:
+        """写入环形缓冲区"""
+        with self._lock:
+            self._samples.append((time.monotonic(), metrics))
+            self._latest = metrics
+
+    def sample(self) -> dict:
+        """采集一次指标（CPU 使用率为距上次采样的平均值，不阻塞）"""
         try:
             # 获取进程的内存信息
             memory_info = self.process.memory_info()
             memory_percent = self.process.memory_percent()
-            
+
             # 获取CPU使用信息
-            cpu_percent = self.process.cpu_percent(interval=0.1)
+            cpu_percent = self.process.cpu_percent(interval=None)
             cpu_times = self.process.cpu_times()
-            
+
             # 获取系统总体信息
             system_memory = psutil.virtual_memory()
-            system_cpu = psutil.cpu_percent(interval=0.1)
-            
+            system_cpu = psutil.cpu_percent(interval=None)
+
             return {
                 "memory": {
                     "rss": memory_info.rss,  # 实际使用的物理内存
@@ -36,7 +81,7 @@ class SystemMetricsCollector:
                     "system_percent": system_cpu,    # 系统CPU使用率
                     "user_time": cpu_times.user,     # 用户空间CPU时间
                     "system_time": cpu_times.system, # 系统空间CPU时间
-                    "threads": len(self.process.threads())  # 线程数
+                    "threads": self.process.num_threads()  # 线程数
                 }
             }
         except Exception as e:
@@ -44,4 +89,40 @@ class SystemMetricsCollector:
             return {
                 "memory": {"error": str(e)},
                 "cpu": {"error": str(e)}
-            } 
\ No newline at end of file
+            }
+
+    def get_metrics(self) -> dict:
+        """获取最新的系统资源使用指标（不阻塞）"""
+        latest = self._latest
+        if latest is None:
+            # 采样线程尚未产出数据时立即采样一次
+            latest = self.sample()
+            self._record(latest)
+        return latest
+
+    def get_aggregates(self, window: float | None = None) -> dict:
+        """获取最近 window 秒（默认整个缓冲区）内采样的平均值和最大值"""
+        now = time.monotonic()
+        with self._lock:
+            samples = [
+                metrics for timestamp, metrics in self._samples
+                if window is None or now - timestamp <= window
+            ]
+
+        fields = {
+            "cpu_process_percent": ("cpu", "process_percent"),
+            "cpu_system_percent": ("cpu", "system_percent"),
+            "memory_rss": ("memory", "rss"),
+            "memory_percent": ("memory", "percent"),
+            "threads": ("cpu", "threads"),
+        }
+        aggregates: dict = {"samples": len(samples), "interval": self.interval}
+        for name, (group, key) in fields.items():
+            values = [metrics[group][key] for metrics in samples if key in metrics.get(group, {})]
+            if values:
+                aggregates[name] = {
+                    "avg": sum(values) / len(values),
+                    "max": max(values),
+                    "last": values[-1]
+                }
+        return aggregates
@@ -0,0 +1,70 @@
+"""
+WebSocket 消息协议
+
+通过 WebSocket 子协议协商消息编码：
+1. operatornext.json.v1: JSON 文本帧（默认，兼容未声明子协议的客户端）
+2. operatornext.msgpack.v1: MessagePack 二进制帧，图片以二进制字段内联
+
+同一消息也可以编码为 Server-Sent Events 事件，供只支持 HTTP 的客户端使用。
+"""
+
+from core.serialization import dumps_str
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack 为可选依赖
+    msgpack = None
+
+JSON_SUBPROTOCOL = "operatornext.json.v1"
+MSGPACK_SUBPROTOCOL = "operatornext.msgpack.v1"
+
+PROTOCOL_JSON = "json"
+PROTOCOL_MSGPACK = "msgpack"
+PROTOCOL_SSE = "sse"
+
+_SUBPROTOCOLS = {
+    JSON_SUBPROTOCOL: PROTOCOL_JSON,
+    MSGPACK_SUBPROTOCOL: PROTOCOL_MSGPACK,
+}
+
+
+def supported_subprotocols() -> list[str]:
+    """当前环境支持的子协议"""
+    if msgpack is None:
+        return [JSON_SUBPROTOCOL]
+    return [JSON_SUBPROTOCOL, MSGPACK_SUBPROTOCOL]
+
+
+def negotiate_subprotocol(requested: list[str]) -> tuple[str | None, str]:
+    """按客户端声明的顺序选择第一个支持的子协议
+
+    返回 (接受的子协议, 编码方式)，客户端未声明或都不支持时使用 JSON 且不回应子协议。
+    """
+    supported = supported_subprotocols()
+    for subprotocol in requested:
+        if subprotocol in supported:
+            return subprotocol, _SUBPROTOCOLS[subprotocol]
+    return None, PROTOCOL_JSON
+
+
+def encode_json(message: dict) -> str:
+    """编码为 JSON 文本（安装了 orjson 时使用 orjson）"""
+    return dumps_str(message)
+
+
+def encode_msgpack(message: dict, attachments: dict[str, bytes] | None = None) -> bytes:
+    """编码为 MessagePack，附件作为二进制字段合并到 data 中"""
+    if attachments:
+        message = {**message, "data": {**message.get("data", {}), **attachments}}
+    return msgpack.packb(message, use_bin_type=True)
+
+
+def encode_sse(message: dict) -> bytes:
+    """编码为 SSE 事件：带序号的消息以序号作为事件 ID，供 Last-Event-ID 续传"""
+    lines = []
+    if message.get("sequence") is not None:
+        lines.append(f"id: {message['sequence']}")
+    lines.append(f"event: {message.get('type', 'message')}")
+    # JSON 编码会转义换行，数据只占一行
+    lines.append(f"data: {dumps_str(message)}")
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
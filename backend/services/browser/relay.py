@@ -0,0 +1,111 @@
+import asyncio
+import contextlib
+
+from .broadcaster import TaskBroadcaster
+from .retention import FINISHED_STATUSES
+from .store import TaskStore
+
+
+class TaskRelay:
+    """跨 worker 消息转发
+
+    共享模式下，订阅者可能连接到没有执行该任务的 worker。转发器为这类任务在本进程中
+    启动一个跟随协程，从共享存储读取新的步骤和结果消息，发布到本地广播器，
+    订阅流程与本地任务完全相同。同一任务的多个订阅者共用一个跟随协程。
+    存储支持写入通知时（Postgres NOTIFY）收到通知立即读取，否则按 poll_interval 轮询。
+    """
+    def __init__(self, store: TaskStore, broadcaster: TaskBroadcaster, poll_interval: float = 0.5,
+                 result_grace: float = 5.0):
+        self.store = store
+        self.broadcaster = broadcaster
+        self.poll_interval = poll_interval
+        self.result_grace = result_grace
+        self._followers: dict[str, tuple[asyncio.Task, asyncio.Event]] = {}
+        self._refs: dict[str, int] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._notifications = False
+
+    @property
+    def following_count(self) -> int:
+        """正在跟随的远程任务数"""
+        return len(self._followers)
+
+    def follow(self, task_id: str, after_sequence: int) -> None:
+        """开始跟随远程任务，after_sequence 之前的消息由订阅者自行补发"""
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._notifications = self.store.subscribe_changes(self.notify)
+        self._refs[task_id] = self._refs.get(task_id, 0) + 1
+        if task_id in self._followers:
+            return
+        wakeup = asyncio.Event()
+        runner = asyncio.create_task(self._follow(task_id, after_sequence, wakeup))
+        self._followers[task_id] = (runner, wakeup)
+        runner.add_done_callback(lambda done: self._forget(task_id, done))
+
+    def unfollow(self, task_id: str) -> None:
+        """订阅者离开，最后一个订阅者离开时停止跟随"""
+        refs = self._refs.get(task_id, 0) - 1
+        if refs > 0:
+            self._refs[task_id] = refs
+            return
+        self._refs.pop(task_id, None)
+        follower = self._followers.pop(task_id, None)
+        if follower is not None:
+            follower[0].cancel()
+
+    def _forget(self, task_id: str, runner: asyncio.Task) -> None:
+        """跟随协程结束后移除记录（同一任务可能已启动新的跟随协程）"""
+        follower = self._followers.get(task_id)
+        if follower is not None and follower[0] is runner:
+            del self._followers[task_id]
+
+    def notify(self, task_id: str) -> None:
+        """其他 worker 写入了任务数据（可在任意线程调用）"""
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._wake, task_id)
+
+    def _wake(self, task_id: str) -> None:
+        follower = self._followers.get(task_id)
+        if follower is not None:
+            follower[1].set()
+
+    async def _follow(self, task_id: str, after_sequence: int, wakeup: asyncio.Event) -> None:
+        """转发远程任务的消息，任务结束后通知本地订阅者消息流已结束"""
+        try:
+            await self._relay(task_id, after_sequence, wakeup)
+        except Exception as e:
+            print(f"Warning - 转发远程任务消息出错 ({task_id}): {str(e)}")
+        # 被取消（订阅者全部离开）时不会执行到这里
+        self.broadcaster.close(task_id)
+
+    async def _relay(self, task_id: str, after_sequence: int, wakeup: asyncio.Event) -> None:
+        """读取并发布远程任务的新消息，直到任务结束"""
+        last_sequence = after_sequence
+        finished_at: float | None = None
+        loop = asyncio.get_running_loop()
+        while True:
+            wakeup.clear()
+            steps = await asyncio.to_thread(self.store.get_steps_after, task_id, last_sequence)
+            for message in steps:
+                self.broadcaster.publish(task_id, message)
+                last_sequence = max(last_sequence, message.get("sequence") or 0)
+
+            task = await asyncio.to_thread(self.store.get_task, task_id)
+            if task is None or task.status in FINISHED_STATUSES:
+                result = await asyncio.to_thread(self.store.get_result, task_id)
+                if result is not None:
+                    if (result.get("sequence") or 0) > last_sequence:
+                        self.broadcaster.publish(task_id, result)
+                    return
+                # 状态和结果可能分两次落盘，等待结果一段时间
+                if finished_at is None:
+                    finished_at = loop.time()
+                elif loop.time() - finished_at > self.result_grace:
+                    return
+
+            # 有写入通知时轮询只作为兜底
+            timeout = self.poll_interval * (4 if self._notifications else 1)
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(wakeup.wait(), timeout=timeout)
@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+# 已结束的任务状态，只有这些任务的步骤可以被淘汰
+FINISHED_STATUSES = ("completed", "failed")
+
+
+def estimate_size(value: Any) -> int:
+    """粗略估算消息占用的字节数
+
+    只累加字符串和字节串长度，截图等大字段占绝大部分，足以用于内存预算。
+    """
+    if isinstance(value, str | bytes):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(key) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, list | tuple):
+        return sum(estimate_size(item) for item in value)
+    return 8
+
+
+class RetentionManager:
+    """任务缓存保留策略
+
+    - 所有缓存步骤的总字节预算，超出后按 LRU 淘汰已结束任务的步骤（保留任务摘要）
+    - 已结束任务超过 TTL 后整体移出缓存
+    - 记录淘汰的字节数、步骤数和任务数
+    """
+    def __init__(self, max_bytes: int, ttl: float, sweep_interval: float = 30.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._sizes: OrderedDict[str, int] = OrderedDict()
+        self._step_counts: dict[str, int] = {}
+        self._finished_at: dict[str, float] = {}
+        self._last_sweep = time.monotonic()
+        self.cached_bytes = 0
+        self.evicted_bytes = 0
+        self.evicted_steps = 0
+        self.evicted_tasks = 0
+        self.expired_tasks = 0
+
+    def record_step(self, task_id: str, size: int) -> None:
+        """记录新缓存的步骤"""
+        with self._lock:
+            self._sizes[task_id] = self._sizes.get(task_id, 0) + size
+            self._sizes.move_to_end(task_id)
+            self._step_counts[task_id] = self._step_counts.get(task_id, 0) + 1
+            self.cached_bytes += size
+
+    def record_loaded(self, task_id: str, steps: list[dict]) -> None:
+        """记录从持久化存储重新加载的步骤"""
+        size = sum(estimate_size(step) for step in steps)
+        with self._lock:
+            self.cached_bytes += size - self._sizes.get(task_id, 0)
+            self._sizes[task_id] = size
+            self._step_counts[task_id] = len(steps)
+
+    def touch(self, task_id: str) -> None:
+        """标记任务最近被访问"""
+        with self._lock:
+            if task_id in self._sizes:
+                self._sizes.move_to_end(task_id)
+
+    def mark_finished(self, task_id: str) -> None:
+        """记录任务结束时间，用于 TTL 计算"""
+        with self._lock:
+            self._finished_at.setdefault(task_id, time.monotonic())
+
+    def is_over_budget(self) -> bool:
+        """缓存步骤是否超出字节预算"""
+        return self.cached_bytes > self.max_bytes
+
+    def select_evictions(self, can_evict) -> list[str]:
+        """按 LRU 顺序选出需要淘汰步骤的任务，直到缓存回到预算内"""
+        selected = []
+        with self._lock:
+            remaining = self.cached_bytes
+            for task_id, size in self._sizes.items():
+                if remaining <= self.max_bytes:
+                    break
+                if size and can_evict(task_id):
+                    selected.append(task_id)
+                    remaining -= size
+        return selected
+
+    def release_steps(self, task_id: str) -> None:
+        """步骤已从缓存淘汰，更新计数"""
+        with self._lock:
+            self._drop_steps(task_id)
+            self.evicted_tasks += 1
+
+    def due_for_sweep(self) -> bool:
+        """是否到了检查 TTL 的时间"""
+        return time.monotonic() - self._last_sweep >= self.sweep_interval
+
+    def select_expired(self) -> list[str]:
+        """选出超过 TTL 的已结束任务"""
+        now = time.monotonic()
+        with self._lock:
+            self._last_sweep = now
+            return [
+                task_id for task_id, finished_at in self._finished_at.items()
+                if now - finished_at >= self.ttl
+            ]
+
+    def release_task(self, task_id: str) -> None:
+        """任务已整体移出缓存，更新计数"""
+        with self._lock:
+            self._drop_steps(task_id)
+            self._finished_at.pop(task_id, None)
+            self.expired_tasks += 1
+
+    def _drop_steps(self, task_id: str) -> None:
+        """移除任务的步骤计数（调用方需持有锁）"""
+        size = self._sizes.pop(task_id, 0)
+        self.cached_bytes -= size
+        self.evicted_bytes += size
+        self.evicted_steps += self._step_counts.pop(task_id, 0)
+
+    def get_stats(self) -> dict:
+        """获取保留策略统计"""
+        with self._lock:
+            return {
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "cached_bytes": self.cached_bytes,
+                "cached_tasks": len(self._sizes),
+                "evicted_bytes": self.evicted_bytes,
+                "evicted_steps": self.evicted_steps,
+                "evicted_tasks": self.evicted_tasks,
+                "expired_tasks": self.expired_tasks
+            }
@@ -0,0 +1,172 @@
+import asyncio
+from collections import deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+
+class SchedulerFullError(Exception):
+    """调度器容量已满（执行槽位和等待队列均已占满）"""
+    def __init__(self, running: int, pending: int):
+        self.running = running
+        self.pending = pending
+        super().__init__(f"任务调度器已满: 执行中 {running} 个，排队中 {pending} 个")
+
+
+@dataclass
+class ScheduledJob:
+    """调度器中的一个任务"""
+    task_id: str
+    factory: Callable[[], Awaitable[None]]
+    future: asyncio.Future
+    started: asyncio.Event = field(default_factory=asyncio.Event)
+    runner: asyncio.Task | None = None
+
+
+class TaskScheduler:
+    """有界任务调度器
+
+    固定数量的 worker 从等待队列中取任务执行，队列满时直接拒绝新任务，
+    避免超出 browserless 的并发会话上限。
+    """
+    def __init__(self, max_workers: int, max_queue_length: int):
+        self.max_workers = max_workers
+        self.max_queue_length = max_queue_length
+        self._pending: deque[ScheduledJob] = deque()
+        self._running: dict[str, ScheduledJob] = {}
+        self._workers: list[asyncio.Task] = []
+        self._wakeup: asyncio.Condition | None = None
+        # 事件循环只弱引用任务，保留通知任务的引用直到执行完成，避免唤醒丢失
+        self._notifiers: set[asyncio.Task] = set()
+
+    @property
+    def running_count(self) -> int:
+        """正在执行的任务数"""
+        return len(self._running)
+
+    @property
+    def pending_count(self) -> int:
+        """排队中的任务数"""
+        return len(self._pending)
+
+    def has_capacity(self) -> bool:
+        """是否还能接收新任务"""
+        return len(self._running) + len(self._pending) < self.max_workers + self.max_queue_length
+
+    async def wait_for_capacity(self) -> None:
+        """等待调度器能接收新任务（有任务结束或排队中的任务被取消时唤醒）"""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Condition()
+        async with self._wakeup:
+            await self._wakeup.wait_for(self.has_capacity)
+
+    def get_job(self, task_id: str) -> ScheduledJob | None:
+        """获取任务对应的调度项"""
+        if task_id in self._running:
+            return self._running[task_id]
+        for job in self._pending:
+            if job.task_id == task_id:
+                return job
+        return None
+
+    def position(self, task_id: str) -> int | None:
+        """获取任务的排队位置：0 表示正在执行，n 表示前面还有 n-1 个任务，None 表示不在调度器中"""
+        if task_id in self._running:
+            return 0
+        for index, job in enumerate(self._pending, 1):
+            if job.task_id == task_id:
+                return index
+        return None
+
+    def submit(self, task_id: str, factory: Callable[[], Awaitable[None]]) -> ScheduledJob:
+        """提交任务，容量不足时抛出 SchedulerFullError"""
+        existing = self.get_job(task_id)
+        if existing:
+            return existing
+
+        if not self.has_capacity():
+            raise SchedulerFullError(len(self._running), len(self._pending))
+
+        self._ensure_workers()
+        job = ScheduledJob(
+            task_id=task_id,
+            factory=factory,
+            future=asyncio.get_running_loop().create_future()
+        )
+        self._pending.append(job)
+        self._notify()
+        return job
+
+    def cancel(self, task_id: str) -> bool:
+        """取消排队中或执行中的任务"""
+        if task_id in self._running:
+            job = self._running[task_id]
+            if job.runner:
+                job.runner.cancel()
+            return True
+
+        for job in self._pending:
+            if job.task_id == task_id:
+                self._pending.remove(job)
+                job.future.cancel()
+                self._notify()
+                return True
+        return False
+
+    async def shutdown(self) -> None:
+        """停止所有 worker 并取消未完成的任务"""
+        for job in list(self._pending):
+            job.future.cancel()
+        self._pending.clear()
+        if self._wakeup is not None:
+            self._notify()
+        for job in list(self._running.values()):
+            if job.runner:
+                job.runner.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    def _ensure_workers(self) -> None:
+        """在事件循环中按需启动 worker"""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Condition()
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        while len(self._workers) < self.max_workers:
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    def _notify(self) -> None:
+        """唤醒等待中的 worker 和等待容量的提交方"""
+        async def notify():
+            async with self._wakeup:
+                self._wakeup.notify_all()
+
+        task = asyncio.get_running_loop().create_task(notify())
+        self._notifiers.add(task)
+        task.add_done_callback(self._notifiers.discard)
+
+    async def _worker(self) -> None:
+        """worker 主循环"""
+        while True:
+            async with self._wakeup:
+                await self._wakeup.wait_for(lambda: bool(self._pending))
+                job = self._pending.popleft()
+
+            self._running[job.task_id] = job
+            job.started.set()
+            job.runner = asyncio.create_task(job.factory())
+            try:
+                # 等待而不直接 await，避免取消任务时连带取消 worker
+                await asyncio.wait([job.runner])
+                if job.future.done():
+                    continue
+                if job.runner.cancelled():
+                    job.future.cancel()
+                elif job.runner.exception() is not None:
+                    job.future.set_exception(job.runner.exception())
+                else:
+                    job.future.set_result(None)
+            finally:
+                self._running.pop(job.task_id, None)
+                # 唤醒等待容量的提交方
+                self._notify()
@@ -0,0 +1,142 @@
+import base64
+import hashlib
+import io
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+
+from PIL import Image
+
+from .blob_store import ScreenshotStore
+
+# 缩略图格式对应的 Pillow 编码器名称
+_THUMBNAIL_FORMATS = {
+    "webp": "WEBP",
+    "jpeg": "JPEG",
+}
+
+# 颜色摘要：8x8 RGB 缩略，每个通道允许的最大差值
+_COLOR_SIGNATURE_SIZE = 8
+_COLOR_TOLERANCE = 8
+
+
+@dataclass
+class ProcessedScreenshot:
+    """处理后的截图"""
+    digest: str
+    perceptual_hash: int
+    color_signature: bytes
+    data: bytes
+    thumbnail: bytes
+
+
+def perceptual_hash(image: Image.Image, hash_size: int = 16) -> int:
+    """计算差异哈希（dHash），视觉上相同的截图哈希值相同或非常接近"""
+    gray = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = gray.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def color_signature(image: Image.Image, size: int = _COLOR_SIGNATURE_SIZE) -> bytes:
+    """计算颜色摘要（缩小后的 RGB 像素）
+
+    dHash 只反映相邻像素的明暗关系，纯色或大面积留白的页面哈希值都相同，
+    判断视觉相同时还需要比较颜色摘要。
+    """
+    return image.convert("RGB").resize((size, size), Image.Resampling.BOX).tobytes()
+
+
+def process_screenshot(screenshot: str, thumbnail_width: int, thumbnail_format: str,
+                       quality: int) -> ProcessedScreenshot:
+    """解码截图，计算感知哈希并生成缩略图
+
+    CPU 密集，在线程池或进程池中执行，必须保持为可 pickle 的模块级函数。
+    """
+    data = base64.b64decode(screenshot)
+    image = Image.open(io.BytesIO(data))
+    image.load()
+
+    thumbnail = image.convert("RGB")
+    if thumbnail.width > thumbnail_width:
+        height = max(1, round(thumbnail.height * thumbnail_width / thumbnail.width))
+        thumbnail = thumbnail.resize((thumbnail_width, height), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    thumbnail.save(output, _THUMBNAIL_FORMATS[thumbnail_format], quality=quality)
+
+    return ProcessedScreenshot(
+        digest=hashlib.sha256(data).hexdigest(),
+        perceptual_hash=perceptual_hash(image),
+        color_signature=color_signature(image),
+        data=data,
+        thumbnail=output.getvalue()
+    )
+
+
+class ScreenshotPipeline:
+    """截图后处理流水线
+
+    - 在线程池/进程池中解码截图、生成 WebP/JPEG 缩略图，不阻塞事件循环
+    - 通过感知哈希和颜色摘要识别与上一步视觉相同的截图，跳过重复存储
+      （dedup_distance 为负数时只跳过字节相同的截图）
+    - 缩略图始终保存，全分辨率截图只在任务需要时保存
+    """
+    def __init__(self, screenshot_store: ScreenshotStore, executor: str = "thread",
+                 max_workers: int = 2, thumbnail_width: int = 480,
+                 thumbnail_format: str = "webp", quality: int = 60,
+                 dedup_distance: int = 0):
+        if thumbnail_format not in _THUMBNAIL_FORMATS:
+            raise ValueError(f"不支持的缩略图格式: {thumbnail_format}")
+        self.screenshot_store = screenshot_store
+        self.thumbnail_width = thumbnail_width
+        self.thumbnail_format = thumbnail_format
+        self.quality = quality
+        self.dedup_distance = dedup_distance
+        self._executor: Executor
+        if executor == "process":
+            self._executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="screenshot-pipeline")
+
+    def submit(self, screenshot: str) -> Future:
+        """提交 base64 截图进行处理"""
+        return self._executor.submit(
+            process_screenshot,
+            screenshot,
+            self.thumbnail_width,
+            self.thumbnail_format,
+            self.quality
+        )
+
+    def is_duplicate(self, previous: ProcessedScreenshot | None, current: ProcessedScreenshot) -> bool:
+        """判断截图是否与上一张字节相同或视觉相同
+
+        视觉相同要求感知哈希的汉明距离不超过 dedup_distance，且颜色摘要每个通道的差值不超过容差。
+        """
+        if previous is None:
+            return False
+        if previous.digest == current.digest:
+            return True
+        if self.dedup_distance < 0:
+            return False
+        distance = (previous.perceptual_hash ^ current.perceptual_hash).bit_count()
+        if distance > self.dedup_distance:
+            return False
+        return max(
+            (abs(a - b) for a, b in zip(previous.color_signature, current.color_signature, strict=True)),
+            default=0
+        ) <= _COLOR_TOLERANCE
+
+    def save(self, processed: ProcessedScreenshot, keep_full: bool) -> dict:
+        """保存缩略图（以及按需保存全分辨率截图），返回截图引用"""
+        return {
+            "thumbnail_ref": self.screenshot_store.put(processed.thumbnail),
+            "screenshot_ref": self.screenshot_store.put(processed.data) if keep_full else None
+        }
+
+    def close(self) -> None:
+        """关闭处理线程池/进程池"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -3,20 +3,66 @@ import contextlib
 import os
 import platform
 import sys
+import time
 import traceback
 import uuid
+from collections.abc import AsyncIterator
 from datetime import datetime
 
 import psutil
 from fastapi import WebSocket
 
-from models.agent import create_agent
-from schemas.browser_task import BrowserTask, WSMessage
+from core import telemetry
+from core.serialization import ws_message_dict
+from models.agent import create_browser
+from models.llm import close_llm_clients, get_llm_stats
+from schemas.browser_task import BrowserTask
 
-from .callbacks import CallbackManager
-from .error_handler import ErrorHandler
+from .blob_store import ScreenshotStore
+from .broadcaster import Frame, SubscriberQueue, TaskBroadcaster, encode_frame
+from .browser_pool import BrowserPool
+from .checkpoint import TaskNotResumableError
+from .config import (
+    get_agent_execution_mode,
+    get_agent_worker_processes,
+    get_browser_cdp_url,
+    get_browser_pool_health_check_interval,
+    get_browser_pool_max_age,
+    get_browser_pool_max_idle,
+    get_browser_pool_min_size,
+    get_idempotency_key_ttl,
+    get_max_queue_length,
+    get_max_workers,
+    get_metrics_sample_interval,
+    get_metrics_window_size,
+    get_queue_status_interval,
+    get_remote_poll_interval,
+    get_replay_buffer_size,
+    get_resume_on_startup,
+    get_screenshot_dedup_distance,
+    get_screenshot_executor,
+    get_screenshot_keep_full,
+    get_screenshot_store_dir,
+    get_screenshot_workers,
+    get_sse_heartbeat_interval,
+    get_subscriber_overflow_limit,
+    get_subscriber_queue_policy,
+    get_subscriber_queue_size,
+    get_task_dedup_window,
+    get_thumbnail_format,
+    get_thumbnail_quality,
+    get_thumbnail_width,
+)
+from .dedup import SubmissionDeduplicator, task_fingerprint
+from .executor import execute_agent_task
 from .message_processor import MessageProcessor
 from .metrics import SystemMetricsCollector
+from .protocol import PROTOCOL_JSON, PROTOCOL_SSE
+from .relay import TaskRelay
+from .scheduler import SchedulerFullError, TaskScheduler
+from .screenshot_pipeline import ScreenshotPipeline
+from .store import create_task_store
+from .worker_pool import AgentWorkerPool
 
 
 class BrowserService:
@@ -24,28 +70,93 @@ class BrowserService:
     def __init__(self):
         print("\n=== BrowserService 初始化开始 ===")
         try:
-            self.tasks: dict[str, BrowserTask] = {}
-            print("✓ 任务字典初始化成功")
-            
-            self.task_steps: dict[str, list[dict]] = {}
-            print("✓ 步骤字典初始化成功")
-            
-            self.task_result: dict[str, dict] = {}
-            print("✓ 结果字典初始化成功")
-            
-            self.task_errors: dict[str, list[dict]] = {}
-            print("✓ 错误字典初始化成功")
-            
-            self.task_metadata: dict[str, dict] = {}
-            print("✓ 元数据字典初始化成功")
-            
-            self.task_stats: dict[str, dict] = {}
-            print("✓ 统计数据字典初始化成功")
+            # 初始化任务存储
+            self.store = create_task_store()
+            print(f"✓ 任务存储初始化成功 ({type(self.store).__name__})")
+
+            # 初始化截图存储
+            self.screenshot_store = ScreenshotStore(get_screenshot_store_dir())
+            print(f"✓ 截图存储初始化成功 ({self.screenshot_store.root})")
 
             # 初始化系统监控
             self.process = psutil.Process(os.getpid())
-            self.metrics_collector = SystemMetricsCollector(self.process)
+            self.metrics_collector = SystemMetricsCollector(
+                self.process,
+                interval=get_metrics_sample_interval(),
+                window_size=get_metrics_window_size()
+            )
+            self.metrics_collector.start()
             print("✓ 系统监控初始化成功")
+
+            # 初始化消息广播器
+            self.broadcaster = TaskBroadcaster(replay_buffer_size=get_replay_buffer_size())
+            print("✓ 消息广播器初始化成功")
+
+            # 共享模式下转发其他 worker 执行的任务的消息
+            self.relay = TaskRelay(self.store, self.broadcaster, poll_interval=get_remote_poll_interval())
+
+            # 初始化任务调度器
+            self.scheduler = TaskScheduler(
+                max_workers=get_max_workers(),
+                max_queue_length=get_max_queue_length()
+            )
+            print(f"✓ 任务调度器初始化成功 (workers: {self.scheduler.max_workers}, "
+                  f"queue: {self.scheduler.max_queue_length})")
+
+            # process 模式下任务分派到 Agent worker 进程执行，每个进程有独立的浏览器连接池和截图流水线，
+            # API 进程中不再创建
+            self.worker_pool: AgentWorkerPool | None = None
+            self.browser_pool: BrowserPool | None = None
+            self.screenshot_pipeline: ScreenshotPipeline | None = None
+            if get_agent_execution_mode() == "process":
+                self.worker_pool = AgentWorkerPool(
+                    self.store,
+                    self.broadcaster,
+                    processes=get_agent_worker_processes(),
+                    max_workers=self.scheduler.max_workers
+                )
+                print(f"✓ Agent worker 进程池初始化成功 (processes: {self.worker_pool.processes})")
+            else:
+                self.screenshot_pipeline = ScreenshotPipeline(
+                    self.screenshot_store,
+                    executor=get_screenshot_executor(),
+                    max_workers=get_screenshot_workers(),
+                    thumbnail_width=get_thumbnail_width(),
+                    thumbnail_format=get_thumbnail_format(),
+                    quality=get_thumbnail_quality(),
+                    dedup_distance=get_screenshot_dedup_distance()
+                )
+                print("✓ 截图处理流水线初始化成功")
+
+                # 初始化浏览器连接池，每个执行中的任务租用一个连接
+                cdp_url = get_browser_cdp_url()
+                self.browser_pool = BrowserPool(
+                    lambda: create_browser(cdp_url),
+                    min_size=get_browser_pool_min_size(),
+                    max_size=self.scheduler.max_workers,
+                    max_idle=get_browser_pool_max_idle(),
+                    max_age=get_browser_pool_max_age(),
+                    health_check_interval=get_browser_pool_health_check_interval()
+                )
+                print(f"✓ 浏览器连接池初始化成功 (min: {self.browser_pool.min_size}, "
+                      f"max: {self.browser_pool.max_size})")
+
+            # 初始化重复提交检测
+            self.deduplicator = SubmissionDeduplicator(
+                key_ttl=get_idempotency_key_ttl(),
+                dedup_window=get_task_dedup_window()
+            )
+
+            # 注册运行时指标
+            telemetry.TASKS_RUNNING.set_function(lambda: self.scheduler.running_count)
+            telemetry.TASKS_QUEUED.set_function(lambda: self.scheduler.pending_count)
+            telemetry.SUBSCRIBERS.set_function(self.broadcaster.subscriber_count)
+            telemetry.SUBSCRIBER_QUEUE_DEPTH.set_function(self.broadcaster.queued_frames)
+            telemetry.CACHED_BYTES.set_function(
+                lambda: self.store.get_retention_stats().get("cached_bytes", 0)
+            )
+            telemetry.BROWSER_POOL_IDLE.set_function(lambda: self._browser_pool_stats().get("idle", 0))
+            telemetry.BROWSER_POOL_LEASED.set_function(lambda: self._browser_pool_stats().get("leased", 0))
             
             print("=== BrowserService 初始化完成 ===\n")
         except Exception as e:
@@ -53,7 +164,32 @@ class BrowserService:
             print(f"错误详情:\n{traceback.format_exc()}")
             raise
 
-    def create_task(self, task_description: str) -> BrowserTask:
+    async def find_duplicate_task(self, task_description: str, full_screenshots: bool | None = None,
+                                  idempotency_key: str | None = None) -> BrowserTask | None:
+        """查找重复提交对应的已有任务
+
+        带 Idempotency-Key 的请求总是返回该键创建的任务；按内容去重时，
+        已失败的任务不参与去重，允许重新提交。
+        Idempotency-Key 与请求内容不匹配时抛出 IdempotencyConflictError。
+        """
+        fingerprint = task_fingerprint(task_description, self._resolve_full_screenshots(full_screenshots))
+        task_id = self.deduplicator.lookup(fingerprint, idempotency_key)
+        if task_id is None:
+            return None
+        task = await self._read_store(self.store.get_task, task_id)
+        if task is None or (task.status == "failed" and not idempotency_key):
+            self.deduplicator.forget(task_id)
+            return None
+        task.queue_position = self.scheduler.position(task_id)
+        print(f"✓ 重复提交，返回已有任务 (ID: {task_id}, 状态: {task.status})")
+        return task
+
+    def _resolve_full_screenshots(self, full_screenshots: bool | None) -> bool:
+        """未指定时使用 SCREENSHOT_KEEP_FULL 的默认值"""
+        return get_screenshot_keep_full() if full_screenshots is None else full_screenshots
+
+    def create_task(self, task_description: str, full_screenshots: bool | None = None,
+                    idempotency_key: str | None = None) -> BrowserTask:
         """创建新任务"""
         print("\n=== 开始创建任务 ===")
         try:
@@ -67,16 +203,14 @@ class BrowserService:
             task = BrowserTask(
                 task_id=task_id,
                 task_description=task_description,
+                full_screenshots=self._resolve_full_screenshots(full_screenshots),
                 created_at=datetime.now(),
                 updated_at=datetime.now()
             )
             print("   ✓ 任务对象创建成功")
             
             print("4. 初始化任务相关数据...")
-            self.tasks[task_id] = task
-            self.task_steps[task_id] = []
-            self.task_errors[task_id] = []
-            self.task_metadata[task_id] = {
+            metadata = {
                 "browser_info": {},
                 "performance_metrics": self.metrics_collector.get_metrics(),
                 "environment": {
@@ -86,7 +220,7 @@ class BrowserService:
                     "memory_total": psutil.virtual_memory().total
                 }
             }
-            self.task_stats[task_id] = {
+            stats = {
                 "started_at": None,
                 "completed_at": None,
                 "duration": 0,
@@ -94,9 +228,18 @@ class BrowserService:
                 "error_count": 0,
                 "retry_count": 0,
                 "last_activity": datetime.now().isoformat(),
-                "system_metrics": []  # 用于存储任务执行过程中的系统指标
+                "system_metrics": [],  # 最近若干步骤的系统指标（TASK_METRICS_SAMPLES）
+                "screenshots": {}  # 步骤 -> [全分辨率截图摘要, 缩略图摘要]
             }
             print("   ✓ 任务数据初始化成功")
+
+            print("5. 提交任务到调度器...")
+            self.start_task(task)
+            self.store.add_task(task, metadata, stats)
+            self.deduplicator.remember(
+                task_id, task_fingerprint(task_description, task.full_screenshots), idempotency_key
+            )
+            print(f"   ✓ 任务已提交 (状态: {task.status})")
             
             print(f"=== 任务创建成功 (ID: {task_id}) ===\n")
             return task
@@ -107,122 +250,444 @@ class BrowserService:
             print(f"错误详情:\n{traceback.format_exc()}")
             raise
 
-    def get_task(self, task_id: str) -> BrowserTask | None:
+    async def get_task(self, task_id: str) -> BrowserTask | None:
         """获取任务"""
         print(f"\n=== 获取任务 (ID: {task_id}) ===")
-        task = self.tasks.get(task_id)
+        task = await self._read_store(self.store.get_task, task_id)
         if task:
+            task.queue_position = self.scheduler.position(task_id)
             print("✓ 任务找到")
             print(f"  描述: {task.task_description}")
             print(f"  状态: {task.status}")
-            print(f"  步骤数: {len(self.task_steps[task_id])}")
-            print(f"  错误数: {len(self.task_errors[task_id])}")
+            if task.queue_position:
+                print(f"  排队位置: {task.queue_position}")
+            stats = await self._read_store(self.store.get_stats, task_id)
+            print(f"  步骤数: {stats.get('step_count', 0)}")
+            print(f"  错误数: {stats.get('error_count', 0)}")
             if task.status == "completed":
-                duration = self.task_stats[task_id]["duration"]
+                duration = stats.get("duration", 0)
                 print(f"  执行时长: {duration:.2f}秒")
         else:
             print("❌ 任务未找到")
         print("=== 获取任务结束 ===\n")
         return task
 
-    async def run_task(self, task: BrowserTask, websocket: WebSocket) -> None:
-        """运行任务"""
-        try:
-            # 更新任务状态和开始时间
-            task.status = "running"
+    async def start(self) -> None:
+        """预热浏览器连接池（process 模式下启动 Agent worker 进程），然后恢复上次未执行完的任务"""
+        if self.worker_pool is not None:
+            self.worker_pool.start()
+            print(f"✓ Agent worker 进程已启动 (processes: {self.worker_pool.processes})")
+        else:
+            await self.browser_pool.start()
+            print(f"✓ 浏览器连接池已预热 (空闲连接: {self.browser_pool.idle_count})")
+        if get_resume_on_startup():
+            await self.resume_unfinished_tasks()
+
+    async def resume_task(self, task_id: str) -> BrowserTask | None:
+        """从最近的断点恢复执行任务，任务不存在时返回 None
+
+        没有断点的任务从头开始执行。任务已完成或正由其他仍在运行的 worker 执行时
+        抛出 TaskNotResumableError，调度器已满时抛出 SchedulerFullError。
+        """
+        task = await self._read_store(self.store.get_task, task_id)
+        if task is None:
+            return None
+        if self.scheduler.get_job(task_id) is not None:
+            task.queue_position = self.scheduler.position(task_id)
+            return task
+        if task.status == "completed":
+            raise TaskNotResumableError(task_id, "任务已完成")
+        if await self._read_store(self.store.owned_elsewhere, task_id):
+            raise TaskNotResumableError(task_id, "任务正在其他 worker 上执行")
+        task = await self._read_store(self.store.claim_task, task_id)
+        if task is None:
+            raise TaskNotResumableError(task_id, "任务已被其他 worker 接管")
+
+        resume = await self._read_store(self._resume_state, task_id)
+        # 读取期间同一任务可能已被另一个请求恢复
+        if self.scheduler.get_job(task_id) is not None:
+            task.queue_position = self.scheduler.position(task_id)
+            return task
+        checkpoint = resume["checkpoint"]
+        print(f"\n=== 恢复任务 (ID: {task_id}, 断点步骤: "
+              f"{checkpoint['n_steps'] - 1 if checkpoint else '无'}) ===")
+        self.start_task(task, resume)
+        self.store.save_task(task)
+        task.queue_position = self.scheduler.position(task_id)
+        return task
+
+    async def resume_unfinished_tasks(self) -> list[str]:
+        """恢复重启前处于排队或执行中的任务，返回已恢复的任务ID"""
+        resumed = []
+        for task_id in await self._read_store(self.store.find_unfinished_tasks):
+            try:
+                if await self.resume_task(task_id) is not None:
+                    resumed.append(task_id)
+            except TaskNotResumableError:
+                continue
+            except SchedulerFullError:
+                print("Warning - 调度器已满，剩余未完成的任务需要通过 resume 接口恢复")
+                break
+            except Exception as e:
+                print(f"Warning - 恢复任务失败 ({task_id}): {str(e)}")
+        if resumed:
+            print(f"✓ 已恢复 {len(resumed)} 个未完成的任务")
+        return resumed
+
+    def _resume_state(self, task_id: str) -> dict:
+        """恢复执行所需的信息：断点、已发布的最后一个消息序号和已记录的步骤数（可能访问数据库）"""
+        steps = self.store.get_steps(task_id)
+        result = self.store.get_result(task_id)
+        sequences = [message.get("sequence") or 0 for message in steps]
+        if result is not None:
+            sequences.append(result.get("sequence") or 0)
+        return {
+            "checkpoint": self.store.get_checkpoint(task_id),
+            "last_sequence": max(sequences, default=0),
+            "step_count": len(steps)
+        }
+
+    async def shutdown(self) -> None:
+        """停止调度器并将任务存储落盘"""
+        print("\n=== BrowserService 关闭 ===")
+        await self.scheduler.shutdown()
+        print("✓ 任务调度器已停止")
+        if self.worker_pool is not None:
+            await self.worker_pool.close()
+            print("✓ Agent worker 进程已停止")
+        else:
+            await self.browser_pool.close()
+            print("✓ 浏览器连接池已关闭")
+        await close_llm_clients()
+        print("✓ LLM 客户端已关闭")
+        self.metrics_collector.stop()
+        await asyncio.to_thread(self.store.close)
+        print("✓ 任务存储已关闭")
+        if self.screenshot_pipeline is not None:
+            self.screenshot_pipeline.close()
+        self.screenshot_store.close()
+        print("✓ 截图存储已关闭")
+
+    async def get_step_screenshot(self, task_id: str, step: int, variant: str = "full") -> str | None:
+        """获取指定步骤截图的内容摘要，未保存全分辨率截图时返回缩略图"""
+        refs = await self._read_store(self.store.get_screenshot_refs, task_id, step)
+        if refs is None:
+            return None
+        screenshot_ref, thumbnail_ref = refs
+        if variant == "thumbnail":
+            return thumbnail_ref
+        return screenshot_ref or thumbnail_ref
+
+    def get_stats(self) -> dict:
+        """获取服务运行统计"""
+        return {
+            "scheduler": {
+                "max_workers": self.scheduler.max_workers,
+                "max_queue_length": self.scheduler.max_queue_length,
+                "running": self.scheduler.running_count,
+                "pending": self.scheduler.pending_count
+            },
+            "cache": self.store.get_retention_stats(),
+            "shared_store": self.store.shared,
+            "remote_tasks_following": self.relay.following_count,
+            "subscriber_queues": self.broadcaster.get_queue_stats(),
+            "browser_pool": self._browser_pool_stats(),
+            "agent_workers": self.worker_pool.get_stats() if self.worker_pool is not None else None,
+            "llm": get_llm_stats(),
+            "system": self.metrics_collector.get_aggregates()
+        }
+
+    def _browser_pool_stats(self) -> dict:
+        """浏览器连接池统计，process 模式下为各 worker 进程上报的汇总"""
+        if self.worker_pool is not None:
+            return self.worker_pool.get_browser_pool_stats()
+        return self.browser_pool.get_stats()
+
+    def has_capacity(self) -> bool:
+        """调度器是否还能接收新任务"""
+        return self.scheduler.has_capacity()
+
+    def get_queue_position(self, task_id: str) -> int | None:
+        """获取任务的排队位置"""
+        return self.scheduler.position(task_id)
+
+    def start_task(self, task: BrowserTask, resume: dict | None = None) -> None:
+        """将任务提交到调度器执行，容量不足时抛出 SchedulerFullError"""
+        job = self.scheduler.submit(task.task_id, lambda: self._execute_task(task, resume))
+        if not job.started.is_set():
+            task.status = "queued"
             task.updated_at = datetime.now()
-            self.task_stats[task.task_id]["started_at"] = datetime.now().isoformat()
-            self.task_stats[task.task_id]["last_activity"] = datetime.now().isoformat()
-
-            # 如果任务已有缓存的步骤，先发送所有缓存的步骤
-            if self.task_steps[task.task_id]:
-                print(f"发送缓存的步骤，共 {len(self.task_steps[task.task_id])} 步")
-                for cached_message in self.task_steps[task.task_id]:
-                    await websocket.send_json(cached_message)
-                
-                # 如果任务已完成，发送结果消息
-                if task.status == "completed" and task.task_id in self.task_result:
-                    await websocket.send_json(self.task_result[task.task_id])
-                    return
-
-            # 初始化错误处理器
-            error_handler = ErrorHandler(self.task_stats, self.task_errors)
-
-            # 初始化消息处理器
-            message_processor = MessageProcessor(websocket, task.task_id, error_handler)
-            
-            # 初始化回调管理器
-            callback_manager = CallbackManager(
-                task_id=task.task_id,
-                task_stats=self.task_stats,
-                task_steps=self.task_steps,
-                task_result=self.task_result,
-                metrics_collector=self.metrics_collector,
-                error_handler=error_handler,
-                message_queue=message_processor.get_queue()
-            )
 
-            # 启动消息处理
-            print("1. 启动消息处理...")
-            message_processor_task = asyncio.create_task(message_processor.process_messages())
-            print("2. 消息处理器启动完成")
+    async def run_batch(self, task_descriptions: list[str], max_concurrency: int,
+                        full_screenshots: bool | None = None) -> AsyncIterator[dict]:
+        """批量提交任务，按发生顺序产出每个任务的状态变化和结果事件
+
+        本批次最多同时有 max_concurrency 个任务在调度器中，调度器已满时等待有任务结束后重试，
+        不会因为批次过大被拒绝。调用方停止迭代时，尚未提交的任务不再提交，
+        已提交的任务继续执行。
+        """
+        events: asyncio.Queue[dict] = asyncio.Queue()
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        def emit(event: str, index: int, task: BrowserTask | None = None, **data) -> None:
+            events.put_nowait({
+                "event": event,
+                "index": index,
+                "task_id": task.task_id if task else None,
+                "status": data.pop("status", task.status if task else None),
+                "timestamp": datetime.now().isoformat(),
+                **data
+            })
+
+        async def run_one(index: int, description: str) -> None:
+            async with semaphore:
+                while True:
+                    try:
+                        task = self.create_task(description, full_screenshots=full_screenshots)
+                        break
+                    except SchedulerFullError:
+                        await self.scheduler.wait_for_capacity()
+                    except Exception as e:
+                        emit("rejected", index, error=str(e))
+                        return
+                emit("submitted", index, task)
+
+                job = self.scheduler.get_job(task.task_id)
+                if job is not None:
+                    started = asyncio.ensure_future(job.started.wait())
+                    await asyncio.wait([job.future, started], return_when=asyncio.FIRST_COMPLETED)
+                    started.cancel()
+                    if job.started.is_set():
+                        emit("running", index, task, status="running")
+                    await asyncio.wait([job.future])
+
+                # 调度器关闭时任务可能未正常结束
+                status = task.status if task.status in ("completed", "failed") else "cancelled"
+                result = await self._read_store(self.store.get_result, task.task_id)
+                stats = await self._read_store(self.store.get_stats, task.task_id)
+                emit(status, index, task, status=status,
+                     step_count=stats.get("step_count", 0),
+                     result=result.get("data") if result else None)
+
+        runners = [asyncio.create_task(run_one(index, description))
+                   for index, description in enumerate(task_descriptions)]
+        done = asyncio.ensure_future(asyncio.gather(*runners, return_exceptions=True))
+        counts = {"completed": 0, "failed": 0, "cancelled": 0, "rejected": 0}
+        try:
+            while not (done.done() and events.empty()):
+                getter = asyncio.ensure_future(events.get())
+                await asyncio.wait([getter, done], return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    continue
+                event = getter.result()
+                if event["event"] in counts:
+                    counts[event["event"]] += 1
+                yield event
+            yield {"event": "summary", "total": len(task_descriptions), **counts,
+                   "timestamp": datetime.now().isoformat()}
+        finally:
+            for runner in runners:
+                runner.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await done
 
+    async def stream_task(self, task: BrowserTask, websocket: WebSocket,
+                          last_sequence: int | None = None, protocol: str = PROTOCOL_JSON) -> None:
+        """将任务消息推送给一个 WebSocket 订阅者，任务执行与连接生命周期无关
+
+        客户端重连时传入最后收到的消息序号，只补发缺失的消息：
+        优先使用广播器的环形缓冲区，无法覆盖时回退到任务存储。
+        """
+        after_sequence = last_sequence or 0
+        message_processor = MessageProcessor(websocket, task.task_id, protocol, self._new_subscriber_queue())
+        message_processor.last_sequence = after_sequence
+        queue = message_processor.get_queue()
+
+        # 先订阅再补发，避免遗漏两者之间产生的消息（重复的序号会被跳过）
+        self.broadcaster.subscribe(task.task_id, queue)
+        following = self._follow_remote(task, after_sequence)
+        try:
+            for frame in await self._replay_frames(task.task_id, after_sequence):
+                await message_processor.send_frame(frame)
+
+            # 任务已结束，发送最终消息后返回
+            if task.status in ("completed", "failed"):
+                cached_result = await self._read_store(self.store.get_result, task.task_id)
+                if cached_result:
+                    await message_processor.send_message(cached_result)
+                return
+
+            async def send_status():
+                if task.status == "queued":
+                    await message_processor.send_message(self._build_status_message(task))
+
+            await send_status()
+            sender = asyncio.create_task(message_processor.process_messages(
+                idle_timeout=get_queue_status_interval(),
+                on_idle=send_status
+            ))
+            receiver = asyncio.create_task(self._wait_disconnect(websocket))
             try:
-                # 启动 Agent
-                print("\n=== 开始创建 Agent ===")
-                print("1. 初始化 Agent...")
-                agent = create_agent(
-                    task=task.task_description,
-                    step_callback=callback_manager.create_step_callback(),
-                    done_callback=callback_manager.create_done_callback()
-                )
-                print("2. Agent 初始化完成")
-                
-                # 验证浏览器连接
-                print("\n=== 验证浏览器连接 ===")
-                try:
-                    browser = agent.browser
-                    playwright_browser = await browser.get_playwright_browser()
-                    contexts = playwright_browser.contexts
-                    print("✓ 成功连接到远程浏览器")
-                    print(f"✓ 当前活动上下文数: {len(contexts)}")
-                    print(f"✓ 浏览器版本: {playwright_browser.version}")
-                    print("=== 浏览器连接验证完成 ===\n")
-                except Exception as e:
-                    print("❌ 浏览器连接验证失败")
-                    print(f"错误信息: {str(e)}")
-                    raise
-
-                print("\n=== 开始执行任务 ===")
-                print("Starting agent.run()...")
-                await agent.run()
-                print("✓ agent.run() completed")
-                await message_processor.get_queue().join()
-                print("✓ All messages processed")
-                print("=== 任务执行完成 ===\n")
+                # 任务结束或客户端断开，任一发生即停止推送
+                await asyncio.wait([sender, receiver], return_when=asyncio.FIRST_COMPLETED)
             finally:
-                message_processor_task.cancel()
-                with contextlib.suppress(asyncio.CancelledError):
-                    await message_processor_task
+                for pending in (sender, receiver):
+                    pending.cancel()
+                    with contextlib.suppress(asyncio.CancelledError, Exception):
+                        await pending
+            if sender.done() and not sender.cancelled() and sender.exception():
+                raise sender.exception()
+            if queue.evicted:
+                # 1013 Try Again Later：客户端用 last_sequence 重连即可补发被丢弃的消息
+                await websocket.close(code=1013, reason="消息积压过多，请使用 last_sequence 重连")
+        finally:
+            self.broadcaster.unsubscribe(task.task_id, queue)
+            if following:
+                self.relay.unfollow(task.task_id)
 
-        except Exception as e:
-            print(f"Error in run_task: {e}")
-            error_handler = ErrorHandler(self.task_stats, self.task_errors)
-            error = error_handler.handle_error(task.task_id, e)
-            
-            # 发送错误消息
-            current_time = datetime.now().isoformat()
-            error_message = WSMessage(
-                type="error",
-                data=error.model_dump(),
-                timestamp=current_time,
-                session_id=task.task_id,
-                sequence=1  # 错误消息使用固定序号 1
-            )
-            error_dict = error_message.model_dump()
-            await websocket.send_json(error_dict)
-            
-            # 更新任务状态
-            task.status = "failed"
-            task.result = {"error": str(e)}
-            task.updated_at = current_time 
\ No newline at end of file
+    async def stream_task_events(self, task: BrowserTask,
+                                 last_sequence: int | None = None) -> AsyncIterator[bytes]:
+        """以 Server-Sent Events 格式产出任务消息，消息与 WebSocket 推送的相同
+
+        断线重连时客户端通过 Last-Event-ID 传入最后收到的序号，只补发缺失的消息。
+        空闲时按 SSE_HEARTBEAT_INTERVAL 发送心跳注释，排队中的任务同时推送排队状态。
+        每个连接只占用一个有界的订阅队列，没有额外的后台任务；积压过多被断开时结束响应，
+        由客户端带 Last-Event-ID 重连补发。
+        """
+        sent_sequence = last_sequence or 0
+        queue = self._new_subscriber_queue()
+
+        def encode(frame: Frame) -> bytes | None:
+            nonlocal sent_sequence
+            if frame.sequence is not None:
+                if frame.sequence <= sent_sequence:
+                    return None
+                sent_sequence = frame.sequence
+            return frame.encode(PROTOCOL_SSE)
+
+        # 先订阅再补发，避免遗漏两者之间产生的消息（重复的序号会被跳过）
+        self.broadcaster.subscribe(task.task_id, queue)
+        following = self._follow_remote(task, sent_sequence)
+        try:
+            # 建议客户端断线后 3 秒重连
+            yield b"retry: 3000\n\n"
+            for frame in await self._replay_frames(task.task_id, sent_sequence):
+                if (data := encode(frame)) is not None:
+                    yield data
+
+            # 任务已结束，发送最终消息后返回
+            if task.status in ("completed", "failed"):
+                cached_result = await self._read_store(self.store.get_result, task.task_id)
+                if cached_result and (data := encode(encode_frame(cached_result))) is not None:
+                    yield data
+                return
+
+            heartbeat_interval = get_sse_heartbeat_interval()
+            if task.status == "queued":
+                yield encode_frame(self._build_status_message(task)).encode(PROTOCOL_SSE)
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), timeout=heartbeat_interval)
+                except TimeoutError:
+                    yield b": heartbeat\n\n"
+                    if task.status == "queued":
+                        yield encode_frame(self._build_status_message(task)).encode(PROTOCOL_SSE)
+                    continue
+                if frame is None:
+                    break
+                if (data := encode(frame)) is not None:
+                    yield data
+        finally:
+            self.broadcaster.unsubscribe(task.task_id, queue)
+            if following:
+                self.relay.unfollow(task.task_id)
+
+    def _new_subscriber_queue(self) -> SubscriberQueue:
+        """按配置创建订阅者发送队列"""
+        return SubscriberQueue(
+            maxsize=get_subscriber_queue_size(),
+            policy=get_subscriber_queue_policy(),
+            overflow_limit=get_subscriber_overflow_limit()
+        )
+
+    async def _read_store(self, method, *args):
+        """调用任务存储的读操作，可能访问数据库时放到线程中执行，不阻塞事件循环"""
+        if not self.store.blocking_reads:
+            return method(*args)
+        return await asyncio.to_thread(method, *args)
+
+    def _follow_remote(self, task: BrowserTask, after_sequence: int) -> bool:
+        """共享模式下订阅由其他 worker 执行的任务时，通过共享存储转发其消息"""
+        if not self.store.shared or task.status in ("completed", "failed"):
+            return False
+        if self.scheduler.get_job(task.task_id) is not None:
+            return False
+        self.relay.follow(task.task_id, after_sequence)
+        return True
+
+    async def _replay_frames(self, task_id: str, after_sequence: int) -> list[Frame]:
+        """获取序号大于 after_sequence 的已发布消息
+
+        优先使用广播器的环形缓冲区，无法覆盖时回退到任务存储。
+        """
+        frames = self.broadcaster.replay(task_id, after_sequence)
+        if frames is not None:
+            if frames:
+                print(f"从缓冲区补发消息，共 {len(frames)} 条 (序号 > {after_sequence})")
+            return frames
+        cached_steps = await self._read_store(self.store.get_steps_after, task_id, after_sequence)
+        if cached_steps:
+            print(f"从任务存储补发步骤，共 {len(cached_steps)} 步 (序号 > {after_sequence})")
+        return [encode_frame(message) for message in cached_steps]
+
+    async def _wait_disconnect(self, websocket: WebSocket) -> None:
+        """等待客户端断开连接"""
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    def _build_status_message(self, task: BrowserTask) -> dict:
+        """构造排队状态消息"""
+        return ws_message_dict(
+            "status",
+            {
+                "status": task.status,
+                "queue_position": self.scheduler.position(task.task_id),
+                "running": self.scheduler.running_count,
+                "pending": self.scheduler.pending_count
+            },
+            session_id=task.task_id
+        )
+
+    async def _execute_task(self, task: BrowserTask, resume: dict | None = None) -> None:
+        """在调度器 worker 中执行任务，消息通过广播器推送给所有订阅者
+
+        process 模式下 Agent 在 worker 进程中执行，调度器仍负责并发控制和排队。
+        恢复执行的任务保留首次开始时间，任务时长包括中断前的部分。
+        """
+        started = time.monotonic()
+        # 更新任务状态和开始时间
+        task.status = "running"
+        task.updated_at = datetime.now()
+        self.store.save_task(task)
+        stats = self.store.get_stats(task.task_id)
+        fields = {"last_activity": datetime.now().isoformat()}
+        if resume is None or not stats.get("started_at"):
+            fields["started_at"] = datetime.now().isoformat()
+        if resume is not None:
+            fields["resume_count"] = stats.get("resume_count", 0) + 1
+        self.store.update_stats(task.task_id, **fields)
+
+        try:
+            if self.worker_pool is not None:
+                await self.worker_pool.run(task, resume)
+            else:
+                await execute_agent_task(
+                    task, self.store, self.broadcaster, self.browser_pool,
+                    self.screenshot_pipeline, self.metrics_collector, resume
+                )
+        finally:
+            self.broadcaster.close(task.task_id)
+            telemetry.TASK_DURATION.labels(task.status).observe(time.monotonic() - started)
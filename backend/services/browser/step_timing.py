@@ -0,0 +1,127 @@
+import functools
+import time
+from typing import Any
+
+from core import telemetry
+
+# 步骤阶段
+PHASE_LLM = "llm"
+PHASE_STATE = "state_capture"
+PHASE_SCREENSHOT = "screenshot"
+PHASE_ACTION = "browser_action"
+PHASE_CALLBACK = "callback"
+PHASE_BACKPRESSURE = "backpressure"
+PHASE_FINALIZE = "finalize"
+PHASES = (PHASE_LLM, PHASE_STATE, PHASE_SCREENSHOT, PHASE_ACTION, PHASE_CALLBACK, PHASE_BACKPRESSURE,
+          PHASE_FINALIZE)
+
+
+class StepTimer:
+    """步骤阶段计时器
+
+    包装 Agent 的 LLM 调用、浏览器状态获取和截图方法，按阶段累计耗时。
+    browser-use 在 LLM 返回后、执行动作前调用步骤回调，因此一个步骤的计时窗口
+    从上一次回调结束开始，到本次回调结束为止：窗口内除 LLM、状态获取、截图和回调
+    以外的时间计为浏览器动作（即上一步动作的执行时间）。
+    消息构造、截图处理、保存和广播在回调之后异步完成，只计入任务汇总的 finalize 阶段；
+    处理跟不上时步骤开始前的等待计为 backpressure。
+    """
+    def __init__(self):
+        self._window_started = time.monotonic()
+        self._current: dict[str, float] = {}
+        self._totals: dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self._max: dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self._steps = 0
+
+    @property
+    def window_started(self) -> float:
+        """当前步骤计时窗口的开始时间（time.monotonic）"""
+        return self._window_started
+
+    def instrument(self, agent: Any) -> None:
+        """为 Agent 实例的各阶段方法加上计时，只修改当前实例"""
+        self._wrap(agent, "get_next_action", PHASE_LLM)
+        context = getattr(agent, "browser_context", None)
+        if context is not None:
+            self._wrap(context, "get_state", PHASE_STATE)
+            self._wrap(context, "take_screenshot", PHASE_SCREENSHOT)
+
+    def _wrap(self, target: Any, name: str, phase: str) -> None:
+        """将异步方法替换为计时版本，方法不存在时跳过"""
+        method = getattr(target, name, None)
+        if method is None:
+            return
+
+        @functools.wraps(method)
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                self.add(phase, time.perf_counter() - started)
+
+        setattr(target, name, timed)
+
+    def add(self, phase: str, seconds: float) -> None:
+        """向当前步骤累加某个阶段的耗时"""
+        self._current[phase] = self._current.get(phase, 0.0) + seconds
+
+    def finish_step(self, callback_started: float) -> dict:
+        """结束当前步骤窗口，返回各阶段耗时（秒）
+
+        callback_started 为步骤回调开始时的 time.perf_counter()。
+        """
+        self.add(PHASE_CALLBACK, time.perf_counter() - callback_started)
+        now = time.monotonic()
+        total = now - self._window_started
+        self._window_started = now
+
+        phases = self._current
+        self._current = {}
+        # 状态获取包含截图，避免重复计算
+        state = phases.get(PHASE_STATE, 0.0) - phases.get(PHASE_SCREENSHOT, 0.0)
+        phases[PHASE_STATE] = max(0.0, state)
+        measured = sum(phases.get(phase, 0.0) for phase in
+                       (PHASE_LLM, PHASE_STATE, PHASE_SCREENSHOT, PHASE_CALLBACK, PHASE_BACKPRESSURE))
+        phases[PHASE_ACTION] = max(0.0, total - measured)
+
+        timings = {phase: round(phases.get(phase, 0.0), 6) for phase in PHASES if phase != PHASE_FINALIZE}
+        timings["total"] = round(total, 6)
+        self._record(timings)
+        return timings
+
+    def record_finalize(self, seconds: float) -> None:
+        """记录回调之后异步完成的消息构造、截图处理、保存和广播耗时"""
+        self._totals[PHASE_FINALIZE] += seconds
+        self._max[PHASE_FINALIZE] = max(self._max[PHASE_FINALIZE], seconds)
+        telemetry.STEP_PHASE_DURATION.labels(PHASE_FINALIZE).observe(seconds)
+
+    def _record(self, timings: dict) -> None:
+        """累计任务级统计并导出指标"""
+        self._steps += 1
+        for phase in PHASES:
+            if phase == PHASE_FINALIZE:
+                continue
+            value = timings[phase]
+            self._totals[phase] += value
+            self._max[phase] = max(self._max[phase], value)
+            telemetry.STEP_PHASE_DURATION.labels(phase).observe(value)
+
+    def summary(self) -> dict:
+        """任务级汇总：各阶段总耗时、平均耗时、最大耗时和占比"""
+        measured = sum(value for phase, value in self._totals.items() if phase != PHASE_FINALIZE)
+        phases = {}
+        for phase in PHASES:
+            total = self._totals[phase]
+            phases[phase] = {
+                "total": round(total, 6),
+                "avg": round(total / self._steps, 6) if self._steps else 0.0,
+                "max": round(self._max[phase], 6),
+                "share": round(total / measured, 4) if measured and phase != PHASE_FINALIZE else None
+            }
+        # 浏览器耗时包括动作执行、状态获取和截图
+        browser = sum(self._totals[phase] for phase in (PHASE_ACTION, PHASE_STATE, PHASE_SCREENSHOT))
+        bound_by = None
+        if self._steps:
+            bound_by = "llm" if self._totals[PHASE_LLM] >= browser else "browser"
+        return {"steps": self._steps, "phases": phases, "bound_by": bound_by}
@@ -0,0 +1,58 @@
+from ..config import (
+    get_cache_max_bytes,
+    get_remote_cache_ttl,
+    get_retention_sweep_interval,
+    get_retention_ttl,
+    get_store_flush_batch_size,
+    get_store_flush_interval,
+    get_task_store_shared,
+    get_task_store_url,
+    get_worker_heartbeat_timeout,
+)
+from ..retention import RetentionManager
+from .base import TaskStore
+from .memory import MemoryTaskStore
+
+
+def create_task_store(url: str | None = None) -> TaskStore:
+    """根据配置创建任务存储
+
+    - memory: 进程内存储（默认）
+    - sqlite:///path/to/tasks.db: 本地 SQLite
+    - postgresql+asyncpg://...: docker-compose 中的 Postgres
+
+    TASK_STORE_SHARED 开启时使用多 worker 共享的 SQL 存储。
+    """
+    url = url or get_task_store_url()
+    retention = RetentionManager(
+        max_bytes=get_cache_max_bytes(),
+        ttl=get_retention_ttl(),
+        sweep_interval=get_retention_sweep_interval()
+    )
+    shared = get_task_store_shared()
+    if url == "memory":
+        if shared:
+            print("Warning - 内存任务存储无法在多个 worker 之间共享，请配置 sqlite 或 postgresql 的 TASK_STORE_URL")
+        return MemoryTaskStore(retention)
+
+    if shared:
+        from .shared import SharedSQLTaskStore
+        return SharedSQLTaskStore(
+            url,
+            flush_interval=get_store_flush_interval(),
+            flush_batch_size=get_store_flush_batch_size(),
+            retention=retention,
+            heartbeat_timeout=get_worker_heartbeat_timeout(),
+            remote_cache_ttl=get_remote_cache_ttl()
+        )
+
+    from .sql import SQLTaskStore
+    return SQLTaskStore(
+        url,
+        flush_interval=get_store_flush_interval(),
+        flush_batch_size=get_store_flush_batch_size(),
+        retention=retention
+    )
+
+
+__all__ = ['MemoryTaskStore', 'TaskStore', 'create_task_store']
@@ -0,0 +1,139 @@
+from abc import ABC, abstractmethod
+
+from schemas.browser_task import BrowserTask
+
+
+class TaskStore(ABC):
+    """任务存储接口
+
+    统一管理任务、步骤、结果、错误、元数据和统计数据，
+    取代 BrowserService 中分散的进程内字典。
+    """
+
+    # 是否与其他 worker 进程共享任务状态
+    shared = False
+    # 读操作是否可能访问数据库（事件循环中的调用方需要放到线程中执行）
+    blocking_reads = False
+
+    # 任务
+    @abstractmethod
+    def add_task(self, task: BrowserTask, metadata: dict, stats: dict) -> None:
+        """保存新任务及其元数据和统计数据"""
+
+    @abstractmethod
+    def get_task(self, task_id: str) -> BrowserTask | None:
+        """按任务ID获取任务"""
+
+    @abstractmethod
+    def save_task(self, task: BrowserTask) -> None:
+        """任务状态变更后持久化任务"""
+
+    # 步骤
+    @abstractmethod
+    def append_step(self, task_id: str, message: dict) -> None:
+        """追加步骤消息"""
+
+    @abstractmethod
+    def get_steps(self, task_id: str) -> list[dict]:
+        """获取任务的全部步骤消息"""
+
+    def get_steps_after(self, task_id: str, after_sequence: int) -> list[dict]:
+        """获取序号大于 after_sequence 的步骤消息（用于断线重连补发）"""
+        return [
+            step for step in self.get_steps(task_id)
+            if (step.get("sequence") or 0) > after_sequence
+        ]
+
+    @abstractmethod
+    def get_step_count(self, task_id: str) -> int:
+        """获取任务的步骤数"""
+
+    # 结果
+    @abstractmethod
+    def set_result(self, task_id: str, message: dict) -> None:
+        """保存任务结果消息"""
+
+    @abstractmethod
+    def get_result(self, task_id: str) -> dict | None:
+        """获取任务结果消息"""
+
+    # 错误
+    @abstractmethod
+    def append_error(self, task_id: str, error: dict) -> None:
+        """追加错误记录"""
+
+    @abstractmethod
+    def get_errors(self, task_id: str) -> list[dict]:
+        """获取任务的错误记录"""
+
+    # 元数据和统计
+    @abstractmethod
+    def get_metadata(self, task_id: str) -> dict:
+        """获取任务元数据"""
+
+    @abstractmethod
+    def get_stats(self, task_id: str) -> dict:
+        """获取任务统计数据（只读，修改通过 update_stats 进行，存储才能感知并持久化）"""
+
+    @abstractmethod
+    def update_stats(self, task_id: str, **fields) -> None:
+        """更新任务统计数据并标记为待持久化"""
+
+    # 截图索引（保存在统计数据中，随任务摘要持久化，不受步骤缓存淘汰影响）
+    def record_screenshot_refs(self, task_id: str, step: int,
+                               screenshot_ref: str | None, thumbnail_ref: str | None) -> None:
+        """记录步骤截图的内容摘要，查找截图时不需要读取步骤消息"""
+        index = dict(self.get_stats(task_id).get("screenshots") or {})
+        index[str(step)] = [screenshot_ref, thumbnail_ref]
+        self.update_stats(task_id, screenshots=index)
+
+    def get_screenshot_refs(self, task_id: str, step: int) -> tuple[str | None, str | None] | None:
+        """获取步骤截图的 (全分辨率, 缩略图) 内容摘要，没有截图时返回 None"""
+        stats = self.get_stats(task_id)
+        if "screenshots" not in stats:
+            # 建立索引之前记录的任务只能从步骤消息中查找
+            for message in self.get_steps(task_id):
+                data = message.get("data", {})
+                if data.get("step") == step:
+                    return data.get("screenshot_ref"), data.get("thumbnail_ref")
+            return None
+        refs = stats["screenshots"].get(str(step))
+        return (refs[0], refs[1]) if refs else None
+
+    # 断点
+    @abstractmethod
+    def save_checkpoint(self, task_id: str, checkpoint: dict) -> None:
+        """保存任务最近一次的执行断点（覆盖之前的断点）"""
+
+    @abstractmethod
+    def get_checkpoint(self, task_id: str) -> dict | None:
+        """获取任务最近一次的执行断点"""
+
+    def find_unfinished_tasks(self) -> list[str]:
+        """获取状态为排队中或执行中的任务ID（用于重启后恢复执行）"""
+        return []
+
+    def owned_elsewhere(self, task_id: str) -> bool:
+        """任务是否由仍在运行的其他 worker 执行（非共享存储中只有本进程执行任务）"""
+        return False
+
+    def claim_task(self, task_id: str) -> BrowserTask | None:
+        """接管任务以便在本进程恢复执行，任务不存在或已被其他 worker 接管时返回 None"""
+        return self.get_task(task_id)
+
+    def subscribe_changes(self, callback) -> bool:
+        """订阅其他 worker 写入任务数据的通知，回调参数为任务ID；不支持时返回 False，由调用方轮询"""
+        return False
+
+    def get_retention_stats(self) -> dict:
+        """获取缓存保留策略统计（缓存字节数、淘汰字节数等）"""
+        return {}
+
+    # 生命周期
+    @abstractmethod
+    def flush(self) -> None:
+        """将缓冲中的写操作落盘"""
+
+    @abstractmethod
+    def close(self) -> None:
+        """关闭存储并释放资源"""
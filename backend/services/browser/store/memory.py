@@ -0,0 +1,140 @@
+import threading
+
+from schemas.browser_task import BrowserTask
+
+from ..retention import FINISHED_STATUSES, RetentionManager, estimate_size
+from .base import TaskStore
+
+
+class MemoryTaskStore(TaskStore):
+    """进程内任务存储
+
+    所有数据保存在按任务ID索引的字典中，进程重启后丢失。
+    同时作为持久化存储的热数据缓存层。
+    配置 RetentionManager 后按字节预算淘汰已结束任务的步骤，并按 TTL 移出已结束任务。
+    """
+    def __init__(self, retention: RetentionManager | None = None):
+        self.retention = retention
+        self._lock = threading.RLock()
+        self._tasks: dict[str, BrowserTask] = {}
+        self._steps: dict[str, list[dict]] = {}
+        self._results: dict[str, dict] = {}
+        self._errors: dict[str, list[dict]] = {}
+        self._metadata: dict[str, dict] = {}
+        self._stats: dict[str, dict] = {}
+        self._checkpoints: dict[str, dict] = {}
+
+    def add_task(self, task: BrowserTask, metadata: dict, stats: dict) -> None:
+        with self._lock:
+            self._tasks[task.task_id] = task
+            self._steps[task.task_id] = []
+            self._errors[task.task_id] = []
+            self._metadata[task.task_id] = metadata
+            self._stats[task.task_id] = stats
+        self._maybe_sweep()
+
+    def get_task(self, task_id: str) -> BrowserTask | None:
+        return self._tasks.get(task_id)
+
+    def save_task(self, task: BrowserTask) -> None:
+        with self._lock:
+            self._tasks[task.task_id] = task
+            # 已完成的任务不会再恢复执行，断点中的浏览器存储状态不再保留
+            if task.status == "completed":
+                self._checkpoints.pop(task.task_id, None)
+        if self.retention and task.status in FINISHED_STATUSES:
+            self.retention.mark_finished(task.task_id)
+
+    def append_step(self, task_id: str, message: dict) -> None:
+        with self._lock:
+            self._steps.setdefault(task_id, []).append(message)
+        if self.retention:
+            self.retention.record_step(task_id, estimate_size(message))
+            if self.retention.is_over_budget():
+                self._evict_over_budget()
+            self._maybe_sweep()
+
+    def get_steps(self, task_id: str) -> list[dict]:
+        if self.retention:
+            self.retention.touch(task_id)
+        return list(self._steps.get(task_id, []))
+
+    def get_step_count(self, task_id: str) -> int:
+        return len(self._steps.get(task_id, []))
+
+    def set_result(self, task_id: str, message: dict) -> None:
+        with self._lock:
+            self._results[task_id] = message
+
+    def get_result(self, task_id: str) -> dict | None:
+        return self._results.get(task_id)
+
+    def append_error(self, task_id: str, error: dict) -> None:
+        with self._lock:
+            self._errors.setdefault(task_id, []).append(error)
+
+    def get_errors(self, task_id: str) -> list[dict]:
+        return list(self._errors.get(task_id, []))
+
+    def get_metadata(self, task_id: str) -> dict:
+        return self._metadata.get(task_id, {})
+
+    def get_stats(self, task_id: str) -> dict:
+        return self._stats.get(task_id, {})
+
+    def update_stats(self, task_id: str, **fields) -> None:
+        with self._lock:
+            self._stats.setdefault(task_id, {}).update(fields)
+
+    def save_checkpoint(self, task_id: str, checkpoint: dict) -> None:
+        with self._lock:
+            self._checkpoints[task_id] = checkpoint
+
+    def get_checkpoint(self, task_id: str) -> dict | None:
+        return self._checkpoints.get(task_id)
+
+    def find_unfinished_tasks(self) -> list[str]:
+        return [task_id for task_id, task in list(self._tasks.items()) if task.status in ("queued", "running")]
+
+    def get_retention_stats(self) -> dict:
+        return self.retention.get_stats() if self.retention else {}
+
+    def flush(self) -> None:
+        """内存存储无需落盘"""
+
+    def close(self) -> None:
+        """内存存储无需释放资源"""
+
+    # 缓存淘汰
+    def _can_evict(self, task_id: str) -> bool:
+        """只有已结束任务的步骤可以被淘汰"""
+        task = self._tasks.get(task_id)
+        return task is not None and task.status in FINISHED_STATUSES
+
+    def _can_expire(self, task_id: str) -> bool:
+        """任务是否可以整体移出缓存"""
+        return self._can_evict(task_id)
+
+    def _evict_over_budget(self) -> None:
+        """按 LRU 淘汰已结束任务的步骤，任务摘要、统计和结果保留"""
+        for task_id in self.retention.select_evictions(self._can_evict):
+            with self._lock:
+                self._steps.pop(task_id, None)
+            self.retention.release_steps(task_id)
+
+    def _maybe_sweep(self) -> None:
+        """定期将超过 TTL 的已结束任务移出缓存"""
+        if not self.retention or not self.retention.due_for_sweep():
+            return
+        for task_id in self.retention.select_expired():
+            if not self._can_expire(task_id):
+                continue
+            with self._lock:
+                self._tasks.pop(task_id, None)
+                self._steps.pop(task_id, None)
+                self._results.pop(task_id, None)
+                self._errors.pop(task_id, None)
+                self._metadata.pop(task_id, None)
+                self._stats.pop(task_id, None)
+                self._checkpoints.pop(task_id, None)
+            self.retention.release_task(task_id)
@@ -0,0 +1,222 @@
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import Column, Float, String, Table, delete, select, text
+from sqlalchemy.engine import Connection, make_url
+
+from schemas.browser_task import BrowserTask
+
+from ..retention import RetentionManager
+from .sql import SQLTaskStore, metadata, normalize_database_url, tasks_table
+
+# Postgres 通知频道，负载为任务ID
+NOTIFY_CHANNEL = "operatornext_task_events"
+
+# 各 worker 的心跳，用于判断任务的执行者是否仍在运行
+workers_table = Table(
+    "browser_task_workers",
+    metadata,
+    Column("worker_id", String(64), primary_key=True),
+    Column("heartbeat_at", Float, nullable=False),
+)
+
+
+class SharedSQLTaskStore(SQLTaskStore):
+    """多 worker 共享的任务存储
+
+    本进程创建的任务仍按 SQLTaskStore 的方式缓存在内存中并异步落盘；
+    其他 worker 创建的任务从数据库读取且不进入本地缓存，任务行和结果只在
+    remote_cache_ttl 秒内复用（收到写入通知时立即失效），频繁的状态查询不会每次都访问数据库，
+    `uvicorn --workers N` 下任何 worker 看到的任务状态最多滞后 remote_cache_ttl 秒。
+    Postgres 上每次落盘后通过 NOTIFY 通知其他 worker，SQLite 由订阅方轮询。
+    每个 worker 在落盘线程中定期写入心跳，任务统计中记录执行它的 worker，
+    心跳超过 heartbeat_timeout 未更新的 worker 的任务可以被其他 worker 接管。
+    """
+    shared = True
+
+    def __init__(self, url: str, flush_interval: float = 0.5, flush_batch_size: int = 100,
+                 retention: RetentionManager | None = None, heartbeat_timeout: float = 60.0,
+                 remote_cache_ttl: float = 1.0):
+        self.worker_id = uuid.uuid4().hex
+        self.heartbeat_timeout = heartbeat_timeout
+        self.remote_cache_ttl = remote_cache_ttl
+        # 其他 worker 的任务: 任务ID -> (过期时间, 数据)
+        self._remote_rows: dict[str, tuple[float, Any]] = {}
+        self._remote_results: dict[str, tuple[float, dict | None]] = {}
+        self._heartbeat_at = 0.0
+        super().__init__(url, flush_interval, flush_batch_size, retention)
+        self.url = normalize_database_url(url)
+        self._is_postgres = self.engine.dialect.name == "postgresql"
+        self._listener: threading.Thread | None = None
+
+    # 任务
+    def add_task(self, task: BrowserTask, metadata: dict, stats: dict) -> None:
+        stats["worker_id"] = self.worker_id
+        super().add_task(task, metadata, stats)
+
+    def _is_local(self, task_id: str) -> bool:
+        """任务是否由本进程缓存（本进程创建且尚未移出缓存）"""
+        return task_id in self._tasks
+
+    def get_task(self, task_id: str) -> BrowserTask | None:
+        if self._is_local(task_id):
+            return super().get_task(task_id)
+        row = self._remote_task_row(task_id)
+        return BrowserTask(**row.task) if row is not None else None
+
+    # 步骤
+    def get_steps(self, task_id: str) -> list[dict]:
+        if self._is_local(task_id):
+            return super().get_steps(task_id)
+        return self._fetch_steps(task_id)
+
+    # 结果
+    def get_result(self, task_id: str) -> dict | None:
+        if self._is_local(task_id):
+            return super().get_result(task_id)
+        return self._remote_cached(self._remote_results, task_id, self._fetch_result)
+
+    # 错误
+    def get_errors(self, task_id: str) -> list[dict]:
+        if self._is_local(task_id):
+            return super().get_errors(task_id)
+        return self._fetch_errors(task_id)
+
+    # 元数据和统计
+    def get_metadata(self, task_id: str) -> dict:
+        if self._is_local(task_id):
+            return super().get_metadata(task_id)
+        row = self._remote_task_row(task_id)
+        return (row.task_metadata or {}) if row is not None else {}
+
+    def get_stats(self, task_id: str) -> dict:
+        if self._is_local(task_id):
+            return super().get_stats(task_id)
+        row = self._remote_task_row(task_id)
+        return (row.stats or {}) if row is not None else {}
+
+    # 断点
+    def get_checkpoint(self, task_id: str) -> dict | None:
+        if self._is_local(task_id):
+            return super().get_checkpoint(task_id)
+        return self._fetch_checkpoint(task_id)
+
+    # 任务接管
+    def owned_elsewhere(self, task_id: str) -> bool:
+        if self._is_local(task_id):
+            return False
+        row = self._remote_task_row(task_id)
+        owner = (row.stats or {}).get("worker_id") if row is not None else None
+        if not owner or owner == self.worker_id:
+            return False
+        with self.engine.connect() as conn:
+            heartbeat_at = conn.execute(
+                select(workers_table.c.heartbeat_at).where(workers_table.c.worker_id == owner)
+            ).scalar()
+        return heartbeat_at is not None and time.time() - heartbeat_at < self.heartbeat_timeout
+
+    def claim_task(self, task_id: str) -> BrowserTask | None:
+        """以 updated_at 做乐观锁接管其他 worker 的任务，多个 worker 同时接管时只有一个成功"""
+        if self._is_local(task_id):
+            return super().get_task(task_id)
+        row = self._fetch_task_row(task_id)
+        if row is None:
+            return None
+        task_data = dict(row.task)
+        task_data["updated_at"] = datetime.now().isoformat()
+        stats = {**(row.stats or {}), "worker_id": self.worker_id}
+        with self.engine.begin() as conn:
+            claimed = conn.execute(
+                tasks_table.update()
+                .where(tasks_table.c.task_id == task_id, tasks_table.c.updated_at == row.updated_at)
+                .values(updated_at=task_data["updated_at"], task=task_data, stats=stats)
+            ).rowcount
+        self._invalidate(task_id)
+        if not claimed:
+            return None
+        # 接管后任务进入本地缓存，之后的写入按本地任务的方式落盘
+        return self._load_task(task_id)
+
+    # 远程任务缓存
+    def _remote_task_row(self, task_id: str):
+        """读取其他 worker 的任务行，remote_cache_ttl 内复用"""
+        return self._remote_cached(self._remote_rows, task_id, self._fetch_task_row)
+
+    def _remote_cached(self, cache: dict, task_id: str, fetch: Callable[[str], Any]) -> Any:
+        if self.remote_cache_ttl <= 0:
+            return fetch(task_id)
+        now = time.monotonic()
+        cached = cache.get(task_id)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        value = fetch(task_id)
+        with self._lock:
+            # 顺便清理过期的条目，缓存大小与最近查询的任务数成正比
+            if len(cache) >= 1024:
+                for key in [key for key, (expires_at, _) in cache.items() if expires_at <= now]:
+                    del cache[key]
+            cache[task_id] = (now + self.remote_cache_ttl, value)
+        return value
+
+    def _invalidate(self, task_id: str) -> None:
+        """任务被写入或接管后丢弃缓存的远程数据"""
+        self._remote_rows.pop(task_id, None)
+        self._remote_results.pop(task_id, None)
+
+    # 跨 worker 通知
+    def _after_write(self, conn: Connection, task_ids: set[str]) -> None:
+        """Postgres 上在落盘事务中发送通知，事务提交后才会送达"""
+        if not self._is_postgres or not task_ids:
+            return
+        conn.execute(
+            text("SELECT pg_notify(:channel, :task_id)"),
+            [{"channel": NOTIFY_CHANNEL, "task_id": task_id} for task_id in task_ids]
+        )
+
+    def subscribe_changes(self, callback: Callable[[str], None]) -> bool:
+        """在后台线程中监听其他 worker 的写入通知，仅 Postgres 支持"""
+        if not self._is_postgres or self._listener is not None:
+            return self._listener is not None
+        self._listener = threading.Thread(
+            target=self._listen, args=(callback,), name="task-store-listener", daemon=True
+        )
+        self._listener.start()
+        return True
+
+    def _listen(self, callback: Callable[[str], None]) -> None:
+        """LISTEN 循环，连接断开后重连"""
+        import psycopg
+
+        conninfo = make_url(self.url).set(drivername="postgresql").render_as_string(hide_password=False)
+        while not self._stopped.is_set():
+            try:
+                with psycopg.connect(conninfo, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    while not self._stopped.is_set():
+                        for notify in conn.notifies(timeout=1.0):
+                            self._invalidate(notify.payload)
+                            callback(notify.payload)
+            except Exception as e:
+                print(f"Warning - 任务存储通知监听中断: {str(e)}")
+                self._stopped.wait(1.0)
+
+    # 心跳
+    def flush(self) -> None:
+        super().flush()
+        now = time.time()
+        if now - self._heartbeat_at >= self.heartbeat_timeout / 4:
+            with self.engine.begin() as conn:
+                self._upsert(conn, workers_table, [{"worker_id": self.worker_id, "heartbeat_at": now}], "worker_id")
+            self._heartbeat_at = now
+
+    def close(self) -> None:
+        super().close()
+        with self.engine.begin() as conn:
+            conn.execute(delete(workers_table).where(workers_table.c.worker_id == self.worker_id))
+        if self._listener is not None:
+            self._listener.join(timeout=2)
+            self._listener = None
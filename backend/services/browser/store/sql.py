@@ -0,0 +1,502 @@
+import copy
+import threading
+import traceback
+from pathlib import Path
+
+from sqlalchemy import (
+    JSON,
+    Column,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+    event,
+    func,
+    select,
+)
+from sqlalchemy.engine import Connection, Engine, make_url
+
+from schemas.browser_task import BrowserTask
+
+from ..retention import RetentionManager
+from .memory import MemoryTaskStore
+
+metadata = MetaData()
+
+tasks_table = Table(
+    "browser_tasks",
+    metadata,
+    Column("task_id", String(64), primary_key=True),
+    Column("status", String(16), nullable=False, index=True),
+    Column("task_description", Text, nullable=False),
+    Column("created_at", String(64)),
+    Column("updated_at", String(64)),
+    Column("task", JSON, nullable=False),
+    Column("task_metadata", JSON),
+    Column("stats", JSON),
+)
+
+steps_table = Table(
+    "browser_task_steps",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("task_id", String(64), nullable=False),
+    Column("sequence", Integer),
+    Column("payload", JSON, nullable=False),
+    Index("ix_browser_task_steps_task_id_sequence", "task_id", "sequence"),
+)
+
+results_table = Table(
+    "browser_task_results",
+    metadata,
+    Column("task_id", String(64), primary_key=True),
+    Column("payload", JSON, nullable=False),
+)
+
+errors_table = Table(
+    "browser_task_errors",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("task_id", String(64), nullable=False, index=True),
+    Column("payload", JSON, nullable=False),
+)
+
+
+checkpoints_table = Table(
+    "browser_task_checkpoints",
+    metadata,
+    Column("task_id", String(64), primary_key=True),
+    Column("payload", JSON, nullable=False),
+)
+
+
+def normalize_database_url(url: str) -> str:
+    """规范化数据库 URL
+
+    存储层使用同步引擎，将 docker-compose 中的 asyncpg URL 转换为 psycopg 驱动。
+    """
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    if url.startswith("postgresql+asyncpg://"):
+        url = "postgresql+psycopg://" + url[len("postgresql+asyncpg://"):]
+    elif url.startswith("postgresql://"):
+        url = "postgresql+psycopg://" + url[len("postgresql://"):]
+    return url
+
+
+def create_store_engine(url: str) -> Engine:
+    """创建数据库引擎，SQLite 启用 WAL 模式"""
+    url = normalize_database_url(url)
+    parsed = make_url(url)
+
+    if parsed.get_backend_name() == "sqlite":
+        if parsed.database and parsed.database != ":memory:":
+            Path(parsed.database).parent.mkdir(parents=True, exist_ok=True)
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+
+        @event.listens_for(engine, "connect")
+        def _set_sqlite_pragma(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.close()
+
+        return engine
+
+    return create_engine(url, pool_pre_ping=True)
+
+
+class SQLTaskStore(MemoryTaskStore):
+    """基于 SQL 数据库的任务存储（本地 SQLite，生产环境 Postgres）
+
+    内存字典作为热数据缓存，写操作先进入缓冲区，
+    由后台线程批量写入数据库（write-behind），不占用步骤回调的执行路径。
+    缓存未命中时按主键/索引从数据库加载，被淘汰的步骤也会按需重新加载。
+    读操作可能同步访问数据库，事件循环中的调用方需通过 asyncio.to_thread 调用。
+    """
+    blocking_reads = True
+
+    def __init__(self, url: str, flush_interval: float = 0.5, flush_batch_size: int = 100,
+                 retention: RetentionManager | None = None):
+        super().__init__(retention)
+        self.engine = create_store_engine(url)
+        metadata.create_all(self.engine)
+
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+
+        # 写缓冲区
+        self._dirty_tasks: set[str] = set()
+        self._pending_steps: list[dict] = []
+        self._pending_errors: list[dict] = []
+        self._pending_results: dict[str, dict] = {}
+        self._pending_checkpoints: dict[str, dict] = {}
+        self._cleared_checkpoints: set[str] = set()
+        self._flush_lock = threading.Lock()
+
+        # 后台落盘线程
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name="task-store-flusher", daemon=True
+        )
+        self._flusher.start()
+
+    # 任务
+    def add_task(self, task: BrowserTask, metadata: dict, stats: dict) -> None:
+        super().add_task(task, metadata, stats)
+        with self._lock:
+            self._dirty_tasks.add(task.task_id)
+        # 新任务立即落盘，保证其他进程或重启后可见
+        self._wakeup.set()
+
+    def get_task(self, task_id: str) -> BrowserTask | None:
+        task = super().get_task(task_id)
+        if task is None:
+            task = self._load_task(task_id)
+        return task
+
+    def save_task(self, task: BrowserTask) -> None:
+        super().save_task(task)
+        with self._lock:
+            self._dirty_tasks.add(task.task_id)
+            if task.status == "completed":
+                self._pending_checkpoints.pop(task.task_id, None)
+                self._cleared_checkpoints.add(task.task_id)
+
+    # 步骤
+    def append_step(self, task_id: str, message: dict) -> None:
+        self._ensure_steps_loaded(task_id)
+        super().append_step(task_id, message)
+        with self._lock:
+            self._pending_steps.append({
+                "task_id": task_id,
+                "sequence": message.get("sequence"),
+                "payload": message
+            })
+            if len(self._pending_steps) >= self.flush_batch_size:
+                self._wakeup.set()
+
+    def get_steps(self, task_id: str) -> list[dict]:
+        self._ensure_steps_loaded(task_id)
+        return super().get_steps(task_id)
+
+    def get_steps_after(self, task_id: str, after_sequence: int) -> list[dict]:
+        if task_id in self._steps:
+            return super().get_steps_after(task_id, after_sequence)
+        # 未缓存时只按索引读取缺失的部分，不加载整个任务的步骤
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(steps_table.c.payload)
+                .where(steps_table.c.task_id == task_id, steps_table.c.sequence > after_sequence)
+                .order_by(steps_table.c.sequence)
+            ).all()
+        return [row.payload for row in rows]
+
+    def get_step_count(self, task_id: str) -> int:
+        if task_id in self._steps:
+            return super().get_step_count(task_id)
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(func.count()).select_from(steps_table).where(steps_table.c.task_id == task_id)
+            ).scalar_one()
+
+    # 结果
+    def set_result(self, task_id: str, message: dict) -> None:
+        super().set_result(task_id, message)
+        with self._lock:
+            self._pending_results[task_id] = message
+        self._wakeup.set()
+
+    def get_result(self, task_id: str) -> dict | None:
+        result = super().get_result(task_id)
+        if result is not None:
+            return result
+        result = self._fetch_result(task_id)
+        if result is None:
+            return None
+        with self._lock:
+            self._results.setdefault(task_id, result)
+        return result
+
+    # 错误
+    def append_error(self, task_id: str, error: dict) -> None:
+        self._ensure_errors_loaded(task_id)
+        super().append_error(task_id, error)
+        with self._lock:
+            self._pending_errors.append({"task_id": task_id, "payload": error})
+
+    def get_errors(self, task_id: str) -> list[dict]:
+        self._ensure_errors_loaded(task_id)
+        return super().get_errors(task_id)
+
+    # 元数据和统计
+    def get_metadata(self, task_id: str) -> dict:
+        if task_id not in self._metadata:
+            self._load_task(task_id)
+        return super().get_metadata(task_id)
+
+    def get_stats(self, task_id: str) -> dict:
+        if task_id not in self._stats:
+            self._load_task(task_id)
+        return super().get_stats(task_id)
+
+    def update_stats(self, task_id: str, **fields) -> None:
+        super().update_stats(task_id, **fields)
+        with self._lock:
+            self._dirty_tasks.add(task_id)
+
+    # 断点
+    def save_checkpoint(self, task_id: str, checkpoint: dict) -> None:
+        super().save_checkpoint(task_id, checkpoint)
+        with self._lock:
+            self._pending_checkpoints[task_id] = checkpoint
+            self._cleared_checkpoints.discard(task_id)
+
+    def get_checkpoint(self, task_id: str) -> dict | None:
+        checkpoint = super().get_checkpoint(task_id)
+        if checkpoint is not None:
+            return checkpoint
+        return self._fetch_checkpoint(task_id)
+
+    def find_unfinished_tasks(self) -> list[str]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(tasks_table.c.task_id).where(tasks_table.c.status.in_(("queued", "running")))
+            ).all()
+        task_ids = {row.task_id for row in rows}
+        # 尚未落盘的状态以缓存为准
+        for task_id in list(task_ids):
+            task = self._tasks.get(task_id)
+            if task is not None and task.status not in ("queued", "running"):
+                task_ids.discard(task_id)
+        return sorted(task_ids | set(super().find_unfinished_tasks()))
+
+    # 生命周期
+    def flush(self) -> None:
+        with self._flush_lock:
+            self._flush_once()
+
+    def close(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+        self._flusher.join(timeout=5)
+        self.flush()
+        self.engine.dispose()
+
+    # 缓存淘汰
+    def _can_evict(self, task_id: str) -> bool:
+        """只淘汰已全部落盘的步骤"""
+        if not super()._can_evict(task_id):
+            return False
+        with self._lock:
+            return not any(step["task_id"] == task_id for step in self._pending_steps)
+
+    def _can_expire(self, task_id: str) -> bool:
+        """只移出已全部落盘的任务"""
+        if not self._can_evict(task_id):
+            return False
+        with self._lock:
+            return (
+                task_id not in self._dirty_tasks
+                and task_id not in self._pending_results
+                and task_id not in self._pending_checkpoints
+                and not any(error["task_id"] == task_id for error in self._pending_errors)
+            )
+
+    # 内部实现
+    def _flush_loop(self) -> None:
+        """后台线程：按固定间隔或缓冲区满时批量落盘"""
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Warning - 任务存储落盘失败: {str(e)}")
+                print(traceback.format_exc())
+
+    def _flush_once(self) -> None:
+        """将当前缓冲区中的写操作在一个事务中写入数据库"""
+        with self._lock:
+            dirty_tasks, self._dirty_tasks = self._dirty_tasks, set()
+            steps, self._pending_steps = self._pending_steps, []
+            errors, self._pending_errors = self._pending_errors, []
+            results, self._pending_results = self._pending_results, {}
+            checkpoints, self._pending_checkpoints = self._pending_checkpoints, {}
+            cleared, self._cleared_checkpoints = self._cleared_checkpoints, set()
+
+        if not (dirty_tasks or steps or errors or results or checkpoints or cleared):
+            return
+
+        task_rows = []
+        for task_id in dirty_tasks:
+            row = self._snapshot_task_row(task_id)
+            if row is not None:
+                task_rows.append(row)
+
+        try:
+            with self.engine.begin() as conn:
+                self._upsert(conn, tasks_table, task_rows, "task_id")
+                if steps:
+                    conn.execute(steps_table.insert(), steps)
+                if errors:
+                    conn.execute(errors_table.insert(), errors)
+                self._upsert(
+                    conn,
+                    results_table,
+                    [{"task_id": task_id, "payload": payload} for task_id, payload in results.items()],
+                    "task_id"
+                )
+                self._upsert(
+                    conn,
+                    checkpoints_table,
+                    [{"task_id": task_id, "payload": payload} for task_id, payload in checkpoints.items()],
+                    "task_id"
+                )
+                if cleared:
+                    conn.execute(checkpoints_table.delete().where(checkpoints_table.c.task_id.in_(cleared)))
+                self._after_write(conn, {row["task_id"] for row in task_rows}
+                                  | {step["task_id"] for step in steps} | set(results))
+        except Exception:
+            # 写入失败时放回缓冲区，等待下一轮重试
+            with self._lock:
+                self._dirty_tasks.update(row["task_id"] for row in task_rows)
+                self._pending_steps[:0] = steps
+                self._pending_errors[:0] = errors
+                for task_id, payload in results.items():
+                    self._pending_results.setdefault(task_id, payload)
+                for task_id, payload in checkpoints.items():
+                    self._pending_checkpoints.setdefault(task_id, payload)
+                self._cleared_checkpoints.update(cleared - set(self._pending_checkpoints))
+            raise
+
+    def _after_write(self, conn: Connection, task_ids: set[str]) -> None:
+        """落盘事务提交前的钩子，task_ids 为本次写入涉及的任务"""
+
+    def _snapshot_task_row(self, task_id: str) -> dict | None:
+        """生成任务行的快照"""
+        task = self._tasks.get(task_id)
+        if task is None:
+            return None
+        # 统计数据和元数据只通过 store 接口在锁内修改
+        with self._lock:
+            stats = copy.deepcopy(self._stats.get(task_id, {}))
+            task_metadata = copy.deepcopy(self._metadata.get(task_id, {}))
+        task_data = task.model_dump(mode="json", exclude={"queue_position"})
+        return {
+            "task_id": task_id,
+            "status": task.status,
+            "task_description": task.task_description,
+            "created_at": task_data["created_at"],
+            "updated_at": task_data["updated_at"],
+            "task": task_data,
+            "task_metadata": task_metadata,
+            "stats": stats,
+        }
+
+    def _upsert(self, conn: Connection, table: Table, rows: list[dict], key: str) -> None:
+        """按主键插入或更新"""
+        if not rows:
+            return
+        dialect = conn.dialect.name
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            for row in rows:
+                updated = conn.execute(
+                    table.update().where(table.c[key] == row[key]).values(**row)
+                ).rowcount
+                if not updated:
+                    conn.execute(table.insert().values(**row))
+            return
+
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c[key]],
+            set_={column.name: stmt.excluded[column.name] for column in table.columns if column.name != key}
+        )
+        conn.execute(stmt, rows)
+
+    def _fetch_task_row(self, task_id: str):
+        """从数据库读取任务行"""
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(tasks_table).where(tasks_table.c.task_id == task_id)
+            ).first()
+
+    def _fetch_result(self, task_id: str) -> dict | None:
+        """从数据库读取任务结果"""
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(results_table.c.payload).where(results_table.c.task_id == task_id)
+            ).first()
+        return row.payload if row is not None else None
+
+    def _fetch_checkpoint(self, task_id: str) -> dict | None:
+        """从数据库读取任务断点"""
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(checkpoints_table.c.payload).where(checkpoints_table.c.task_id == task_id)
+            ).first()
+        return row.payload if row is not None else None
+
+    def _fetch_steps(self, task_id: str) -> list[dict]:
+        """从数据库读取任务的全部步骤"""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(steps_table.c.payload)
+                .where(steps_table.c.task_id == task_id)
+                .order_by(steps_table.c.id)
+            ).all()
+        return [row.payload for row in rows]
+
+    def _fetch_errors(self, task_id: str) -> list[dict]:
+        """从数据库读取任务的错误记录"""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(errors_table.c.payload)
+                .where(errors_table.c.task_id == task_id)
+                .order_by(errors_table.c.id)
+            ).all()
+        return [row.payload for row in rows]
+
+    def _load_task(self, task_id: str) -> BrowserTask | None:
+        """从数据库加载任务到缓存"""
+        row = self._fetch_task_row(task_id)
+        if row is None:
+            return None
+
+        task = BrowserTask(**row.task)
+        with self._lock:
+            if task_id in self._tasks:
+                return self._tasks[task_id]
+            self._tasks[task_id] = task
+            self._metadata[task_id] = row.task_metadata or {}
+            self._stats[task_id] = row.stats or {}
+        return task
+
+    def _ensure_steps_loaded(self, task_id: str) -> None:
+        """按需从数据库加载步骤"""
+        if task_id in self._steps:
+            return
+        steps = self._fetch_steps(task_id)
+        with self._lock:
+            if task_id in self._steps:
+                return
+            self._steps[task_id] = steps
+        if self.retention and steps:
+            self.retention.record_loaded(task_id, steps)
+
+    def _ensure_errors_loaded(self, task_id: str) -> None:
+        """按需从数据库加载错误记录"""
+        if task_id in self._errors:
+            return
+        errors = self._fetch_errors(task_id)
+        with self._lock:
+            self._errors.setdefault(task_id, errors)
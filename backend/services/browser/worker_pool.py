@@ -0,0 +1,289 @@
+import asyncio
+import contextlib
+import multiprocessing
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from core.serialization import ws_message_dict
+from schemas.browser_task import BrowserTask
+
+from .agent_worker import (
+    COMMAND_CANCEL,
+    COMMAND_RUN,
+    EVENT_APPEND_ERROR,
+    EVENT_APPEND_STEP,
+    EVENT_DONE,
+    EVENT_POOL_STATS,
+    EVENT_PUBLISH,
+    EVENT_READY,
+    EVENT_SAVE_CHECKPOINT,
+    EVENT_SAVE_TASK,
+    EVENT_SET_RESULT,
+    EVENT_UPDATE_STATS,
+    run_worker,
+)
+from .broadcaster import TaskBroadcaster
+from .error_handler import ErrorHandler
+from .store import TaskStore
+
+
+class WorkerCrashedError(Exception):
+    """执行任务的 Agent worker 进程异常退出"""
+    def __init__(self, index: int, exitcode: int | None):
+        self.index = index
+        self.exitcode = exitcode
+        super().__init__(f"Agent worker {index} 进程异常退出 (exitcode: {exitcode})")
+
+
+@dataclass(eq=False)
+class _WorkerSlot:
+    """一个 worker 进程及其执行中的任务"""
+    index: int
+    process: multiprocessing.Process
+    inbox: multiprocessing.Queue
+    tasks: set[str] = field(default_factory=set)
+    ready: bool = False
+    # worker 最近一次上报的浏览器连接池统计
+    browser_pool: dict = field(default_factory=dict)
+
+
+@dataclass(eq=False)
+class _RemoteRun:
+    """API 进程中一个分派出去的任务"""
+    task: BrowserTask
+    slot: _WorkerSlot
+    future: asyncio.Future
+    last_sequence: int = 0
+
+
+class AgentWorkerPool:
+    """Agent worker 进程池
+
+    每个任务分派给当前任务最少的 worker 进程执行，worker 通过共享的事件队列把存储写入和
+    广播消息发回 API 进程，由后台线程读取后在事件循环中写入任务存储并推送给订阅者，
+    订阅、补发和持久化流程与进程内执行完全相同。
+    worker 进程异常退出时，其执行中的任务以错误结束，进程自动重启。
+    """
+    def __init__(self, store: TaskStore, broadcaster: TaskBroadcaster, processes: int,
+                 max_workers: int, crash_grace: float = 1.0, monitor_interval: float = 1.0):
+        self.store = store
+        self.broadcaster = broadcaster
+        self.processes = max(1, processes)
+        self.max_workers = max_workers
+        self.crash_grace = crash_grace
+        self.monitor_interval = monitor_interval
+        # spawn 启动，不继承 API 进程的事件循环、线程和连接
+        self._context = multiprocessing.get_context("spawn")
+        self._outbox: multiprocessing.Queue | None = None
+        self._slots: list[_WorkerSlot] = []
+        self._runs: dict[str, _RemoteRun] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._reader: threading.Thread | None = None
+        self._monitor: asyncio.Task | None = None
+        self._closed = False
+        self._restarts = 0
+
+    @property
+    def running_count(self) -> int:
+        """分派到 worker 进程中执行的任务数"""
+        return len(self._runs)
+
+    def start(self) -> None:
+        """启动 worker 进程和事件读取线程"""
+        if self._outbox is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._closed = False
+        self._outbox = self._context.Queue()
+        self._slots = [self._spawn(index) for index in range(self.processes)]
+        self._reader = threading.Thread(target=self._read_events, name="agent-worker-reader", daemon=True)
+        self._reader.start()
+        self._monitor = asyncio.create_task(self._watch())
+
+    def _spawn(self, index: int) -> _WorkerSlot:
+        """启动一个 worker 进程"""
+        inbox = self._context.Queue()
+        # 截图流水线可能使用进程池，worker 不能是守护进程
+        process = self._context.Process(
+            target=run_worker,
+            args=(index, self.processes, self.max_workers, inbox, self._outbox),
+            name=f"agent-worker-{index}",
+            daemon=False
+        )
+        process.start()
+        return _WorkerSlot(index=index, process=process, inbox=inbox)
+
+    async def run(self, task: BrowserTask, resume: dict | None = None) -> None:
+        """在 worker 进程中执行任务，直到任务结束；取消时通知 worker 取消执行"""
+        if self._outbox is None or self._closed:
+            raise RuntimeError("Agent worker 进程池未启动")
+        slot = min(self._slots, key=lambda slot: len(slot.tasks))
+        run = _RemoteRun(task=task, slot=slot, future=self._loop.create_future())
+        self._runs[task.task_id] = run
+        slot.tasks.add(task.task_id)
+        slot.inbox.put((
+            COMMAND_RUN, task,
+            self.store.get_metadata(task.task_id),
+            dict(self.store.get_stats(task.task_id)),
+            resume
+        ))
+        try:
+            await asyncio.shield(run.future)
+        except asyncio.CancelledError:
+            if not run.future.done() and slot.process.is_alive():
+                slot.inbox.put((COMMAND_CANCEL, task.task_id))
+            raise
+        finally:
+            self._finish(task.task_id)
+
+    def _finish(self, task_id: str) -> None:
+        run = self._runs.pop(task_id, None)
+        if run is not None:
+            run.slot.tasks.discard(task_id)
+            if not run.future.done():
+                run.future.cancel()
+
+    def _read_events(self) -> None:
+        """后台线程：读取 worker 事件并交给事件循环处理"""
+        while True:
+            try:
+                event = self._outbox.get()
+            except (EOFError, OSError):
+                return
+            if event is None:
+                return
+            self._loop.call_soon_threadsafe(self._dispatch, event)
+
+    def _dispatch(self, event: tuple) -> None:
+        """在事件循环中应用 worker 发回的事件"""
+        kind, task_id, payload = event
+        if kind == EVENT_READY:
+            for slot in self._slots:
+                if slot.index == payload:
+                    slot.ready = True
+            return
+        if kind == EVENT_POOL_STATS:
+            index, stats = payload
+            for slot in self._slots:
+                if slot.index == index:
+                    slot.browser_pool = stats
+            return
+        try:
+            if kind == EVENT_PUBLISH:
+                message, attachments = payload
+                run = self._runs.get(task_id)
+                # 已取消的任务的消息流已关闭，只写入存储
+                if run is not None:
+                    run.last_sequence = max(run.last_sequence, message.get("sequence") or 0)
+                    self.broadcaster.publish(task_id, message, attachments)
+            elif kind == EVENT_APPEND_STEP:
+                self.store.append_step(task_id, payload)
+            elif kind == EVENT_SET_RESULT:
+                self.store.set_result(task_id, payload)
+            elif kind == EVENT_APPEND_ERROR:
+                self.store.append_error(task_id, payload)
+            elif kind == EVENT_UPDATE_STATS:
+                self.store.update_stats(task_id, **payload)
+            elif kind == EVENT_SAVE_CHECKPOINT:
+                self.store.save_checkpoint(task_id, payload)
+            elif kind == EVENT_SAVE_TASK:
+                self._save_task(task_id, payload)
+            elif kind == EVENT_DONE:
+                self.store.update_stats(task_id, **payload)
+                run = self._runs.get(task_id)
+                if run is not None and not run.future.done():
+                    run.future.set_result(None)
+        except Exception as e:
+            print(f"Warning - 处理 Agent worker 事件出错 ({kind}, {task_id}): {str(e)}")
+
+    def _save_task(self, task_id: str, fields: dict) -> None:
+        """将 worker 中的任务状态变更同步到 API 进程的任务对象"""
+        run = self._runs.get(task_id)
+        task = run.task if run is not None else self.store.get_task(task_id)
+        if task is None:
+            return
+        for name, value in fields.items():
+            setattr(task, name, value)
+        self.store.save_task(task)
+
+    async def _watch(self) -> None:
+        """检查 worker 进程存活，异常退出的进程自动重启"""
+        while not self._closed:
+            await asyncio.sleep(self.monitor_interval)
+            for position, slot in enumerate(self._slots):
+                if self._closed or slot.process.is_alive():
+                    continue
+                print(f"Warning - Agent worker {slot.index} 异常退出 (exitcode: {slot.process.exitcode})，重启中")
+                error = WorkerCrashedError(slot.index, slot.process.exitcode)
+                # 等待已发出的事件处理完，再将仍未结束的任务标记为失败
+                self._loop.call_later(self.crash_grace, self._fail_orphans, set(slot.tasks), error)
+                self._slots[position] = self._spawn(slot.index)
+                self._restarts += 1
+
+    def _fail_orphans(self, task_ids: set[str], error: WorkerCrashedError) -> None:
+        """worker 异常退出后，以错误结束其执行中的任务"""
+        for task_id in task_ids:
+            run = self._runs.get(task_id)
+            if run is None or run.future.done():
+                continue
+            task = run.task
+            error_message = ErrorHandler(self.store).handle_error(task_id, error)
+            current_time = datetime.now().isoformat()
+            error_dict = ws_message_dict(
+                "error",
+                error_message.model_dump(),
+                session_id=task_id,
+                sequence=run.last_sequence + 1,
+                timestamp=current_time
+            )
+            self.store.set_result(task_id, error_dict)
+            self.broadcaster.publish(task_id, error_dict)
+            task.status = "failed"
+            task.result = {"error": str(error)}
+            task.updated_at = current_time
+            self.store.save_task(task)
+            run.future.set_result(None)
+
+    async def close(self) -> None:
+        """通知所有 worker 退出，超时未退出的进程强制结束"""
+        if self._outbox is None:
+            return
+        self._closed = True
+        if self._monitor is not None:
+            self._monitor.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._monitor
+            self._monitor = None
+        for slot in self._slots:
+            if slot.process.is_alive():
+                slot.inbox.put(None)
+        for slot in self._slots:
+            await asyncio.to_thread(slot.process.join, 10)
+            if slot.process.is_alive():
+                slot.process.terminate()
+                await asyncio.to_thread(slot.process.join, 2)
+        self._outbox.put(None)
+        if self._reader is not None:
+            await asyncio.to_thread(self._reader.join, 2)
+            self._reader = None
+        self._outbox = None
+
+    def get_browser_pool_stats(self) -> dict:
+        """汇总各 worker 进程上报的浏览器连接池统计"""
+        totals: dict = {}
+        for slot in self._slots:
+            for key, value in slot.browser_pool.items():
+                if isinstance(value, int | float):
+                    totals[key] = totals.get(key, 0) + value
+        return {**totals, "workers": {slot.index: slot.browser_pool for slot in self._slots}}
+
+    def get_stats(self) -> dict:
+        """进程池统计"""
+        return {
+            "processes": self.processes,
+            "alive": sum(1 for slot in self._slots if slot.process.is_alive()),
+            "ready": sum(1 for slot in self._slots if slot.ready),
+            "running": {slot.index: len(slot.tasks) for slot in self._slots},
+            "restarts": self._restarts
+        }
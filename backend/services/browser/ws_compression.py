@@ -0,0 +1,104 @@
+"""
+WebSocket 压缩模块
+
+为任务 WebSocket 提供可调的 permessage-deflate（RFC 7692）：
+1. 小于 WS_COMPRESSION_MIN_SIZE 的消息不压缩直接发送（RSV1 不置位，协议允许逐条决定）
+2. 压缩级别、内存级别和窗口大小可配置，默认保留上下文，相邻步骤消息的重复键名和文本可以互相引用
+3. 原始/实际发送字节数、压缩率和压缩耗费的 CPU 时间记录到指标中
+
+ASGI 应用无法控制传输层扩展，需要在启动 uvicorn 时指定协议类（命令行接受导入路径）：
+uvicorn main:app --ws services.browser.ws_compression:CompressedWebSocketProtocol
+main.py 直接运行时已使用。
+"""
+
+import time
+from collections.abc import Sequence
+
+from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol
+from websockets import frames
+from websockets.extensions.permessage_deflate import (
+    PerMessageDeflate,
+    ServerPerMessageDeflateFactory,
+)
+
+from core import telemetry
+
+from .config import (
+    get_ws_compression,
+    get_ws_compression_level,
+    get_ws_compression_mem_level,
+    get_ws_compression_min_size,
+    get_ws_compression_window_bits,
+)
+
+
+class ThresholdPerMessageDeflate(PerMessageDeflate):
+    """只压缩达到大小阈值的消息，并记录压缩指标"""
+    def __init__(self, *args, min_size: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.min_size = min_size
+        self._skip = False
+
+    def encode(self, frame: frames.Frame) -> frames.Frame:
+        if frame.opcode in frames.CTRL_OPCODES:
+            return frame
+        # 分片消息按第一片决定是否压缩，后续分片保持一致
+        if frame.opcode is not frames.OP_CONT:
+            self._skip = len(frame.data) < self.min_size
+        size = len(frame.data)
+        telemetry.WS_FRAME_BYTES.labels("original").inc(size)
+        if self._skip:
+            telemetry.WS_COMPRESSION_FRAMES.labels("skipped").inc()
+            telemetry.WS_FRAME_BYTES.labels("sent").inc(size)
+            return frame
+
+        started = time.thread_time()
+        encoded = super().encode(frame)
+        telemetry.WS_COMPRESSION_CPU.observe(time.thread_time() - started)
+        telemetry.WS_COMPRESSION_FRAMES.labels("compressed").inc()
+        telemetry.WS_FRAME_BYTES.labels("sent").inc(len(encoded.data))
+        if encoded.data:
+            telemetry.WS_COMPRESSION_RATIO.observe(size / len(encoded.data))
+        return encoded
+
+
+class ThresholdPerMessageDeflateFactory(ServerPerMessageDeflateFactory):
+    """协商参数与标准实现相同，协商成功后使用带阈值的扩展"""
+    def __init__(self, min_size: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.min_size = min_size
+
+    def process_request_params(self, params: Sequence, accepted_extensions: Sequence):
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        return response_params, ThresholdPerMessageDeflate(
+            extension.remote_no_context_takeover,
+            extension.local_no_context_takeover,
+            extension.remote_max_window_bits,
+            extension.local_max_window_bits,
+            extension.compress_settings,
+            min_size=self.min_size
+        )
+
+
+def create_deflate_factory() -> ThresholdPerMessageDeflateFactory:
+    """按配置创建 permessage-deflate 扩展工厂"""
+    return ThresholdPerMessageDeflateFactory(
+        min_size=get_ws_compression_min_size(),
+        # 客户端要求更小的窗口时按客户端的值
+        server_max_window_bits=get_ws_compression_window_bits(),
+        compress_settings={
+            "level": get_ws_compression_level(),
+            "memLevel": get_ws_compression_mem_level()
+        }
+    )
+
+
+class CompressedWebSocketProtocol(WebSocketProtocol):
+    """uvicorn 的 websockets 协议实现，使用带阈值的 permessage-deflate"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 握手时才读取可用扩展，替换 uvicorn 默认创建的扩展工厂
+        if self.config.ws_per_message_deflate and get_ws_compression():
+            self.available_extensions = [create_deflate_factory()]
+        else:
+            self.available_extensions = []
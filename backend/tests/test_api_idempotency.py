@@ -0,0 +1,47 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.browser import browser_service, router
+from schemas.browser_task import BrowserTask
+from services.browser.dedup import task_fingerprint
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    # 不进入 lifespan，请求只经过去重路径，不启动浏览器
+    return TestClient(app)
+
+
+@pytest.fixture
+def existing_task():
+    task = BrowserTask(task_id="idempotent-task", task_description="open example.com", status="running")
+    browser_service.store.add_task(task, {}, {})
+    browser_service.deduplicator.remember(
+        task.task_id, task_fingerprint(task.task_description, False), "key-1"
+    )
+    yield task
+    browser_service.deduplicator.forget(task.task_id)
+
+
+def test_same_key_and_content_replays_existing_task(client, existing_task):
+    response = client.post(
+        "/api/tasks",
+        json={"task_description": "open example.com", "full_screenshots": False},
+        headers={"Idempotency-Key": "key-1"},
+    )
+    assert response.status_code == 200
+    assert response.json()["task_id"] == existing_task.task_id
+    assert response.headers["Idempotent-Replayed"] == "true"
+
+
+def test_same_key_with_different_content_is_rejected(client, existing_task):
+    response = client.post(
+        "/api/tasks",
+        json={"task_description": "open another.com", "full_screenshots": False},
+        headers={"Idempotency-Key": "key-1"},
+    )
+    assert response.status_code == 422
+    assert "key-1" in response.json()["detail"]
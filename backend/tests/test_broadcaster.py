@@ -0,0 +1,67 @@
+from schemas.browser_task import BrowserTask
+from services.browser.broadcaster import SubscriberQueue, TaskBroadcaster
+from services.browser.store.memory import MemoryTaskStore
+
+
+def _step(sequence: int) -> dict:
+    return {"type": "step", "sequence": sequence, "data": {"step": sequence}}
+
+
+def test_replay_returns_frames_after_last_sequence():
+    broadcaster = TaskBroadcaster(replay_buffer_size=10)
+    for sequence in range(1, 6):
+        broadcaster.publish("task", _step(sequence))
+
+    assert [frame.sequence for frame in broadcaster.replay("task", 3)] == [4, 5]
+    assert broadcaster.replay("task", 5) == []
+
+
+def test_replay_returns_none_when_buffer_no_longer_covers_range():
+    broadcaster = TaskBroadcaster(replay_buffer_size=3)
+    for sequence in range(1, 7):
+        broadcaster.publish("task", _step(sequence))
+
+    # 缓冲区只剩 4..6，序号 2 之后的消息需要从任务存储补发
+    assert broadcaster.replay("task", 2) is None
+    assert [frame.sequence for frame in broadcaster.replay("task", 3)] == [4, 5, 6]
+
+
+def test_unsequenced_messages_are_not_buffered():
+    broadcaster = TaskBroadcaster(replay_buffer_size=10)
+    broadcaster.publish("task", _step(1))
+    broadcaster.publish("task", {"type": "status", "sequence": None, "data": {}})
+
+    assert [frame.sequence for frame in broadcaster.replay("task", 0)] == [1]
+
+
+def test_close_drops_buffer_and_ends_subscribers():
+    broadcaster = TaskBroadcaster(replay_buffer_size=10)
+    queue = SubscriberQueue()
+    broadcaster.subscribe("task", queue)
+    broadcaster.publish("task", _step(1))
+    broadcaster.close("task")
+
+    assert broadcaster.replay("task", 0) is None
+    assert broadcaster.subscriber_count("task") == 0
+    assert queue.qsize() == 2
+
+
+async def test_publish_shares_one_encoding_between_subscribers():
+    broadcaster = TaskBroadcaster()
+    first, second = SubscriberQueue(), SubscriberQueue()
+    broadcaster.subscribe("task", first)
+    broadcaster.subscribe("task", second)
+    frame = broadcaster.publish("task", _step(1))
+
+    assert await first.get() is frame
+    assert await second.get() is frame
+    assert frame.text is frame.text
+
+
+def test_store_fallback_returns_steps_after_sequence():
+    store = MemoryTaskStore()
+    store.add_task(BrowserTask(task_id="task", task_description="demo"), {}, {})
+    for sequence in range(1, 6):
+        store.append_step("task", _step(sequence))
+
+    assert [step["sequence"] for step in store.get_steps_after("task", 2)] == [3, 4, 5]
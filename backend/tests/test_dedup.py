@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+from services.browser.dedup import (
+    IdempotencyConflictError,
+    SubmissionDeduplicator,
+    task_fingerprint,
+)
+
+
+def test_fingerprint_normalizes_whitespace():
+    assert task_fingerprint("open  example.com\n", False) == task_fingerprint("open example.com", False)
+    assert task_fingerprint("open example.com", False) != task_fingerprint("open example.com", True)
+
+
+def test_idempotency_key_returns_same_task():
+    dedup = SubmissionDeduplicator()
+    fingerprint = task_fingerprint("demo", False)
+    dedup.remember("task-1", fingerprint, "key-1")
+
+    assert dedup.lookup(fingerprint, "key-1") == "task-1"
+    assert dedup.lookup(fingerprint, "key-2") is None
+
+
+def test_idempotency_key_with_different_content_conflicts():
+    dedup = SubmissionDeduplicator()
+    dedup.remember("task-1", task_fingerprint("demo", False), "key-1")
+
+    with pytest.raises(IdempotencyConflictError) as exc_info:
+        dedup.lookup(task_fingerprint("other", False), "key-1")
+    assert exc_info.value.key == "key-1"
+
+
+def test_content_dedup_only_within_window():
+    fingerprint = task_fingerprint("demo", False)
+    disabled = SubmissionDeduplicator(dedup_window=0)
+    disabled.remember("task-1", fingerprint)
+    assert disabled.lookup(fingerprint) is None
+
+    dedup = SubmissionDeduplicator(dedup_window=0.05)
+    dedup.remember("task-1", fingerprint)
+    assert dedup.lookup(fingerprint) == "task-1"
+    time.sleep(0.06)
+    assert dedup.lookup(fingerprint) is None
+
+
+def test_entries_expire_per_kind():
+    fingerprint = task_fingerprint("demo", False)
+    dedup = SubmissionDeduplicator(key_ttl=0.05, dedup_window=10)
+    dedup.remember("task-1", fingerprint, "key-1")
+    time.sleep(0.06)
+
+    # 键已过期，按内容去重的记录仍在窗口内
+    assert dedup.lookup(fingerprint, "key-1") is None
+    assert dedup.lookup(fingerprint) == "task-1"
+
+
+def test_forget_removes_all_entries_of_task():
+    fingerprint = task_fingerprint("demo", False)
+    dedup = SubmissionDeduplicator(dedup_window=10)
+    dedup.remember("task-1", fingerprint, "key-1")
+    dedup.forget("task-1")
+
+    assert dedup.lookup(fingerprint, "key-1") is None
+    assert dedup.lookup(fingerprint) is None
+
+
+def test_max_entries_evicts_oldest():
+    dedup = SubmissionDeduplicator(max_entries=2)
+    for index in range(3):
+        dedup.remember(f"task-{index}", task_fingerprint(str(index), False), f"key-{index}")
+
+    assert dedup.lookup(task_fingerprint("0", False), "key-0") is None
+    assert dedup.lookup(task_fingerprint("2", False), "key-2") == "task-2"
@@ -0,0 +1,69 @@
+import msgpack
+import orjson
+
+from services.browser.broadcaster import Frame
+from services.browser.protocol import (
+    JSON_SUBPROTOCOL,
+    MSGPACK_SUBPROTOCOL,
+    PROTOCOL_JSON,
+    PROTOCOL_MSGPACK,
+    PROTOCOL_SSE,
+    encode_msgpack,
+    encode_sse,
+    negotiate_subprotocol,
+)
+
+MESSAGE = {
+    "type": "step",
+    "sequence": 7,
+    "session_id": "task",
+    "data": {"step": 3, "goal": "打开页面", "actions": [{"click": {"index": 1}}]},
+    "metadata": {},
+}
+
+
+def test_negotiates_first_supported_subprotocol():
+    assert negotiate_subprotocol(["unknown", MSGPACK_SUBPROTOCOL, JSON_SUBPROTOCOL]) == (
+        MSGPACK_SUBPROTOCOL, PROTOCOL_MSGPACK
+    )
+    assert negotiate_subprotocol([JSON_SUBPROTOCOL]) == (JSON_SUBPROTOCOL, PROTOCOL_JSON)
+    assert negotiate_subprotocol([]) == (None, PROTOCOL_JSON)
+
+
+def test_msgpack_round_trip_inlines_attachments_as_binary():
+    thumbnail = b"\x89PNG\r\n\x1a\n\x00\x01"
+    decoded = msgpack.unpackb(encode_msgpack(MESSAGE, {"thumbnail": thumbnail}), raw=False)
+
+    assert decoded["data"]["thumbnail"] == thumbnail
+    assert {**decoded, "data": {k: v for k, v in decoded["data"].items() if k != "thumbnail"}} == MESSAGE
+    # 原消息不被修改
+    assert "thumbnail" not in MESSAGE["data"]
+
+
+def test_frame_encodings_round_trip():
+    frame = Frame(MESSAGE, {"thumbnail": b"img"})
+
+    assert orjson.loads(frame.encode(PROTOCOL_JSON)) == MESSAGE
+    assert msgpack.unpackb(frame.encode(PROTOCOL_MSGPACK), raw=False)["data"]["thumbnail"] == b"img"
+    # 每种编码只序列化一次
+    assert frame.encode(PROTOCOL_MSGPACK) is frame.encode(PROTOCOL_MSGPACK)
+
+
+def test_frame_without_attachments_reuses_text_encoding():
+    frame = Frame(MESSAGE, {"thumbnail": b"img"})
+    text = frame.text
+    stripped = frame.without_attachments()
+
+    assert stripped.text is text
+    assert "thumbnail" not in msgpack.unpackb(stripped.encode(PROTOCOL_MSGPACK), raw=False)["data"]
+
+
+def test_sse_event_round_trip():
+    event = encode_sse(MESSAGE).decode()
+    lines = event.rstrip("\n").split("\n")
+
+    assert event.endswith("\n\n")
+    assert lines[0] == "id: 7"
+    assert lines[1] == "event: step"
+    assert orjson.loads(lines[2].removeprefix("data: ")) == MESSAGE
+    assert Frame(MESSAGE).encode(PROTOCOL_SSE) == encode_sse(MESSAGE)
@@ -0,0 +1,68 @@
+import time
+
+from schemas.browser_task import BrowserTask
+from services.browser.retention import RetentionManager, estimate_size
+from services.browser.store.memory import MemoryTaskStore
+
+
+def _step(sequence: int, size: int = 100) -> dict:
+    return {"type": "step", "sequence": sequence, "data": {"screenshot": "x" * size}}
+
+
+def _add_task(store: MemoryTaskStore, task_id: str, status: str = "completed") -> BrowserTask:
+    task = BrowserTask(task_id=task_id, task_description="demo")
+    store.add_task(task, {}, {})
+    task.status = status
+    store.save_task(task)
+    return task
+
+
+def test_estimate_size_counts_strings_and_bytes():
+    assert estimate_size({"a": "xyz", "b": [b"12", "3"]}) == 1 + 3 + 1 + 2 + 1
+
+
+def test_lru_selection_skips_unfinished_and_recently_used_tasks():
+    retention = RetentionManager(max_bytes=250, ttl=3600)
+    for task_id in ("a", "b", "c"):
+        retention.record_step(task_id, 100)
+    retention.touch("a")
+
+    # 淘汰顺序 b, c, a；c 未结束不能淘汰
+    assert retention.select_evictions(lambda task_id: task_id != "c") == ["b"]
+
+
+def test_store_evicts_steps_of_least_recently_used_finished_task():
+    store = MemoryTaskStore(RetentionManager(max_bytes=estimate_size(_step(1)) * 3, ttl=3600))
+    _add_task(store, "old")
+    _add_task(store, "recent")
+    _add_task(store, "running", status="running")
+    store.append_step("old", _step(1))
+    store.append_step("recent", _step(1))
+    store.get_steps("old")
+    store.append_step("running", _step(1))
+    store.append_step("running", _step(2))
+
+    # 超出预算时淘汰最久未访问的已结束任务的步骤，任务摘要保留
+    assert store.get_steps("recent") == []
+    assert len(store.get_steps("old")) == 1
+    assert len(store.get_steps("running")) == 2
+    assert store.get_task("recent") is not None
+    stats = store.get_retention_stats()
+    assert stats["evicted_tasks"] == 1
+    assert stats["evicted_steps"] == 1
+    assert stats["cached_bytes"] <= stats["max_bytes"]
+
+
+def test_store_expires_finished_tasks_after_ttl():
+    store = MemoryTaskStore(RetentionManager(max_bytes=10**9, ttl=0.01, sweep_interval=0))
+    _add_task(store, "finished")
+    _add_task(store, "running", status="running")
+    store.append_step("finished", _step(1))
+    time.sleep(0.02)
+
+    # 下一次写入时检查 TTL
+    _add_task(store, "new", status="running")
+    assert store.get_task("finished") is None
+    assert store.get_steps("finished") == []
+    assert store.get_task("running") is not None
+    assert store.get_retention_stats()["expired_tasks"] == 1
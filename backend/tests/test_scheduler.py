@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from services.browser.scheduler import SchedulerFullError, TaskScheduler
+
+
+def _blocking_job(release: asyncio.Event):
+    async def run():
+        await release.wait()
+    return run
+
+
+@pytest.fixture
+async def scheduler():
+    scheduler = TaskScheduler(max_workers=1, max_queue_length=2)
+    yield scheduler
+    await scheduler.shutdown()
+
+
+async def test_rejects_when_workers_and_queue_are_full(scheduler):
+    release = asyncio.Event()
+    for task_id in ("a", "b", "c"):
+        scheduler.submit(task_id, _blocking_job(release))
+    assert not scheduler.has_capacity()
+
+    with pytest.raises(SchedulerFullError) as exc_info:
+        scheduler.submit("d", _blocking_job(release))
+    assert exc_info.value.running + exc_info.value.pending == 3
+    release.set()
+
+
+async def test_queue_positions(scheduler):
+    release = asyncio.Event()
+    first = scheduler.submit("a", _blocking_job(release))
+    scheduler.submit("b", _blocking_job(release))
+    scheduler.submit("c", _blocking_job(release))
+    await first.started.wait()
+
+    assert scheduler.position("a") == 0
+    assert scheduler.position("b") == 1
+    assert scheduler.position("c") == 2
+    assert scheduler.position("missing") is None
+    assert (scheduler.running_count, scheduler.pending_count) == (1, 2)
+    release.set()
+
+
+async def test_submit_same_task_returns_existing_job(scheduler):
+    release = asyncio.Event()
+    job = scheduler.submit("a", _blocking_job(release))
+    assert scheduler.submit("a", _blocking_job(release)) is job
+    release.set()
+    await job.future
+
+
+async def test_jobs_run_in_submission_order(scheduler):
+    order = []
+
+    def job(task_id):
+        async def run():
+            order.append(task_id)
+        return run
+
+    jobs = [scheduler.submit(task_id, job(task_id)) for task_id in ("a", "b", "c")]
+    await asyncio.gather(*(job.future for job in jobs))
+    assert order == ["a", "b", "c"]
+
+
+async def test_cancel_pending_job(scheduler):
+    release = asyncio.Event()
+    scheduler.submit("a", _blocking_job(release))
+    pending = scheduler.submit("b", _blocking_job(release))
+
+    assert scheduler.cancel("b")
+    assert pending.future.cancelled()
+    assert scheduler.position("b") is None
+    release.set()
+
+
+async def test_failed_job_sets_future_exception(scheduler):
+    async def fail():
+        raise RuntimeError("boom")
+
+    job = scheduler.submit("a", fail)
+    with pytest.raises(RuntimeError, match="boom"):
+        await job.future
+    assert scheduler.running_count == 0
+
+
+async def test_wait_for_capacity_wakes_when_a_job_finishes(scheduler):
+    release = asyncio.Event()
+    for task_id in ("a", "b", "c"):
+        scheduler.submit(task_id, _blocking_job(release))
+
+    waiter = asyncio.ensure_future(scheduler.wait_for_capacity())
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+
+    release.set()
+    await asyncio.wait_for(waiter, timeout=1)
+    assert scheduler.has_capacity()
+
+
+async def test_wait_for_capacity_wakes_when_a_pending_job_is_cancelled(scheduler):
+    release = asyncio.Event()
+    for task_id in ("a", "b", "c"):
+        scheduler.submit(task_id, _blocking_job(release))
+
+    waiter = asyncio.ensure_future(scheduler.wait_for_capacity())
+    await asyncio.sleep(0.01)
+    scheduler.cancel("c")
+    await asyncio.wait_for(waiter, timeout=1)
+    release.set()
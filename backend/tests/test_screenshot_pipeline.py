@@ -0,0 +1,69 @@
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from services.browser.screenshot_pipeline import ScreenshotPipeline, process_screenshot
+
+
+def _screenshot(image: Image.Image) -> str:
+    output = io.BytesIO()
+    image.save(output, "PNG")
+    return base64.b64encode(output.getvalue()).decode()
+
+
+def _solid(color: tuple[int, int, int]) -> str:
+    return _screenshot(Image.new("RGB", (320, 200), color))
+
+
+def _page(color: tuple[int, int, int], marker: tuple[int, int, int] = (0, 0, 0)) -> str:
+    image = Image.new("RGB", (320, 200), color)
+    for x in range(40, 280):
+        for y in range(60, 64):
+            image.putpixel((x, y), marker)
+    return _screenshot(image)
+
+
+def _process(screenshot: str):
+    return process_screenshot(screenshot, thumbnail_width=64, thumbnail_format="jpeg", quality=60)
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    from services.browser.blob_store import ScreenshotStore
+
+    pipeline = ScreenshotPipeline(ScreenshotStore(tmp_path), dedup_distance=0)
+    yield pipeline
+    pipeline.close()
+
+
+def test_identical_bytes_are_duplicates(pipeline):
+    screenshot = _page((255, 255, 255))
+    assert pipeline.is_duplicate(_process(screenshot), _process(screenshot))
+
+
+def test_flat_frames_with_different_colors_are_not_duplicates(pipeline):
+    # 纯色截图的 dHash 都相同，需要颜色摘要区分
+    white, red = _process(_solid((255, 255, 255))), _process(_solid((200, 30, 30)))
+    assert white.perceptual_hash == red.perceptual_hash
+    assert not pipeline.is_duplicate(white, red)
+
+
+def test_visually_identical_frames_are_duplicates(pipeline):
+    previous = _process(_page((255, 255, 255)))
+    current = _process(_page((254, 255, 255)))
+    assert previous.digest != current.digest
+    assert pipeline.is_duplicate(previous, current)
+
+
+def test_negative_distance_only_skips_identical_bytes(tmp_path):
+    from services.browser.blob_store import ScreenshotStore
+
+    pipeline = ScreenshotPipeline(ScreenshotStore(tmp_path), dedup_distance=-1)
+    try:
+        previous = _process(_page((255, 255, 255)))
+        assert not pipeline.is_duplicate(previous, _process(_page((254, 255, 255))))
+        assert pipeline.is_duplicate(previous, _process(_page((255, 255, 255))))
+    finally:
+        pipeline.close()
@@ -0,0 +1,46 @@
+import json
+from datetime import datetime
+
+from core import serialization
+from core.serialization import FastJSONResponse, dumps, dumps_str, ws_message_dict
+from schemas.browser_task import BrowserTask, WSMessage
+
+
+def test_dumps_round_trip_of_nested_message():
+    message = ws_message_dict(
+        "step", {"step": 1, "text": "中文", "nested": [1, 2.5, None, True]}, session_id="task", sequence=3
+    )
+    assert json.loads(dumps(message)) == message
+    assert json.loads(dumps_str(message)) == message
+
+
+def test_dumps_encodes_models_datetimes_and_sets():
+    task = BrowserTask(task_id="task", task_description="demo")
+    created = datetime(2024, 1, 2, 3, 4, 5)
+    decoded = json.loads(dumps({"task": task, "at": created, "tags": {"a"}}))
+
+    assert decoded["task"] == task.model_dump(mode="json")
+    assert decoded["at"] == created.isoformat()
+    assert decoded["tags"] == ["a"]
+
+
+def test_stdlib_fallback_matches_orjson(monkeypatch):
+    message = ws_message_dict("result", {"text": "完成", "items": [1, 2]}, timestamp="2024-01-01T00:00:00")
+    fast = dumps(message)
+    monkeypatch.setattr(serialization, "orjson", None)
+
+    assert json.loads(dumps(message)) == json.loads(fast)
+    assert dumps_str(message) == fast.decode()
+
+
+def test_ws_message_dict_matches_model_dump():
+    message = ws_message_dict("status", {"status": "running"}, session_id="task", sequence=1,
+                              timestamp="2024-01-01T00:00:00")
+    model = WSMessage(type="status", data={"status": "running"}, session_id="task", sequence=1,
+                      timestamp="2024-01-01T00:00:00")
+    assert message == model.model_dump()
+
+
+def test_fast_json_response_renders_bytes():
+    response = FastJSONResponse({"ok": True, "text": "中文"})
+    assert json.loads(response.body) == {"ok": True, "text": "中文"}
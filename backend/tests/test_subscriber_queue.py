@@ -0,0 +1,99 @@
+import asyncio
+
+from services.browser.broadcaster import (
+    POLICY_BLOCK,
+    POLICY_COALESCE,
+    POLICY_DROP_OLDEST,
+    Frame,
+    SubscriberQueue,
+    TaskBroadcaster,
+)
+
+
+def _step(sequence: int, attachment: bool = False) -> Frame:
+    attachments = {"thumbnail": f"image-{sequence}".encode()} if attachment else None
+    return Frame({"type": "step", "sequence": sequence, "data": {}}, attachments)
+
+
+def _status(position: int) -> Frame:
+    return Frame({"type": "queue_status", "sequence": None, "data": {"position": position}})
+
+
+async def _drain(queue: SubscriberQueue) -> list[Frame | None]:
+    frames = []
+    while not queue.empty():
+        frames.append(await queue.get())
+    return frames
+
+
+async def test_drop_oldest_keeps_latest_frames():
+    queue = SubscriberQueue(maxsize=3, policy=POLICY_DROP_OLDEST)
+    for sequence in range(1, 6):
+        queue.put_nowait(_step(sequence))
+
+    assert [frame.sequence for frame in await _drain(queue)] == [3, 4, 5]
+    assert queue.dropped == 2
+
+
+async def test_coalesce_keeps_only_latest_attachment():
+    queue = SubscriberQueue(maxsize=2, policy=POLICY_COALESCE)
+    for sequence in range(1, 5):
+        queue.put_nowait(_step(sequence, attachment=True))
+
+    frames = await _drain(queue)
+    # 文本消息全部保留，只有最新一帧带附件
+    assert [frame.sequence for frame in frames] == [1, 2, 3, 4]
+    assert [bool(frame.attachments) for frame in frames] == [False, False, False, True]
+    assert queue.coalesced == 3
+
+
+async def test_coalesce_replaces_superseded_status_frames():
+    queue = SubscriberQueue(maxsize=1, policy=POLICY_COALESCE)
+    queue.put_nowait(_status(3))
+    queue.put_nowait(_status(2))
+    queue.put_nowait(_status(1))
+
+    frames = await _drain(queue)
+    assert [frame.message["data"]["position"] for frame in frames] == [1]
+
+
+async def test_overflow_evicts_subscriber():
+    queue = SubscriberQueue(maxsize=2, policy=POLICY_COALESCE, overflow_limit=3)
+    for sequence in range(1, 5):
+        queue.put_nowait(_step(sequence))
+
+    assert queue.evicted
+    assert await _drain(queue) == [None]
+    # 断开后的消息被忽略
+    queue.put_nowait(_step(5))
+    assert queue.empty()
+
+
+async def test_block_policy_waits_for_space():
+    queue = SubscriberQueue(maxsize=1, policy=POLICY_BLOCK)
+    queue.put_nowait(_step(1))
+    waiter = asyncio.ensure_future(queue.wait_writable())
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+
+    assert (await queue.get()).sequence == 1
+    await asyncio.wait_for(waiter, timeout=1)
+
+
+async def test_broadcaster_evicts_blocked_subscriber_after_timeout():
+    broadcaster = TaskBroadcaster()
+    queue = SubscriberQueue(maxsize=1, policy=POLICY_BLOCK)
+    broadcaster.subscribe("task", queue)
+    broadcaster.publish("task", {"type": "step", "sequence": 1})
+
+    await broadcaster.wait_writable("task", timeout=0.01)
+    assert queue.evicted
+
+
+async def test_end_marker_ends_stream():
+    queue = SubscriberQueue(maxsize=1)
+    queue.put_nowait(_step(1))
+    queue.put_nowait(None)
+
+    assert (await queue.get()).sequence == 1
+    assert await queue.get() is None
@@ -0,0 +1,112 @@
+import pytest
+
+from schemas.browser_task import BrowserTask
+from services.browser.store.memory import MemoryTaskStore
+from services.browser.store.sql import SQLTaskStore
+
+
+def _step(sequence: int) -> dict:
+    return {"type": "step", "sequence": sequence, "data": {"step": sequence}}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        store = MemoryTaskStore()
+    else:
+        # 落盘间隔设得很长，由测试显式 flush
+        store = SQLTaskStore(f"sqlite:///{tmp_path / 'tasks.db'}", flush_interval=60)
+    yield store
+    store.close()
+
+
+def _add_task(store, task_id: str = "task", status: str = "running") -> BrowserTask:
+    task = BrowserTask(task_id=task_id, task_description="demo", status=status)
+    store.add_task(task, {"client": "test"}, {"step_count": 0})
+    return task
+
+
+def test_task_round_trip(store):
+    task = _add_task(store)
+    task.status = "completed"
+    store.save_task(task)
+    store.flush()
+
+    loaded = store.get_task("task")
+    assert loaded.task_id == "task"
+    assert loaded.status == "completed"
+    assert store.get_metadata("task") == {"client": "test"}
+    assert store.get_task("missing") is None
+
+
+def test_steps_results_and_errors(store):
+    _add_task(store)
+    for sequence in range(1, 4):
+        store.append_step("task", _step(sequence))
+    store.set_result("task", {"type": "result", "sequence": 4})
+    store.append_error("task", {"error": "boom"})
+    store.flush()
+
+    assert store.get_steps("task") == [_step(1), _step(2), _step(3)]
+    assert store.get_steps_after("task", 1) == [_step(2), _step(3)]
+    assert store.get_step_count("task") == 3
+    assert store.get_result("task") == {"type": "result", "sequence": 4}
+    assert store.get_errors("task") == [{"error": "boom"}]
+
+
+def test_stats_and_screenshot_index(store):
+    _add_task(store)
+    store.update_stats("task", step_count=2, system_metrics=[{"step": 1}, {"step": 2}])
+    store.record_screenshot_refs("task", 2, "full-ref", "thumb-ref")
+    store.flush()
+
+    stats = store.get_stats("task")
+    assert stats["step_count"] == 2
+    assert stats["system_metrics"] == [{"step": 1}, {"step": 2}]
+    assert store.get_screenshot_refs("task", 2) == ("full-ref", "thumb-ref")
+    assert store.get_screenshot_refs("task", 1) is None
+
+
+def test_checkpoints_cleared_on_completion(store):
+    task = _add_task(store)
+    store.save_checkpoint("task", {"n_steps": 2})
+    store.flush()
+    assert store.get_checkpoint("task") == {"n_steps": 2}
+
+    task.status = "completed"
+    store.save_task(task)
+    store.flush()
+    assert store.get_checkpoint("task") is None
+
+
+def test_find_unfinished_tasks(store):
+    _add_task(store, "queued", status="queued")
+    _add_task(store, "running", status="running")
+    _add_task(store, "done", status="completed")
+    store.flush()
+
+    assert sorted(store.find_unfinished_tasks()) == ["queued", "running"]
+
+
+def test_sql_store_reloads_after_restart(tmp_path):
+    url = f"sqlite:///{tmp_path / 'tasks.db'}"
+    store = SQLTaskStore(url, flush_interval=60)
+    task = _add_task(store)
+    store.append_step("task", _step(1))
+    store.append_step("task", _step(2))
+    store.set_result("task", {"type": "result", "sequence": 3})
+    store.update_stats("task", step_count=2)
+    task.status = "completed"
+    store.save_task(task)
+    store.close()
+
+    reopened = SQLTaskStore(url, flush_interval=60)
+    try:
+        assert reopened.get_task("task").status == "completed"
+        assert reopened.get_steps_after("task", 1) == [_step(2)]
+        assert reopened.get_steps("task") == [_step(1), _step(2)]
+        assert reopened.get_step_count("task") == 2
+        assert reopened.get_result("task") == {"type": "result", "sequence": 3}
+        assert reopened.get_stats("task")["step_count"] == 2
+    finally:
+        reopened.close()